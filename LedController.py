@@ -1,91 +1,169 @@
-import color
-import wiringpi as WP
-
-from color import hsv_to_string
-from color import string_to_hsv
-from color import string_to_rgb
-from datetime import datetime
+from array import array
+from clock import Clock
+from color import BLACK
+from color import morph
+from output import OutputTable
+from output import SoftPwmDriver
+from transition import TransitionCache
 from util import log
 
+DEFAULT_PINS = (22, 27, 17)
+
 
 class LedController:
 
-    def __init__(self, preferences=None, pin_red=22, pin_green=27, pin_blue=17):
-        self.pin_red = pin_red
-        self.pin_green = pin_green
-        self.pin_blue = pin_blue
+    # zones is a list of (pin_red, pin_green, pin_blue) tuples, one for each
+    # set of lights that can be given its own color.
+    # driver is the output.OutputDriver used to write to the pins.
+    # timer is an optional instrumentation.StageTimer.
+    # clock is used when set_colors() isn't given the frame time
+    def __init__(self, preferences=None, zones=(DEFAULT_PINS,), driver=None,
+                 timer=None, clock=None):
+        self.zones = [tuple(pins) for pins in zones]
+        self.pins = [pin for pins in self.zones for pin in pins]
+        self.driver = driver if driver is not None else SoftPwmDriver()
+        self.timer = timer
+        self.clock = clock if clock is not None else Clock()
 
         self._init_gpio()
 
-        # The last 'selected' color, discounting any changes made by
-        # interpolation. i.e. the previous target_color
-        self.old_color = '0 0 0'
-
-        # The last color that was actually sent to the lights
-        self.previous_color = '0 0 0'
-        self.color_change_time = 0
-
-        self.preferences = preferences
+        # Frame buffer with one r, g, b row per zone, and the values that were
+        # last actually sent to the lights. Values are in the driver's range.
+        self.frame = array('H', bytes(2 * len(self.pins)))
+        self.written = array('H', self.frame)
+        self.output_table = None
+        self.output_settings = None
+
+        # The last 'selected' color for each zone, discounting any changes
+        # made by interpolation. i.e. the previous target color
+        self.old_colors = [BLACK] * len(self.zones)
+
+        # Monotonic time (ns) each zone's current transition started, or
+        # None if the zone isn't changing color
+        self.color_change_times = [None] * len(self.zones)
+        self.transitions = TransitionCache()
+
+        # The color each zone was given on the previous frame. Animated
+        # behaviours change this every frame, and compiling a transition
+        # for a target that is only used once costs far more than sampling
+        # morph() directly, so transitions are only compiled for targets
+        # that have been held for more than one frame
+        self.targets = [None] * len(self.zones)
+
+        self.preferences = None
+        if preferences is not None:
+            self.set_preferences(preferences)
 
     def _init_gpio(self):
-        result = WP.wiringPiSetupGpio()
-        if result == -1:
-            log('LedController setup failed')
+        if self.driver.setup(self.pins):
+            log('LedController setup successful using {}'.format(
+                self.driver.to_string()))
         else:
-            log('LedController setup successful')
-
-            for pin in [self.pin_red, self.pin_green, self.pin_blue]:
-                WP.pinMode(pin, 1)
-                WP.softPwmCreate(pin, 0, 100)
+            log('LedController setup failed')
 
+    # Call again whenever preferences change, to rebuild the output table
     def set_preferences(self, preferences):
         self.preferences = preferences
 
-    def set_color(self, rgb_string):
-        if self.preferences.color_change_interpolate:
-            interpolated_result = self._morph_to_color(rgb_string)
-
-            if interpolated_result == rgb_string:
-                self.old_color = rgb_string
-            rgb_string = interpolated_result
-
-        rgb_string = self._apply_restrictions(rgb_string)
-
-        if rgb_string == self.previous_color:
+        settings = (
+            self.driver.range,
+            preferences.min_brightness / 100.0 * 255.0,
+            preferences.max_brightness / 100.0 * 255.0,
+            preferences.gamma)
+        if settings != self.output_settings:
+            self.output_settings = settings
+            self.output_table = OutputTable(*settings)
+            log('Using {}'.format(self.output_table.to_string()))
+
+    # Set the same color on every zone
+    def set_color(self, rgb, now=None):
+        return self.set_colors([rgb] * len(self.zones), now=now)
+
+    # Set the color of each zone, in the same order as the zones were given
+    # to the constructor. Zones whose index is in immediate are set without
+    # interpolation. now is the clock.FrameTime of the frame.
+    # Returns True if the output changed.
+    def set_colors(self, colors, immediate=(), now=None):
+        if now is None:
+            now = self.clock.now()
+
+        frame = self.frame
+        red, green, blue = self.output_table.tables
+        targets = self.targets
+        for zone, rgb in enumerate(colors):
+            held = targets[zone] == rgb
+            targets[zone] = rgb
+            if zone in immediate:
+                # Later changes are interpolated from this color
+                self.old_colors[zone] = rgb
+                self.color_change_times[zone] = None
+            elif self.preferences.color_change_interpolate:
+                interpolated_result = self._morph_to_color(
+                    zone, rgb, now, held)
+
+                if interpolated_result == rgb:
+                    self.old_colors[zone] = rgb
+                rgb = interpolated_result
+
+            r, g, b = rgb
+            maxc = max(r, g, b)
+            if maxc > 255 or min(r, g, b) < 0:
+                # Outside the output table, e.g. from a behaviour plugin
+                r, g, b = [min(255, max(0, c)) for c in rgb]
+                maxc = max(r, g, b)
+            row = maxc << 8
+            offset = zone * 3
+            frame[offset] = red[row | r]
+            frame[offset + 1] = green[row | g]
+            frame[offset + 2] = blue[row | b]
+
+        timer = self.timer
+        if timer:
+            timer.lap('render')
+
+        changed = self._write_frame()
+        if timer:
+            timer.lap('output')
+        return changed
+
+    # Send any channels that have changed since the last frame to the lights
+    def _write_frame(self):
+        if self.frame == self.written:
             # Sending repeated commands to the lights can cause flickering so
             # we return here if the color has not changed
-            return
+            return False
 
-        r, g, b = string_to_rgb(rgb_string)
+        self.driver.write([
+            (pin, value)
+            for pin, value, previous in zip(self.pins, self.frame, self.written)
+            if value != previous
+        ])
 
-        WP.softPwmWrite(self.pin_red, r)
-        WP.softPwmWrite(self.pin_green, g)
-        WP.softPwmWrite(self.pin_blue, b)
+        self.written[:] = self.frame
+        return True
 
-        self.previous_color = rgb_string
-
-    # Constrain brightness to fit user preferences
-    def _apply_restrictions(self, rgb_string):
-        h, s, v = string_to_hsv(rgb_string)
-        v = int(min(self.preferences.max_brightness / 100.0 * 255.0,
-                    max(v, self.preferences.min_brightness / 100.0 * 255.0)))
+    # held is True if rgb was also the target on the previous frame
+    def _morph_to_color(self, zone, rgb, now, held=True):
+        old_color = self.old_colors[zone]
+        if old_color == rgb:
+            # No changes
+            return rgb
 
-        return hsv_to_string((h, s, v))
+        if self.color_change_times[zone] is None:
+            self.color_change_times[zone] = now.ns
 
-    def _morph_to_color(self, rgb_string):
-        now = datetime.now()
-        if self.old_color == rgb_string:
-            # No changes
-            return rgb_string
+        duration = self.preferences.color_change_duration
+        elapsed = now.since(self.color_change_times[zone])
+        if elapsed > duration:
+            self.old_colors[zone] = rgb
+            self.color_change_times[zone] = None
+            return rgb
 
-        if self.color_change_time == 0:
-            self.color_change_time = now
+        if not held:
+            return morph(old_color, rgb, elapsed / duration)
 
-        progress = (now - self.color_change_time).total_seconds() / \
-            self.preferences.color_change_duration
-        if progress > 1:
-            self.old_color = rgb_string
-            self.color_change_time = 0
-            return rgb_string
+        return self.transitions.get(old_color, rgb, duration)\
+            .sample(elapsed)
 
-        return color.morph(self.old_color, rgb_string, progress)
+    def close(self):
+        self.driver.close()
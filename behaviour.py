@@ -1,24 +1,27 @@
-from datetime import datetime
+from importlib import import_module
 from math import pi
 from math import sin
 from random import random
-from time import sleep
 
-import os
+import sys
 
 import color
+import statusblock
 
 from color import Color
+from statusblock import get_status_block
 
-from util import read_line
-from util import read_lines
+from util import log
 from util import safe_load
 
+# Entry point group for behaviours provided by other packages. The entry
+# point name is the behaviour id, e.g. in a plugin's setup.py:
+#   entry_points={
+#       'intelligent_lighting.behaviours': ['100 = my_plugin:MyBehaviour']}
+# Plugins are only imported when their behaviour is first used.
+PLUGIN_GROUP = 'intelligent_lighting.behaviours'
+
 class Behaviour:
-    WEB_DIRECTORY = os.path.join(
-        os.path.join(
-            os.path.dirname(os.path.realpath(__file__)), 'remote'),
-        'status')
     NONE = 0
     CYCLE = 1
     DISCO = 2
@@ -31,34 +34,31 @@ class Behaviour:
     # to prevent unpleasant flickering/strobing
     MIN_BEAT_DURATION = 0.25
 
+    # Minimum time (in seconds) between calls to update(). Behaviours that
+    # flash can set this to limit how quickly the lights change - the
+    # previous color is held in between, without delaying anything else.
+    min_interval = 0
+
+    # Returns the behaviour with the given id, reset to its initial state.
+    # Instances are cached separately for each owner (e.g. a zone name) so
+    # that owners don't share animation state.
     @staticmethod
-    def get(id):
-        if id == Behaviour.CYCLE:
-            return CycleBehaviour()
-        elif id == Behaviour.DISCO:
-            return DiscoBehaviour()
-        elif id == Behaviour.SPOOKY:
-            return SpookyBehaviour()
-        elif id == Behaviour.PULSE:
-            return PulseBehaviour()
-        elif id == Behaviour.AI:
-            return AIBehaviour()
-        elif id == Behaviour.MECH:
-            return MechBehaviour()
-        else:
-            return Behaviour()
+    def get(id, owner=None):
+        return get_registry().get(id, owner)
 
     def __init__(self, prefs=None):
         self.set_preferences(prefs)
-        self.last_update = datetime.now()
+        self.last_update = None
 
     def reset(self):
         pass
 
-    # Return the modified color as a string, and True if this modified color
+    # Return the modified color as an RGB, and True if this modified color
     # should be considered as canonical
     # (i.e. if True, this behaviour will affect AI learning behaviour,
-    # False will not)
+    # False will not).
+    # now is the clock.FrameTime of the frame being drawn. Durations should
+    # be measured from now.ns, which is monotonic.
     def update(self, fallback_color, now):
         self.last_update = now
         return fallback_color, True
@@ -97,13 +97,13 @@ class CycleBehaviour(Behaviour):
         if self.original_hue < 0:
             self.original_hue = color.get_hue(fallback_color)
             self.original_brightness = color.get_brightness(fallback_color)
-            self.cycle_start = now
+            self.cycle_start = now.ns
 
-        delta = ((now - self.cycle_start).total_seconds() /
-                    self.duration) % 1.0
+        delta = (now.since(self.cycle_start) / self.duration) % 1.0
         hue = (self.original_hue + delta) % 1.0
 
-        return color.hsv_to_string((hue, 1.0, self.original_brightness)), False
+        return color.lut_hsv_to_rgb(
+            (hue, 1.0, self.original_brightness)), False
 
     def to_string(self):
         return "CycleBehaviour[duration:{}]".format(self.duration)
@@ -121,17 +121,16 @@ class DiscoBehaviour(Behaviour):
         self.last_change = None
 
     def reset(self):
-        self.last_change = -1
-        pass
+        self.last_change = None
 
     def update(self, fallback_color, now):
         if self.last_change is None:
-            self.last_change = now
+            self.last_change = now.ns
 
-        delta = (now - self.last_change).total_seconds()
+        delta = now.since(self.last_change)
         if delta > self.color_duration:
             self.color.get_next()
-            self.last_change = now
+            self.last_change = now.ns
 
         return self.color.get(), False
 
@@ -181,6 +180,9 @@ class SpookyBehaviour(Behaviour):
     STATE_LOW = 0
     STATE_HIGH = 1
 
+    # Limits flicker while restricted
+    RESTRICTED_INTERVAL = 0.5
+
     def __init__(self, prefs=None):
         super().__init__(prefs)
         self.last_change = None
@@ -193,28 +195,23 @@ class SpookyBehaviour(Behaviour):
 
     def update(self, fallback_color, now):
         if self.last_change is None:
-            self.last_change = now
+            self.last_change = now.ns
 
         brightness = color.get_brightness(fallback_color)
 
-        delta = (now - self.last_change).total_seconds()
+        delta = now.since(self.last_change)
         if self.state == SpookyBehaviour.STATE_LOW:
             brightness = 0.01 + (random() * 0.05)
 
             if delta > self.low_duration and random() > 0.6:
                 self.state = SpookyBehaviour.STATE_HIGH
-                self.last_change = now
+                self.last_change = now.ns
         elif self.state == SpookyBehaviour.STATE_HIGH:
             brightness = 0.2 + (random() * 0.7)
 
             if delta > self.high_duration and random() > 0.6:
                 self.state = SpookyBehaviour.STATE_LOW
-                self.last_change = now
-
-        # This can be removed or reduced if you are sure that nobody
-        # is likely to suffer adverse affects from flashing lights
-        if self.restricted:
-            sleep(0.5)
+                self.last_change = now.ns
 
         return color.set_brightness(fallback_color, brightness), False
 
@@ -226,6 +223,11 @@ class SpookyBehaviour(Behaviour):
         self.low_duration = safe_load(prefs, 'low_duration', 5.0)
         self.restricted = safe_load(prefs, 'restricted', True)
 
+        # This can be removed or reduced if you are sure that nobody
+        # is likely to suffer adverse affects from flashing lights
+        self.min_interval = (
+            SpookyBehaviour.RESTRICTED_INTERVAL if self.restricted else 0)
+
     def to_string(self):
         return "SpookyBehaviour[]: WARNING: THIS MAY BE A HEALTH HAZARD"
 
@@ -234,12 +236,12 @@ class SpookyBehaviour(Behaviour):
 
 
 class AIBehaviour(Behaviour):
-    AI_AMBIENT_FILE = Behaviour.WEB_DIRECTORY + 'ambient_ai'
 
     def __init__(self, prefs=None):
         super().__init__(prefs)
         self.set_preferences(prefs)
         self.color = None
+        self.status = get_status_block()
 
     def reset(self):
         self.color = None
@@ -247,11 +249,11 @@ class AIBehaviour(Behaviour):
     def update(self, fallback_color, now):
         if self.color is None:
             self.color = fallback_color
-        color = read_line(AIBehaviour.AI_AMBIENT_FILE)
-        if color != "":
+        value = self.status.read(statusblock.AI)
+        if value is not None:
             # Cache a copy of the color to prevent flickering
-            # in case of file read errors
-            self.color = color
+            # in case of read errors
+            self.color = value.rgb
         return self.color, True
 
     def set_preferences(self, preferences):
@@ -266,13 +268,13 @@ class AIBehaviour(Behaviour):
 
 
 class MechBehaviour(Behaviour):
-    MECH_FILE = Behaviour.WEB_DIRECTORY + 'mech'
 
     def __init__(self, prefs=None):
         super().__init__(prefs)
         self.set_preferences(prefs)
         self.color = None
         self.source = ""
+        self.status = get_status_block()
 
     def reset(self):
         self.color = None
@@ -282,11 +284,14 @@ class MechBehaviour(Behaviour):
         if self.color is None:
             self.color = fallback_color
 
-        lines = read_lines(MechBehaviour.MECH_FILE)
+        value = self.status.read(statusblock.MECH)
+        if value is None:
+            # Nothing has set a mech color yet
+            return fallback_color, False
+
         try:
-            mech_color = lines[0].strip()
-            timestamp = int(lines[1].strip())
-            delta = int(now.timestamp()) - timestamp
+            mech_color, timestamp = value[:2]
+            delta = int(now.wall) - timestamp
             if delta < self.timeout:
                 if self.only_when_dark and color.get_brightness(fallback_color) > 50:
                     raise Exception(
@@ -323,16 +328,15 @@ class PulseBehaviour(Behaviour):
 
     def reset(self):
         self.brightness = -1
-        pass
+        self.cycle_start = -1
 
     def update(self, fallback_color, now):
         if self.cycle_start == -1:
-            self.cycle_start = now
+            self.cycle_start = now.ns
 
-        h, s, v = color.string_to_hsv(fallback_color)
+        h, s, v = color.lut_rgb_to_hsv(fallback_color)
 
-        delta = ((now - self.cycle_start).total_seconds() /
-                 self.beat_duration) % 1.0
+        delta = (now.since(self.cycle_start) / self.beat_duration) % 1.0
 
         if self.waveform == 'sin':
             v = sin(delta * pi) * 255.0
@@ -344,7 +348,7 @@ class PulseBehaviour(Behaviour):
 #        elif self.waveform == 'sawtooth':
 #            pass
 #        else:
-        return color.hsv_to_string((h, s, v)), False
+        return color.lut_hsv_to_rgb((h, s, v)), False
 
     def set_preferences(self, preferences):
         super().set_preferences(preferences)
@@ -367,3 +371,99 @@ class PulseBehaviour(Behaviour):
 
     def id(self):
         return Behaviour.PULSE
+
+
+# Maps behaviour ids to behaviour classes and caches their instances.
+#
+# Classes may be registered directly or as a 'module:Class' path, which is
+# only imported when the behaviour is first used.
+class BehaviourRegistry:
+
+    def __init__(self):
+        self.classes = {}
+
+        # {(owner, id): instance}
+        self.instances = {}
+        self.plugins_loaded = False
+
+    def register(self, id, behaviour_class):
+        self.classes[id] = behaviour_class
+
+    def get(self, id, owner=None):
+        instance = self.instances.get((owner, id))
+        if instance is not None:
+            instance.reset()
+            return instance
+
+        instance = self._get_class(id)()
+        self.instances[(owner, id)] = instance
+        return instance
+
+    # All known behaviour ids, including those provided by plugins
+    def ids(self):
+        self._load_plugins()
+        return sorted(self.classes)
+
+    def _get_class(self, id):
+        if id not in self.classes:
+            self._load_plugins()
+
+        behaviour_class = self.classes.get(id, Behaviour)
+        if isinstance(behaviour_class, str):
+            try:
+                module, name = behaviour_class.split(':')
+                behaviour_class = getattr(import_module(module), name)
+            except (ImportError, AttributeError, ValueError) as e:
+                log('Unable to load behaviour {} from {}: {}'.format(
+                    id, behaviour_class, e))
+                behaviour_class = Behaviour
+            self.classes[id] = behaviour_class
+        return behaviour_class
+
+    # Register behaviours from installed packages. This only reads package
+    # metadata - the plugins themselves are imported by _get_class()
+    def _load_plugins(self):
+        if self.plugins_loaded:
+            return
+        self.plugins_loaded = True
+
+        try:
+            from importlib import metadata
+        except ImportError:
+            return
+
+        if sys.version_info >= (3, 10):
+            entry_points = metadata.entry_points(group=PLUGIN_GROUP)
+        else:
+            entry_points = metadata.entry_points().get(PLUGIN_GROUP, [])
+
+        for entry_point in entry_points:
+            try:
+                id = int(entry_point.name)
+            except ValueError:
+                log('Ignoring behaviour plugin {}: name must be an id'.format(
+                    entry_point.value))
+                continue
+
+            if id in self.classes:
+                log('Ignoring behaviour plugin {}: id {} is already used'
+                    .format(entry_point.value, id))
+                continue
+            self.classes[id] = entry_point.value
+
+
+_registry = None
+
+
+def get_registry():
+    global _registry
+    if _registry is None:
+        _registry = BehaviourRegistry()
+        _registry.register(Behaviour.NONE, Behaviour)
+        _registry.register(Behaviour.CYCLE, CycleBehaviour)
+        _registry.register(Behaviour.DISCO, DiscoBehaviour)
+        _registry.register(Behaviour.PULSE, PulseBehaviour)
+        _registry.register(Behaviour.SPOOKY, SpookyBehaviour)
+        _registry.register(Behaviour.AI, AIBehaviour)
+        _registry.register(Behaviour.MECH, MechBehaviour)
+    return _registry
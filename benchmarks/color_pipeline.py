@@ -0,0 +1,116 @@
+# Micro-benchmark for the per-frame color pipeline.
+#
+# Compares the original string-based pipeline (colors passed around as
+# "r g b" strings, re-parsed at every step) with the RGB value type used by
+# color.py. One frame is a transition step followed by brightness clamping
+# and conversion to channel values, which is what LedController.set_color
+# does while a fade is in progress.
+#
+# Usage: python3 benchmarks/color_pipeline.py [--frames N]
+
+import colorsys
+import os
+import sys
+import timeit
+import tracemalloc
+
+from argparse import ArgumentParser
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import color  # noqa: E402
+
+MAX_BRIGHTNESS = 80
+MIN_BRIGHTNESS = 5
+
+
+#
+# Baseline: the string pipeline as it was before the RGB type was introduced
+#
+
+def _legacy_string_to_rgb(string):
+    r, g, b = [int(x) for x in string.split(" ")]
+    return (r, g, b)
+
+
+def _legacy_string_to_hsv(string):
+    r, g, b = _legacy_string_to_rgb(string)
+    return colorsys.rgb_to_hsv(r, g, b)
+
+
+def _legacy_hsv_to_string(hsv):
+    r, g, b = [int(x) for x in colorsys.hsv_to_rgb(*hsv)]
+    return "{} {} {}".format(r, g, b)
+
+
+def _legacy_morph(from_string, to_string, t):
+    fh, fs, fv = _legacy_string_to_hsv(from_string)
+    th, ts, tv = _legacy_string_to_hsv(to_string)
+    h = color.interpolate(t, fh, th)
+    s = color.interpolate(t, fs, ts)
+    v = color.interpolate(t, fv, tv)
+    return _legacy_hsv_to_string((h, s, v))
+
+
+def _legacy_frame(from_string, to_string, t):
+    rgb_string = _legacy_morph(from_string, to_string, t)
+    h, s, v = _legacy_string_to_hsv(rgb_string)
+    v = int(min(MAX_BRIGHTNESS / 100.0 * 255.0,
+                max(v, MIN_BRIGHTNESS / 100.0 * 255.0)))
+    rgb_string = _legacy_hsv_to_string((h, s, v))
+    return _legacy_string_to_rgb(rgb_string)
+
+
+#
+# Current: RGB values end to end
+#
+
+def _rgb_frame(from_rgb, to_rgb, t):
+    rgb = color.morph(from_rgb, to_rgb, t)
+    h, s, v = color.rgb_to_hsv(rgb)
+    v = int(min(MAX_BRIGHTNESS / 100.0 * 255.0,
+                max(v, MIN_BRIGHTNESS / 100.0 * 255.0)))
+    r, g, b = color.hsv_to_rgb((h, s, v))
+    return r, g, b
+
+
+def _measure(name, frame, start, end, frames):
+    steps = [i / frames for i in range(frames)]
+
+    def run():
+        for t in steps:
+            frame(start, end, t)
+
+    run()
+    seconds = min(timeit.repeat(run, number=1, repeat=5))
+
+    # Peak memory allocated while producing a single frame, averaged
+    allocated = 0
+    tracemalloc.start()
+    for t in steps:
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        frame(start, end, t)
+        allocated += tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    print('{:<8} {:>8.2f}us/frame {:>8.1f} bytes allocated/frame'.format(
+        name, seconds / frames * 1e6, allocated / frames))
+    return seconds
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Color pipeline micro-benchmark')
+    parser.add_argument('--frames', type=int, default=10000)
+    args = parser.parse_args()
+
+    # Use hues that are close together so both pipelines take the direct
+    # interpolation path and do the same amount of color math
+    start, end = (250, 40, 10), (255, 120, 0)
+
+    before = _measure(
+        'strings', _legacy_frame,
+        color.rgb_to_string(start), color.rgb_to_string(end), args.frames)
+    after = _measure(
+        'RGB', _rgb_frame, color.RGB(*start), color.RGB(*end), args.frames)
+    print('speedup: {:.2f}x'.format(before / after))
@@ -0,0 +1,487 @@
+# Benchmark suite for the control loop and color pipeline.
+#
+# Runs without GPIO: status files are kept in a temporary directory and
+# output goes through the memory driver, or through the softpwm driver backed
+# by the wiringpi stub in benchmarks/stubs.
+#
+# The lights.frame benchmarks run main.Lights on eventloop.LightsLoop, as
+# main.py does, drawing frames back to back. Each operation is one frame,
+# with behaviours running in their worker threads alongside it.
+#
+# Each benchmark reports per-operation latency (mean, median, p99, max),
+# throughput and the memory allocated per operation. Results can be saved as
+# JSON and compared against a previous run:
+#
+#   python3 benchmarks/control_loop.py --output new.json --compare old.json
+#
+# With --fail-threshold, exits with status 1 if any benchmark's mean latency
+# regressed by more than the given percentage.
+
+import asyncio
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIRECTORY))
+sys.path.insert(0, os.path.join(BENCHMARK_DIRECTORY, 'stubs'))
+
+# Must be set before main and behaviour are imported
+STATUS_ROOT = tempfile.mkdtemp(prefix='lights-benchmark-')
+os.environ['LIGHTS_STATUS_ROOT'] = STATUS_ROOT
+os.environ['LIGHTS_STATUS_BLOCK'] = os.path.join(STATUS_ROOT, 'status_block')
+
+import color  # noqa: E402
+import main  # noqa: E402
+import reporting  # noqa: E402
+import statusblock  # noqa: E402
+
+from behaviour import Behaviour  # noqa: E402
+from clock import SimulatedClock  # noqa: E402
+from color import RGB  # noqa: E402
+from eventloop import LightsLoop  # noqa: E402
+from instrumentation import StageTimer  # noqa: E402
+from LedController import LedController  # noqa: E402
+from output import MemoryDriver  # noqa: E402
+from output import OutputTable  # noqa: E402
+from output import SoftPwmDriver  # noqa: E402
+from stream import StreamReceiver  # noqa: E402
+from stream import StreamSender  # noqa: E402
+from transition import Transition  # noqa: E402
+from watcher import get_watcher  # noqa: E402
+
+# main.py loads numpy after the first frame. Benchmarks measure the lights
+# once it has loaded
+color.load_numpy()
+
+# Simulated time between frames (in seconds) for benchmarks that step
+# through time
+FRAME_INTERVAL = 1 / 60.0
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+    def register(setup):
+        BENCHMARKS.append((name, setup))
+        return setup
+    return register
+
+
+# Files written between benchmarks are seen straight away, as there may be
+# no event loop polling the watcher
+def write_status(filename, content):
+    with open(os.path.join(STATUS_ROOT, filename), 'w') as f:
+        f.write(content)
+    get_watcher().poll()
+
+
+def write_preferences(**preferences):
+    write_status('prefs', json.dumps(preferences))
+
+
+def write_ambient(rgb, filename='ambient'):
+    write_status(filename, '{}\n{}'.format(rgb, int(time.time())))
+
+
+def make_lights(zone_count=1, timer=None, stream=None, **preferences):
+    defaults = {
+        'pref_inactivity_timeout': 10 ** 6,
+        'pref_interpolate_color_changes': True,
+        'pref_max_brightness': 80,
+        'pref_min_brightness': 5,
+    }
+    defaults.update(preferences)
+    write_preferences(**defaults)
+    write_status('notifications', '[]')
+    write_ambient(RGB(255, 120, 0))
+
+    zones = [
+        main.Zone(str(i), (3 * i, 3 * i + 1, 3 * i + 2))
+        for i in range(zone_count)
+    ]
+    return main.Lights(zones, MemoryDriver(), timer, stream, SimulatedClock())
+
+
+# Runs lights on a LightsLoop with its own event loop, one frame per call.
+# Each call advances the simulated clock by FRAME_INTERVAL and runs the event
+# loop until the next frame has been drawn. This stands in for the
+# FrameScheduler, so that frames are drawn back to back
+class FrameStepper:
+    interval = 0
+
+    def __init__(self, lights):
+        self.lights = lights
+        self.loop = asyncio.new_event_loop()
+        self.drawn = self.loop.create_future()
+        lights_loop = LightsLoop(lights, self, get_watcher(), debug=True)
+        self.task = self.loop.create_task(lights_loop.run())
+        self.task.add_done_callback(self._stopped)
+
+    def __call__(self):
+        self.lights.clock.advance(FRAME_INTERVAL)
+        self.drawn = self.loop.create_future()
+        return self.loop.run_until_complete(self.drawn)
+
+    # Called by the render task once each frame has been drawn
+    def next_delay(self, active):
+        if not self.drawn.done():
+            self.drawn.set_result(active)
+        return 0
+
+    def restart(self):
+        pass
+
+    # Pass on any error that stopped the loop
+    def _stopped(self, task):
+        if not task.cancelled() and not self.drawn.done():
+            self.drawn.set_exception(
+                task.exception() or RuntimeError('LightsLoop stopped'))
+
+    def close(self):
+        self.task.cancel()
+        self.loop.run_until_complete(
+            asyncio.gather(self.task, return_exceptions=True))
+        self.loop.close()
+
+
+class Preferences:
+    max_brightness = 80
+    min_brightness = 5
+    gamma = 2.2
+    color_change_interpolate = False
+    color_change_duration = 1.5
+
+
+#
+# Control loop
+#
+
+@benchmark('lights.frame.static')
+def bench_update_static():
+    lights = make_lights()
+    return FrameStepper(lights)
+
+
+@benchmark('lights.frame.transition')
+def bench_update_transition():
+    # A long transition so that every frame samples a new position
+    lights = make_lights(pref_color_change_duration=10 ** 6)
+    write_ambient(RGB(0, 60, 255))
+    return FrameStepper(lights)
+
+
+@benchmark('lights.frame.instrumented')
+def bench_update_instrumented():
+    lights = make_lights(
+        timer=StageTimer(), pref_color_change_duration=10 ** 6)
+    write_ambient(RGB(0, 60, 255))
+    return FrameStepper(lights)
+
+
+@benchmark('lights.frame.inactivity')
+def bench_update_inactivity():
+    lights = make_lights(
+        pref_inactivity_timeout=0,
+        pref_inactivity_behaviour=Behaviour.CYCLE)
+    return FrameStepper(lights)
+
+
+@benchmark('lights.frame.restricted')
+def bench_update_restricted():
+    # Spooky only updates every RESTRICTED_INTERVAL, and its color is held
+    # on the frames in between
+    lights = make_lights(
+        pref_inactivity_timeout=0,
+        pref_inactivity_behaviour=Behaviour.SPOOKY)
+    return FrameStepper(lights)
+
+
+@benchmark('lights.frame.zones_8')
+def bench_update_zones():
+    lights = make_lights(8, pref_color_change_duration=10 ** 6)
+    for i in range(8):
+        write_ambient(RGB(0, 30 * i, 255), 'ambient.{}'.format(i))
+    return FrameStepper(lights)
+
+
+@benchmark('lights.frame.streaming')
+def bench_update_streaming():
+    # Includes the cost of sending each packet over loopback
+    receiver = StreamReceiver(0, '127.0.0.1')
+    lights = make_lights(2, stream=receiver)
+    sender = StreamSender(*receiver.address)
+    sender.send([RGB(0, 0, 255)] * 2)
+    stepper = FrameStepper(lights)
+    stepper()
+    state = {'i': 0}
+
+    def op():
+        state['i'] = (state['i'] + 1) % 256
+        sender.send([RGB(state['i'], 0, 255), RGB(0, state['i'], 255)])
+        stepper()
+    op.close = stepper.close
+    return op
+
+
+#
+# Behaviours
+#
+
+def _behaviour_benchmark(behaviour_id, options=None, fallback=None):
+    def setup():
+        behaviour = Behaviour.get(behaviour_id)
+        behaviour.set_preferences(options or {})
+        clock = SimulatedClock()
+
+        def op():
+            clock.advance(FRAME_INTERVAL)
+            behaviour.update(fallback or RGB(255, 120, 0), clock.now())
+        return op
+    return setup
+
+
+for _slot in [statusblock.AI, statusblock.MECH]:
+    statusblock.get_status_block().write(_slot, RGB(255, 0, 0), time.time())
+
+for _name, _id, _options in [
+    ('none', Behaviour.NONE, None),
+    ('cycle', Behaviour.CYCLE, None),
+    ('disco', Behaviour.DISCO, {str(Behaviour.DISCO): {'bpm': 240}}),
+    ('pulse', Behaviour.PULSE, None),
+    ('spooky', Behaviour.SPOOKY, None),
+    ('ai', Behaviour.AI, None),
+]:
+    benchmark('behaviour.' + _name)(_behaviour_benchmark(_id, _options))
+
+# Dark enough for the mech color to be used
+benchmark('behaviour.mech')(
+    _behaviour_benchmark(Behaviour.MECH, fallback=RGB(20, 10, 0)))
+
+
+@benchmark('behaviour.switch')
+def bench_behaviour_switch():
+    ids = [Behaviour.CYCLE, Behaviour.PULSE, Behaviour.DISCO]
+    state = {'i': 0}
+
+    def op():
+        state['i'] = (state['i'] + 1) % len(ids)
+        Behaviour.get(ids[state['i']], 'benchmark')
+    return op
+
+
+#
+# Color pipeline
+#
+
+@benchmark('color.morph.direct')
+def bench_morph_direct():
+    a, b = RGB(250, 40, 10), RGB(255, 120, 0)
+    return lambda: color.morph(a, b, 0.5)
+
+
+@benchmark('color.morph.fade')
+def bench_morph_fade():
+    a, b = RGB(255, 0, 0), RGB(0, 0, 255)
+    return lambda: color.morph(a, b, 0.5)
+
+
+@benchmark('transition.compile')
+def bench_transition_compile():
+    state = {'i': 0}
+
+    def op():
+        state['i'] = (state['i'] + 1) % 256
+        Transition(RGB(255, 0, 0), RGB(0, state['i'], 255), 1.5)
+    return op
+
+
+@benchmark('transition.sample')
+def bench_transition_sample():
+    transition = Transition(RGB(255, 0, 0), RGB(0, 0, 255), 1.5)
+    return lambda: transition.sample(0.75)
+
+
+@benchmark('status.read')
+def bench_status_read():
+    block = statusblock.get_status_block()
+    return lambda: block.read(statusblock.AI)
+
+
+@benchmark('status.write')
+def bench_status_write():
+    block = statusblock.get_status_block()
+    rgb = RGB(255, 120, 0)
+    return lambda: block.write(statusblock.CANONICAL, rgb, 0)
+
+
+@benchmark('output.table.build')
+def bench_output_table_build():
+    return lambda: OutputTable(100, 12.75, 204, [2.2, 2.0, 2.4])
+
+
+@benchmark('output.table.lookup')
+def bench_output_table_lookup():
+    red, green, blue = OutputTable(100, 12.75, 204, 2.2).tables
+    r, g, b = RGB(255, 120, 0)
+
+    def op():
+        row = max(r, g, b) << 8
+        return red[row | r], green[row | g], blue[row | b]
+    return op
+
+
+#
+# Notifications
+#
+
+def _notification_lights(count):
+    # Always inside a pulse
+    lights = make_lights(
+        pref_notifications_enabled=True,
+        pref_notifications_pulse_frequency=0,
+        pref_notifications_pulse_duration=10 ** 6)
+    write_status('notifications', json.dumps([
+        {'package': 'app{}'.format(i), 'rgb': '{} 0 255'.format(i % 256)}
+        for i in range(count)
+    ]))
+    return lights
+
+
+@benchmark('notifications.pulse')
+def bench_notifications():
+    handler = _notification_lights(5).notification_handler
+    clock = SimulatedClock()
+
+    def op():
+        clock.advance(FRAME_INTERVAL)
+        return handler.update(clock.now())
+    return op
+
+
+@benchmark('lights.frame.notifications')
+def bench_update_notifications():
+    return FrameStepper(_notification_lights(50))
+
+
+#
+# Output
+#
+
+def _output_benchmark(driver_class):
+    def setup():
+        controller = LedController(Preferences(), driver=driver_class())
+        colors = [RGB(255, 0, 0), RGB(0, 0, 255)]
+        state = {'i': 0}
+
+        # Alternate colors so that every frame is written
+        def op():
+            state['i'] ^= 1
+            controller.set_color(colors[state['i']])
+        return op
+    return setup
+
+
+benchmark('output.memory')(_output_benchmark(MemoryDriver))
+benchmark('output.softpwm')(_output_benchmark(SoftPwmDriver))
+
+
+class InterpolatingPreferences(Preferences):
+    color_change_interpolate = True
+
+
+@benchmark('output.interpolate.animated')
+def bench_interpolate_animated():
+    # A new target every frame, as Cycle and Pulse give, during a transition
+    controller = LedController(InterpolatingPreferences(), driver=MemoryDriver())
+    clock = SimulatedClock()
+    controller.set_color(RGB(0, 0, 255), clock.now())
+    state = {'i': 0}
+
+    def op():
+        state['i'] = (state['i'] + 1) % 256
+        clock.advance(FRAME_INTERVAL / 100)
+        controller.set_color(RGB(255, state['i'], 0), clock.now())
+    return op
+
+
+def _percentile(sorted_values, fraction):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * fraction))
+    return sorted_values[index]
+
+
+def measure(op, iterations):
+    for _ in range(min(100, iterations)):
+        op()
+
+    timings = []
+    clock = time.perf_counter_ns
+    for _ in range(iterations):
+        start = clock()
+        op()
+        timings.append(clock() - start)
+    timings.sort()
+
+    # Memory allocated while performing a single operation, averaged
+    allocated = 0
+    samples = min(iterations, 1000)
+    tracemalloc.start()
+    for _ in range(samples):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        op()
+        allocated += tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+
+    mean = sum(timings) / len(timings) / 1000.0
+    return {
+        'iterations': iterations,
+        'mean_us': mean,
+        'p50_us': _percentile(timings, 0.5) / 1000.0,
+        'p99_us': _percentile(timings, 0.99) / 1000.0,
+        'max_us': timings[-1] / 1000.0,
+        'ops_per_second': 1e6 / mean if mean > 0 else 0,
+        'allocated_bytes': allocated / samples,
+    }
+
+
+def run(iterations, name_filter=None):
+    results = {}
+    for name, setup in BENCHMARKS:
+        if name_filter and name_filter not in name:
+            continue
+        with redirect_stdout(io.StringIO()):
+            op = setup()
+        results[name] = measure(op, iterations)
+        if hasattr(op, 'close'):
+            op.close()
+        print('{:<28} {:>9.2f}us mean {:>9.2f}us p99 {:>9.0f} ops/s '
+              '{:>8.0f} B/op'.format(
+                  name, results[name]['mean_us'], results[name]['p99_us'],
+                  results[name]['ops_per_second'],
+                  results[name]['allocated_bytes']))
+    return results
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Control loop benchmarks')
+    parser.add_argument('--iterations', type=int, default=5000)
+    parser.add_argument(
+        '--filter', type=str, help='Only run benchmarks containing this text')
+    reporting.add_arguments(parser, 'mean latency')
+    args = parser.parse_args()
+
+    try:
+        results = run(args.iterations, args.filter)
+    finally:
+        shutil.rmtree(STATUS_ROOT)
+
+    reporting.report(args, results, 'mean_us', '{:>9.2f}us')
@@ -0,0 +1,120 @@
+# Equivalence check and benchmark for the HSV conversions in color.py.
+#
+# Compares the table-based lut_* functions, clamp_brightness and the NumPy
+# *_batch functions against colorsys over a grid of RGB values, then times
+# each path. Exits with status 1 if any conversion differs from colorsys by
+# more than TOLERANCE on any channel. The colorsys reference conversions are
+# shared with tests/test_color.py.
+#
+# Usage: python3 benchmarks/hsv_conversion.py [--step N]
+
+import colorsys
+import os
+import sys
+import timeit
+
+from argparse import ArgumentParser
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIRECTORY)
+sys.path.insert(0, os.path.join(ROOT_DIRECTORY, 'tests'))
+
+import color  # noqa: E402
+
+# The same reference conversions and limits as the tests
+from test_color import MAX_VALUE  # noqa: E402
+from test_color import MIN_VALUE  # noqa: E402
+from test_color import TOLERANCE  # noqa: E402
+from test_color import channel_error  # noqa: E402
+from test_color import colorsys_clamp  # noqa: E402
+from test_color import colorsys_hsv_to_rgb  # noqa: E402
+
+color.load_numpy()
+
+
+def check_equivalence(colors):
+    errors = {'lut_hsv_to_rgb': 0, 'clamp_brightness': 0, 'round trip': 0}
+    hue_error = 0
+
+    for rgb in colors:
+        hsv = colorsys.rgb_to_hsv(*rgb)
+        h, s, v = color.lut_rgb_to_hsv(rgb)
+        hue_error = max(hue_error, abs(h - hsv[0]), abs(s - hsv[1]))
+
+        errors['lut_hsv_to_rgb'] = max(
+            errors['lut_hsv_to_rgb'],
+            channel_error(color.lut_hsv_to_rgb(hsv), colorsys_hsv_to_rgb(hsv)))
+        errors['clamp_brightness'] = max(
+            errors['clamp_brightness'],
+            channel_error(
+                color.clamp_brightness(rgb, MIN_VALUE, MAX_VALUE),
+                colorsys_clamp(rgb)))
+        errors['round trip'] = max(
+            errors['round trip'],
+            channel_error(color.lut_hsv_to_rgb((h, s, v)), rgb))
+
+    if color.np is not None:
+        hsv = color.rgb_to_hsv_batch(colors)
+        expected = color.np.array([colorsys.rgb_to_hsv(*c) for c in colors])
+        hue_error = max(hue_error, float(abs(hsv - expected)[:, :2].max()))
+
+        expected = color.np.array([colorsys_hsv_to_rgb(c) for c in expected])
+        errors['hsv_to_rgb_batch'] = int(abs(
+            color.hsv_to_rgb_batch(hsv).astype(int) - expected).max())
+
+    print('max hue/saturation error: {:.2e}'.format(hue_error))
+    for name, error in errors.items():
+        print('max channel error {:<18} {}'.format(name + ':', error))
+
+    return hue_error < 1e-9 and max(errors.values()) <= TOLERANCE
+
+
+def benchmark(colors):
+    hsv = [colorsys.rgb_to_hsv(*c) for c in colors]
+    n = len(colors)
+
+    def report(name, fn):
+        seconds = min(timeit.repeat(fn, number=1, repeat=3))
+        print('{:<28} {:>8.3f}us/color'.format(name, seconds / n * 1e6))
+
+    report('colorsys.rgb_to_hsv',
+           lambda: [colorsys.rgb_to_hsv(*c) for c in colors])
+    report('lut_rgb_to_hsv',
+           lambda: [color.lut_rgb_to_hsv(c) for c in colors])
+    report('colorsys.hsv_to_rgb',
+           lambda: [colorsys_hsv_to_rgb(c) for c in hsv])
+    report('lut_hsv_to_rgb',
+           lambda: [color.lut_hsv_to_rgb(c) for c in hsv])
+    report('clamp via colorsys',
+           lambda: [colorsys_clamp(c) for c in colors])
+    report('clamp_brightness',
+           lambda: [color.clamp_brightness(c, MIN_VALUE, MAX_VALUE)
+                    for c in colors])
+
+    if color.np is not None:
+        array = color.np.array(colors)
+        hsv_array = color.rgb_to_hsv_batch(array)
+        report('rgb_to_hsv_batch', lambda: color.rgb_to_hsv_batch(array))
+        report('hsv_to_rgb_batch', lambda: color.hsv_to_rgb_batch(hsv_array))
+    else:
+        print('numpy is not installed - skipping batch conversions')
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='HSV conversion benchmark')
+    parser.add_argument(
+        '--step', type=int, default=5,
+        help='Spacing between sampled values on each channel')
+    args = parser.parse_args()
+
+    values = list(range(0, 256, args.step)) + [255]
+    colors = [color.RGB(r, g, b)
+              for r in values for g in values for b in values]
+    print('Checking {} colors'.format(len(colors)))
+
+    ok = check_equivalence(colors)
+    benchmark(colors)
+
+    if not ok:
+        print('FAILED: results differ from colorsys')
+        sys.exit(1)
@@ -0,0 +1,168 @@
+# Scaling benchmark for the LightAI pipeline in extra/.
+#
+# For each size, a usage log is generated with usage_log.py (a sample every
+# minute, so 10M rows is about 19 years) and timed through each stage:
+#
+#   parse.import     parse_training_data() into a new store, parsing the
+#                    whole .dat file
+#   parse.cached     parse_training_data() again, loading the up to date store
+#   train            construct_model(), including parse.cached
+#   export           export_tree() and load_tree()
+#   table.sklearn    PredictionTable built with the sklearn classifier
+#   table.tree       PredictionTable built with the exported tree
+#   update           LightAI.update() once a minute for a day, per call
+#   render.week      ScheduleRenderer for a week, a row every 30 minutes
+#   render.year      ScheduleRenderer for a year, a row every minute
+#
+# Needs numpy and scikit-learn. Colors pushed by LightAI.update() are
+# discarded rather than sent to the server. Results can be saved as JSON
+# and compared against a previous run:
+#
+#   python3 benchmarks/lightai_pipeline.py --output new.json --compare old.json
+#
+# With --fail-threshold, exits with status 1 if any stage regressed by more
+# than the given percentage.
+
+import io
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from datetime import datetime
+from datetime import timedelta
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(
+    0, os.path.join(os.path.dirname(BENCHMARK_DIRECTORY), 'extra'))
+
+import light_ai  # noqa: E402
+import reporting  # noqa: E402
+import usage_log  # noqa: E402
+
+from lightai_model import export_tree  # noqa: E402
+from lightai_model import load_tree  # noqa: E402
+from lightai_schedule import ScheduleRenderer  # noqa: E402
+
+# construct_model() imports sklearn when it is first called. Import it here
+# so that isn't included in the first training time
+import sklearn.tree  # noqa: E402,F401
+
+SIZES = (10000, 100000, 1000000, 10000000)
+
+# Seconds between generated samples
+INTERVAL = 60
+
+
+# Stands in for LightingClient so LightAI.update() can run without a server
+class DiscardingClient:
+
+    def __init__(self):
+        self.pushes = 0
+
+    def push(self, data):
+        self.pushes += 1
+        return True
+
+
+# Returns (result, seconds taken)
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in bytes on macOS and kilobytes elsewhere
+    return peak / (1024.0 * 1024.0 if sys.platform == 'darwin' else 1024.0)
+
+
+# Returns {stage name: seconds} for a log with the given number of rows
+def run_size(rows, directory, seed):
+    data_file = os.path.join(directory, 'usage_{}.dat'.format(rows))
+    store = os.path.join(directory, 'usage_{}.store'.format(rows))
+    usage_log.write(data_file, usage_log.generate(rows, INTERVAL, seed=seed))
+
+    seconds = {}
+    with redirect_stdout(io.StringIO()):
+        seconds['parse.import'] = timed(
+            light_ai.parse_training_data, data_file, store)[1]
+        seconds['parse.cached'] = timed(
+            light_ai.parse_training_data, data_file, store)[1]
+        clf, seconds['train'] = timed(
+            light_ai.construct_model, data_file, store)
+
+        tree_directory = os.path.join(directory, 'model_{}.tree'.format(rows))
+        start = time.perf_counter()
+        export_tree(clf, tree_directory)
+        model = load_tree(tree_directory)
+        seconds['export'] = time.perf_counter() - start
+
+        now = datetime.now()
+        seconds['table.sklearn'] = timed(
+            light_ai.PredictionTable, clf, now)[1]
+        seconds['table.tree'] = timed(
+            light_ai.PredictionTable, model, now)[1]
+
+        light = light_ai.LightAI(model, DiscardingClient())
+        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        light.update(midnight)
+        start = time.perf_counter()
+        for minute in range(1440):
+            light.update(midnight + timedelta(minutes=minute))
+        seconds['update'] = (time.perf_counter() - start) / 1440
+
+        # Without day of year, the schedule is always one week
+        schedule = os.path.join(directory, 'schedule.html')
+        seconds['render.week'] = timed(
+            ScheduleRenderer, model, schedule, light_ai.USE_DAY_OF_YEAR,
+            1800, 7)[1]
+        seconds['render.year'] = timed(
+            ScheduleRenderer, model, schedule, light_ai.USE_DAY_OF_YEAR,
+            60, 365)[1]
+
+    shutil.rmtree(store)
+    os.remove(data_file)
+    return seconds, clf.tree_.node_count, clf.tree_.max_depth
+
+
+def run(sizes, seed=0):
+    results = {}
+    directory = tempfile.mkdtemp(prefix='lightai-benchmark-')
+    try:
+        for rows in sizes:
+            seconds, nodes, depth = run_size(rows, directory, seed)
+            print('{} rows: tree of {} nodes, depth {}, peak RSS {:.0f} MB'
+                  .format(rows, nodes, depth, peak_rss_mb()))
+            for stage, value in seconds.items():
+                name = '{}.{}'.format(stage, rows)
+                results[name] = {'rows': rows, 'seconds': value}
+                print('  {:<16} {:>12.6f}s'.format(stage, value))
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='LightAI pipeline benchmarks')
+    parser.add_argument(
+        '--sizes', type=str, default=','.join(str(s) for s in SIZES),
+        help='Comma separated numbers of rows to benchmark')
+    parser.add_argument(
+        '--no-day-of-year', action='store_true',
+        help='Train on day of week and time only')
+    parser.add_argument('--seed', type=int, default=0)
+    reporting.add_arguments(parser, 'stage')
+    args = parser.parse_args()
+
+    light_ai.USE_DAY_OF_YEAR = not args.no_day_of_year
+    results = run([int(size) for size in args.sizes.split(',')], args.seed)
+
+    reporting.report(
+        args, results, 'seconds', '{:>12.6f}s',
+        use_day_of_year=light_ai.USE_DAY_OF_YEAR)
@@ -0,0 +1,84 @@
+# Saving benchmark results as JSON and comparing them against a previous run,
+# shared by the benchmark scripts.
+#
+# Results are a dict of {name: {measurement: value}}. Each script picks the
+# measurement to compare (e.g. mean_us) and how to print it:
+#
+#   parser = ArgumentParser()
+#   reporting.add_arguments(parser, 'mean latency')
+#   args = parser.parse_args()
+#   ...
+#   reporting.report(args, results, 'mean_us', '{:>9.2f}us')
+
+import json
+import platform
+import sys
+
+from datetime import datetime
+
+
+# fail_threshold is the default for --fail-threshold. Without one, --compare
+# only prints the changes unless a threshold is given
+def add_arguments(parser, measurement, fail_threshold=None):
+    parser.add_argument(
+        '--output', type=str, help='Save results to this JSON file')
+    parser.add_argument(
+        '--compare', type=str, help='JSON results from a previous run')
+    parser.add_argument(
+        '--fail-threshold', type=float, default=fail_threshold,
+        help='Exit with status 1 if any {} regressed by more than this '
+             'percentage compared with --compare (default: {})'.format(
+                 measurement, fail_threshold))
+
+
+# Write results to file along with details of the machine. Any extra keyword
+# arguments are saved alongside them
+def save(file, results, **details):
+    output = {
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+    }
+    output.update(details)
+    output['results'] = results
+    with open(file, 'w') as f:
+        json.dump(output, f, indent=2)
+
+
+# Print the change in key from a previous run, formatting each value with
+# value_format. Returns the names of results that regressed by more than
+# threshold percent, ignoring any in exclude
+def compare(results, previous, key, value_format, threshold=None,
+            exclude=()):
+    line = '{:<28} ' + value_format + ' -> ' + value_format + \
+        ' {:>+7.1f}%{}'
+    regressions = []
+    print('\nChange from previous run:')
+    for name, result in results.items():
+        if name not in previous['results']:
+            continue
+        before = previous['results'][name][key]
+        change = (result[key] - before) / before * 100.0
+        flag = ''
+        if (threshold is not None and change > threshold and
+                name not in exclude):
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(line.format(name, before, result[key], change, flag))
+    return regressions
+
+
+# Handle the arguments added by add_arguments(): save the results, compare
+# them with the previous run and exit with status 1 if any regressed
+def report(args, results, key, value_format, exclude=(), **details):
+    if args.output:
+        save(args.output, results, **details)
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(
+                results, json.load(f), key, value_format,
+                args.fail_threshold, exclude)
+        if regressions:
+            print('Regressed: {}'.format(', '.join(regressions)))
+            sys.exit(1)
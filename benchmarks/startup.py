@@ -0,0 +1,239 @@
+# Startup benchmark for the entry points.
+#
+# Each entry point is started in a new interpreter, the way it is on the Pi,
+# and timed from launching the process until:
+#
+#   main.first_frame             main.py's event loop has drawn its first
+#                                frame
+#   light_ai.first_prediction    light_ai.py has loaded an exported model and
+#                                predicted the current color
+#   lightai_logger               the logger has exited (cron runs it with -S)
+#
+# An empty interpreter is timed too, for reference. Each is run several
+# times and the median is reported. Results can be saved as JSON and compared
+# against a previous run:
+#
+#   python3 benchmarks/startup.py --output new.json --compare old.json
+#
+# Exits with status 1 if any entry point's median startup time regressed by
+# more than FAIL_THRESHOLD percent, or the percentage given with
+# --fail-threshold.
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from argparse import ArgumentParser
+from types import SimpleNamespace
+
+import reporting
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIRECTORY = os.path.dirname(BENCHMARK_DIRECTORY)
+EXTRA_DIRECTORY = os.path.join(ROOT_DIRECTORY, 'extra')
+STUBS_DIRECTORY = os.path.join(BENCHMARK_DIRECTORY, 'stubs')
+
+# Each script prints the time at which it reached its milestone
+MAIN_SCRIPT = '''
+import sys
+sys.path.insert(0, {stubs!r})
+sys.path.insert(0, {root!r})
+
+import asyncio
+import time
+
+import main
+from eventloop import LightsLoop
+from output import MemoryDriver
+from scheduler import FrameScheduler
+from watcher import get_watcher
+
+main.init_files()
+lights = main.Lights([main.Zone('0', (0, 1, 2))], MemoryDriver(), None, None)
+lights_loop = LightsLoop(
+    lights, FrameScheduler(main.FRAME_RATE, main.IDLE_FRAME_RATE),
+    get_watcher())
+
+async def first_frame():
+    loop = asyncio.get_running_loop()
+    drawn = loop.create_future()
+    lights_loop.after_first_frame(
+        lambda: loop.call_soon_threadsafe(drawn.set_result, time.time()))
+    task = asyncio.ensure_future(lights_loop.run())
+    await asyncio.wait([drawn, task], return_when=asyncio.FIRST_COMPLETED)
+    if not drawn.done():
+        # Raises whatever stopped the loop
+        task.result()
+    task.cancel()
+    return drawn.result()
+
+print(asyncio.run(first_frame()))
+'''
+
+LIGHT_AI_SCRIPT = '''
+import sys
+sys.path.insert(0, {extra!r})
+
+from datetime import datetime
+
+import light_ai
+
+model = light_ai.load_saved_model({model!r})
+now = datetime.now()
+light_ai.PredictionTable(model, now).get(now)
+
+import time
+print(time.time())
+'''
+
+# Depth of the balanced tree exported for light_ai.py. A year of samples
+# gives a tree of roughly this size
+TREE_DEPTH = 14
+TREE_CLASSES = 64
+
+# Startup times vary by up to 20% from run to run on a busy machine, so
+# smaller changes than this aren't treated as regressions
+FAIL_THRESHOLD = 25.0
+
+# Timed for reference only - these measure the machine rather than the
+# code, so they are never reported as regressions
+REFERENCE = ('python', 'python.no_site')
+
+
+# Write an exported tree that splits the day into 2 ** TREE_DEPTH periods,
+# using the same export as a trained model
+def write_tree(directory):
+    import numpy as np
+    from lightai_model import export_tree
+
+    internal = 2 ** TREE_DEPTH - 1
+    count = 2 * internal + 1
+    nodes = np.arange(count)
+    leaves = nodes >= internal
+
+    # Heap layout: the children of node i are 2i + 1 and 2i + 2. Each node
+    # splits its share of the day in half on second_of_day (feature 2)
+    level = np.floor(np.log2(nodes + 1)).astype(int)
+    position = nodes + 1 - 2 ** level
+    width = 86400.0 / 2 ** level
+    threshold = np.where(leaves, -2.0, (position + 0.5) * width)
+
+    value = np.zeros((count, 1, TREE_CLASSES))
+    value[leaves, 0, (nodes[leaves] - internal) % TREE_CLASSES] = 1
+
+    classifier = SimpleNamespace(
+        classes_=np.array([
+            '{} {} {}'.format(i * 4, 255 - i * 4, 128)
+            for i in range(TREE_CLASSES)
+        ]),
+        tree_=SimpleNamespace(
+            node_count=count,
+            children_left=np.where(leaves, -1, 2 * nodes + 1),
+            children_right=np.where(leaves, -1, 2 * nodes + 2),
+            feature=np.where(leaves, -2, 2),
+            threshold=threshold,
+            value=value,
+            max_depth=TREE_DEPTH,
+            n_features=3,
+        ))
+    export_tree(classifier, directory)
+
+
+# Run command, which prints the time it reached its milestone (or nothing,
+# to be timed until it exits). Returns the elapsed time in ms
+def time_command(command, env=None, cwd=None):
+    start = time.time()
+    process = subprocess.run(
+        command, env=env, cwd=cwd, stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE, universal_newlines=True)
+    end = time.time()
+
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1])
+
+    lines = process.stdout.strip().splitlines()
+    try:
+        end = float(lines[-1])
+    except (IndexError, ValueError):
+        pass
+    return (end - start) * 1000.0
+
+
+# Returns a list of (name, command, env) for each entry point
+def get_entry_points(directory):
+    python = sys.executable
+    entry_points = [
+        ('python', [python, '-c', 'pass'], None),
+        ('python.no_site', [python, '-S', '-c', 'pass'], None),
+    ]
+
+    status_root = os.path.join(directory, 'status')
+    os.makedirs(status_root)
+    env = dict(os.environ)
+    env['LIGHTS_STATUS_ROOT'] = status_root
+    env['LIGHTS_STATUS_BLOCK'] = os.path.join(status_root, 'status_block')
+    entry_points.append(('main.first_frame', [
+        python, '-c',
+        MAIN_SCRIPT.format(stubs=STUBS_DIRECTORY, root=ROOT_DIRECTORY),
+    ], env))
+
+    model = os.path.join(directory, 'model.tree')
+    try:
+        sys.path.insert(0, EXTRA_DIRECTORY)
+        write_tree(model)
+    except ImportError as e:
+        print('Skipping light_ai.py: {}'.format(e))
+    else:
+        entry_points.append(('light_ai.first_prediction', [
+            python, '-c',
+            LIGHT_AI_SCRIPT.format(extra=EXTRA_DIRECTORY, model=model),
+        ], None))
+
+    with open(os.path.join(status_root, 'canonical'), 'w') as f:
+        f.write('255 120 0\n')
+    entry_points.append(('lightai_logger', [
+        python, '-S', os.path.join(EXTRA_DIRECTORY, 'lightai_logger.py'),
+        status_root, os.path.join(directory, 'led_usage_log.dat'),
+    ], None))
+
+    return entry_points
+
+
+def run(repeats, name_filter=None):
+    results = {}
+    with tempfile.TemporaryDirectory(prefix='lights-startup-') as directory:
+        for name, command, env in get_entry_points(directory):
+            if name_filter and name_filter not in name:
+                continue
+
+            # The first run also writes the .pyc files
+            time_command(command, env, directory)
+            timings = sorted(
+                time_command(command, env, directory) for _ in range(repeats))
+            results[name] = {
+                'repeats': repeats,
+                'median_ms': timings[len(timings) // 2],
+                'min_ms': timings[0],
+                'max_ms': timings[-1],
+            }
+            print('{:<28} {:>9.1f}ms median {:>9.1f}ms min {:>9.1f}ms '
+                  'max'.format(
+                      name, results[name]['median_ms'],
+                      results[name]['min_ms'], results[name]['max_ms']))
+    return results
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Entry point startup benchmarks')
+    parser.add_argument('--repeats', type=int, default=7)
+    parser.add_argument(
+        '--filter', type=str, help='Only run entry points containing this text')
+    reporting.add_arguments(parser, 'median startup time', FAIL_THRESHOLD)
+    args = parser.parse_args()
+
+    results = run(args.repeats, args.filter)
+
+    reporting.report(
+        args, results, 'median_ms', '{:>9.1f}ms', exclude=REFERENCE)
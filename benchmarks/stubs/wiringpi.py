@@ -0,0 +1,18 @@
+# Stand-in for the wiringpi module so SoftPwmDriver can be benchmarked on
+# machines without GPIO. Every call succeeds and does nothing.
+
+
+def wiringPiSetupGpio():
+    return 0
+
+
+def pinMode(pin, mode):
+    pass
+
+
+def softPwmCreate(pin, initial_value, pwm_range):
+    return 0
+
+
+def softPwmWrite(pin, value):
+    pass
@@ -0,0 +1,175 @@
+# Generates synthetic led_usage_log.dat files in the format written by
+# extra/lightai_logger.py, for measuring how LightAI copes with more data
+# than a real household has collected.
+#
+# Each day follows a routine. The lights come on at a warm color when the
+# household wakes up, go off when they leave for work and come back on in
+# the evening (no earlier than sunset, which is later in summer), then dim
+# before bed. At weekends everyone gets up and goes to bed later, and on
+# dull days the lights are left on through the afternoon. On top of that:
+#   - wake, leave, return and bed times vary from day to day
+#   - two weeks a year are spent away, with the lights off
+#   - some evenings use a party color instead of the usual routine
+#   - a small fraction of samples show a random color
+#
+#   python3 benchmarks/usage_log.py led_usage_log.dat --rows 1000000
+
+import colorsys
+
+from argparse import ArgumentParser
+from datetime import datetime
+from datetime import timedelta
+
+import numpy as np
+
+# How often the logger records a sample (cron runs it every 15 minutes)
+LOG_INTERVAL = 900
+
+OFF = (0, 0, 0)
+MORNING = (255, 180, 110)
+DAYTIME = (255, 230, 200)
+EVENING = (255, 140, 60)
+LATE = (120, 50, 15)
+EXTRAS = [
+    (255, 0, 255), (0, 120, 255), (255, 40, 0), (40, 255, 120),
+    (160, 0, 255),
+]
+PALETTE = [OFF, MORNING, DAYTIME, EVENING, LATE] + EXTRAS
+
+# Fraction of days with a party color in the evening, and of samples with
+# a random color
+PARTY_DAYS = 0.03
+NOISE = 0.01
+
+AWAY_WEEKS_PER_YEAR = 2
+
+# Rows formatted at a time when writing
+WRITE_CHUNK = 1000000
+
+
+# Returns the columns of a log with the given number of rows, starting at
+# midnight on start, as a dict of arrays: day_of_year, day_of_week,
+# second_of_day, and color (an index into PALETTE)
+def generate(rows, interval=LOG_INTERVAL, start=None, seed=0):
+    if interval <= 0 or 86400 % interval:
+        raise ValueError(
+            'Interval must divide a day exactly: {}'.format(interval))
+
+    rng = np.random.default_rng(seed)
+    per_day = 86400 // interval
+    days = -(-rows // per_day)
+
+    start = start or datetime(2020, 1, 1)
+    dates = [(start + timedelta(days=day)).timetuple() for day in range(days)]
+    day_of_year = np.array([date.tm_yday for date in dates], dtype=np.uint16)
+    day_of_week = np.array([date.tm_wday for date in dates], dtype=np.uint8)
+
+    # Routine for each day, in hours after midnight
+    weekend = day_of_week >= 5
+    late_night = (day_of_week == 4) | (day_of_week == 5)
+    summer = np.cos(2 * np.pi * (day_of_year - 172) / 365.25)
+    sunset = 19.0 + 2.5 * summer
+
+    wake = np.where(weekend, 9.0, 6.75) + rng.normal(0, 0.25, days)
+    leave = wake + np.where(weekend, 1.5, 1.25) + rng.normal(0, 0.2, days)
+    home = np.where(weekend, leave, 17.75 + rng.normal(0, 0.4, days))
+    evening = np.maximum(home, sunset - 0.5)
+    bed = np.where(late_night, 24.5, 23.0) + rng.normal(0, 0.4, days)
+    late = bed - 1.0 + rng.normal(0, 0.25, days)
+
+    # Lights left on through weekend afternoons, mostly in winter
+    dull = weekend & (rng.random(days) < 0.45 - 0.3 * summer)
+
+    away = np.zeros(days, dtype=bool)
+    for year in range(0, days, 365):
+        for week in range(AWAY_WEEKS_PER_YEAR):
+            first = year + rng.integers(0, 358)
+            away[first:first + 7] = True
+
+    party = rng.random(days) < PARTY_DAYS
+    party_color = rng.integers(len(PALETTE) - len(EXTRAS), len(PALETTE), days)
+
+    # Samples are taken a few seconds after each interval, as cron would
+    index = np.arange(rows)
+    day = index // per_day
+    second_of_day = (index % per_day) * interval + rng.integers(
+        0, min(interval, 5), rows)
+    hour = second_of_day / 3600.0
+
+    # Staying up past midnight continues the previous night
+    previous_bed = np.concatenate([[0.0], bed[:-1] - 24.0])[day]
+
+    evening_color = np.where(
+        party, party_color, PALETTE.index(EVENING))[day]
+    color = np.select(
+        [
+            hour < previous_bed,
+            hour < wake[day],
+            hour < leave[day],
+            hour < evening[day],
+            hour < late[day],
+            hour < bed[day],
+        ],
+        [
+            PALETTE.index(LATE),
+            PALETTE.index(OFF),
+            PALETTE.index(MORNING),
+            np.where(dull[day], PALETTE.index(DAYTIME), PALETTE.index(OFF)),
+            evening_color,
+            PALETTE.index(LATE),
+        ],
+        PALETTE.index(OFF))
+
+    noise = rng.random(rows) < NOISE
+    color[noise] = rng.integers(0, len(PALETTE), int(noise.sum()))
+    color[away[day]] = PALETTE.index(OFF)
+
+    return {
+        'day_of_year': day_of_year[day],
+        'day_of_week': day_of_week[day],
+        'second_of_day': second_of_day,
+        'color': color,
+    }
+
+
+# Each palette color as written by the logger: 'r g b,hue,saturation,value'
+def _labels():
+    return [
+        '{} {} {},{},{},{}'.format(r, g, b, *colorsys.rgb_to_hsv(r, g, b))
+        for r, g, b in PALETTE
+    ]
+
+
+def write(file, columns):
+    labels = _labels()
+    with open(file, 'w') as f:
+        f.write('#\n# Synthetic usage log generated by usage_log.py\n#\n\n')
+        for first in range(0, len(columns['color']), WRITE_CHUNK):
+            chunk = slice(first, first + WRITE_CHUNK)
+            f.write(''.join([
+                '{},{},{}:{}\n'.format(
+                    day_of_year, day_of_week, second_of_day, labels[color])
+                for day_of_year, day_of_week, second_of_day, color in zip(
+                    columns['day_of_year'][chunk].tolist(),
+                    columns['day_of_week'][chunk].tolist(),
+                    columns['second_of_day'][chunk].tolist(),
+                    columns['color'][chunk].tolist())
+            ]))
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description='Generate a synthetic usage log')
+    parser.add_argument('output', type=str, help='Filename for the .dat file')
+    parser.add_argument(
+        '--rows', type=int, help='Number of samples (default: --years)')
+    parser.add_argument(
+        '--years', type=float, default=3, help='Years of samples')
+    parser.add_argument(
+        '--interval', type=int, default=LOG_INTERVAL,
+        help='Seconds between samples')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = args.rows or int(args.years * 365 * 86400 // args.interval)
+    write(args.output, generate(rows, args.interval, seed=args.seed))
+    print('Wrote {} samples to {}'.format(rows, args.output))
@@ -0,0 +1,41 @@
+from collections import namedtuple
+from time import monotonic_ns
+from time import time
+
+NS_PER_SECOND = 1000000000
+
+
+# The time at which a frame is drawn, sampled once per frame and shared by
+# everything that draws it.
+#
+# ns is a monotonic timestamp in nanoseconds, which should be used for
+# measuring durations as it never jumps when the system clock is set (e.g.
+# by NTP on a Raspberry Pi that has no real time clock). wall is the Unix
+# time in seconds, for comparing with the timestamps in the status files.
+class FrameTime(namedtuple('FrameTime', ['ns', 'wall'])):
+    __slots__ = ()
+
+    # Seconds elapsed since the monotonic timestamp since_ns
+    def since(self, since_ns):
+        return (self.ns - since_ns) / NS_PER_SECOND
+
+
+class Clock:
+
+    def now(self):
+        return FrameTime(monotonic_ns(), time())
+
+
+# A clock that only moves when told to, for running the lights faster than
+# realtime in benchmarks and simulations
+class SimulatedClock(Clock):
+
+    def __init__(self, wall=None):
+        self.ns = 0
+        self.start_wall = time() if wall is None else wall
+
+    def now(self):
+        return FrameTime(self.ns, self.start_wall + self.ns / NS_PER_SECOND)
+
+    def advance(self, seconds):
+        self.ns += int(seconds * NS_PER_SECOND)
@@ -1,19 +1,53 @@
-from colorsys import hsv_to_rgb, rgb_to_hsv
+import colorsys
+
+from collections import namedtuple
 from math import fabs
 
+# numpy is only needed for the *_batch functions, and takes long enough to
+# import on a Raspberry Pi that it would hold up the first frame. It isn't
+# imported until load_numpy() is called - until then np is None and callers
+# use their pure Python paths.
+np = None
+
+
+# Import numpy if it is installed. Returns the module, or None
+def load_numpy():
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            return None
+        np = numpy
+    return np
+
+
+# Immutable 8-bit RGB color.
+# Colors are stored as "r g b" strings in status files and passed around as
+# RGB everywhere else - use string_to_rgb and str() to convert at the file
+# boundary.
+class RGB(namedtuple('RGB', ['r', 'g', 'b'])):
+    __slots__ = ()
+
+    def __str__(self):
+        return '{} {} {}'.format(self.r, self.g, self.b)
+
+
+BLACK = RGB(0, 0, 0)
+
 
 class Color:
-    _RED = "255 0 0"
-    _GREEN = "0 255 0"
-    _BLUE = "0 0 255"
-    _YELLOW = "255 255 0"
-    _CYAN = "0 255 255"
-    _MAGENTA = "255 0 255"
-    _WHITE = "255 255 255"
-    _BLACK = "0 0 0"
-
-    _ORANGE = "255 10 0"
-    _PINK = "255 0 10"
+    _RED = RGB(255, 0, 0)
+    _GREEN = RGB(0, 255, 0)
+    _BLUE = RGB(0, 0, 255)
+    _YELLOW = RGB(255, 255, 0)
+    _CYAN = RGB(0, 255, 255)
+    _MAGENTA = RGB(255, 0, 255)
+    _WHITE = RGB(255, 255, 255)
+    _BLACK = BLACK
+
+    _ORANGE = RGB(255, 10, 0)
+    _PINK = RGB(255, 0, 10)
 
     NAMES = {
         'red': _RED,
@@ -65,47 +99,171 @@ class Color:
                 return self.colors[self.index]
 
 
+# Parse an "r g b" string from a status file. Anything outside 0-255 is
+# clamped, since the lookup tables below are only that big
 def string_to_rgb(string):
-    r, g, b = [int(x) for x in string.split(" ")]
-    return (r, g, b)
+    r, g, b = [min(255, max(0, int(x))) for x in string.split()]
+    return RGB(r, g, b)
+
+
+def rgb_to_string(rgb):
+    return str(RGB(*rgb))
+
+
+# h and s are in the range [0, 1], v is in the range [0, 255]
+def rgb_to_hsv(rgb):
+    return colorsys.rgb_to_hsv(*rgb)
+
+
+def hsv_to_rgb(hsv):
+    r, g, b = colorsys.hsv_to_rgb(*hsv)
+    return RGB(int(r), int(g), int(b))
 
 
 def string_to_hsv(string):
-    r, g, b = string_to_rgb(string)
-    h, s, v = rgb_to_hsv(r, g, b)
-    return h, s, v
+    return rgb_to_hsv(string_to_rgb(string))
 
 
-def rgb_to_string(rgb):
+def hsv_to_string(hsv):
+    return str(hsv_to_rgb(hsv))
+
+
+#
+# Table-based conversions for the per-frame path.
+#
+# These avoid calling colorsys (and its divisions) for every color. Results
+# match rgb_to_hsv/hsv_to_rgb to within 1 on each 0-255 channel.
+#
+
+# Number of precomputed hues for lut_hsv_to_rgb
+HUE_STEPS = 1536
+
+_RECIPROCALS = [0.0] + [1.0 / i for i in range(1, 256)]
+
+# Channel fractions of the fully saturated, full brightness color at each hue
+_HUE_TABLE = [colorsys.hsv_to_rgb(i / HUE_STEPS, 1.0, 1.0)
+              for i in range(HUE_STEPS)]
+
+
+def lut_rgb_to_hsv(rgb):
     r, g, b = rgb
-    return "{} {} {}".format(r, g, b)
+    maxc = max(r, g, b)
+    minc = min(r, g, b)
+    if maxc == minc:
+        return 0.0, 0.0, maxc
+
+    delta = maxc - minc
+    s = delta * _RECIPROCALS[maxc]
+    inverse_delta = _RECIPROCALS[delta]
+    if r == maxc:
+        h = (g - b) * inverse_delta
+    elif g == maxc:
+        h = 2.0 + (b - r) * inverse_delta
+    else:
+        h = 4.0 + (r - g) * inverse_delta
+    return (h / 6.0) % 1.0, s, maxc
 
 
-def hsv_to_string(hsv):
+def lut_hsv_to_rgb(hsv):
     h, s, v = hsv
-    r, g, b = [int(x) for x in hsv_to_rgb(h, s, v)]
+    if s == 0.0:
+        v = int(v)
+        return RGB(v, v, v)
+
+    fr, fg, fb = _HUE_TABLE[int(h * HUE_STEPS + 0.5) % HUE_STEPS]
+
+    # Each channel is v * (1 - s * (1 - fraction))
+    k = v * s
+    base = v - k
+    return RGB(int(base + k * fr), int(base + k * fg), int(base + k * fb))
+
+
+# Equivalent to set_brightness() with value given in the range [0, 255].
+# Changing brightness while keeping hue and saturation is just a scale of
+# all channels so there is no need to go through HSV at all.
+def scale_brightness(rgb, value):
+    r, g, b = rgb
+    maxc = max(r, g, b)
+    if maxc == 0:
+        value = int(value)
+        return RGB(value, value, value)
 
-    return rgb_to_string((r, g, b))
+    k = value * _RECIPROCALS[maxc]
+    return RGB(int(r * k), int(g * k), int(b * k))
 
 
-def get_hue(string):
-    h, s, v = string_to_hsv(string)
+# Constrain brightness to the range [min_value, max_value] (0-255)
+def clamp_brightness(rgb, min_value, max_value):
+    maxc = max(rgb)
+    value = int(min(max_value, max(maxc, min_value)))
+    if value == maxc:
+        return rgb
+    return scale_brightness(rgb, value)
+
+
+#
+# NumPy batch conversions for arrays of colors with shape (n, 3)
+#
+
+def rgb_to_hsv_batch(rgb):
+    load_numpy()
+    rgb = np.asarray(rgb, dtype=np.float64)
+    r, g, b = rgb[:, 0], rgb[:, 1], rgb[:, 2]
+    maxc = rgb.max(axis=1)
+    minc = rgb.min(axis=1)
+    delta = maxc - minc
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = np.where(maxc > 0, delta / maxc, 0.0)
+        h = np.select(
+            [r == maxc, g == maxc],
+            [(g - b) / delta, 2.0 + (b - r) / delta],
+            4.0 + (r - g) / delta)
+    h = np.where(delta > 0, (h / 6.0) % 1.0, 0.0)
+
+    return np.stack([h, s, maxc], axis=1)
+
+
+def hsv_to_rgb_batch(hsv):
+    load_numpy()
+    hsv = np.asarray(hsv, dtype=np.float64)
+    h, s, v = hsv[:, 0], hsv[:, 1], hsv[:, 2]
+
+    sector = np.floor(h * 6.0)
+    f = h * 6.0 - sector
+    sector = sector.astype(np.int64) % 6
+    p = v * (1.0 - s)
+    q = v * (1.0 - s * f)
+    t = v * (1.0 - s * (1.0 - f))
+
+    # Channel values for each of the six hue sectors, as in colorsys
+    r = np.choose(sector, [v, q, p, p, t, v])
+    g = np.choose(sector, [t, v, v, q, p, p])
+    b = np.choose(sector, [p, p, t, v, v, q])
+
+    rgb = np.stack([r, g, b], axis=1)
+    rgb[s == 0.0] = v[s == 0.0, None]
+    return rgb.astype(np.uint8)
+
+
+def get_hue(rgb):
+    h, s, v = lut_rgb_to_hsv(rgb)
     return h
 
 
-def get_saturation(string):
-    h, s, v = string_to_hsv(string)
+def get_saturation(rgb):
+    h, s, v = lut_rgb_to_hsv(rgb)
     return s
 
 
-def get_brightness(string):
-    h, s, v = string_to_hsv(string)
-    return v
+# HSV value, in the range [0, 255]
+def get_brightness(rgb):
+    return max(rgb)
 
 
-def set_brightness(string, value):
-    h, s, v = string_to_hsv(string)
-    return hsv_to_string((h, s, value * 255.0))
+# value is in the range [0, 1]
+def set_brightness(rgb, value):
+    return scale_brightness(rgb, value * 255.0)
 
 #
 # Functions for interpolating from one color to another
@@ -132,12 +290,12 @@ def progress(v, a, b):
     return constrain((v - v1) / (v2 - v1), 0, 1)
 
 
-def morph(from_string, to_string, t):
+def morph(from_rgb, to_rgb, t):
     # from_hue, from_saturation, from_value
-    fh, fs, fv = string_to_hsv(from_string)
+    fh, fs, fv = lut_rgb_to_hsv(from_rgb)
 
     # to_hue, to_saturation, to_value
-    th, ts, tv = string_to_hsv(to_string)
+    th, ts, tv = lut_rgb_to_hsv(to_rgb)
 
     # Decide how close the hues are to each other to determine whether
     # we should interpolate directly between them or use an
@@ -155,21 +313,22 @@ def morph(from_string, to_string, t):
         d2 = progress(t, 0.6, 1.0)
 
         # desaturate and dim, then change hue, then brighten and saturate again
+        # (v is already in the range [0, 255])
         min_saturation = 0.9 * fs
         min_brightness = 0.05 * fv
 
         if d1 == 0:
             h = fh
             s = interpolate(d0, fs, min_saturation)
-            v = interpolate(d0, fv, min_brightness * 255.0)
+            v = interpolate(d0, fv, min_brightness)
         elif d2 == 0:
             h = interpolate(d1, fh, th)
             s = min_saturation
-            v = min_brightness * 255.0
+            v = min_brightness
         else:
             h = th
             s = interpolate(d2, min_saturation, ts)
-            v = interpolate(d2, min_brightness * 255.0, tv)
+            v = interpolate(d2, min_brightness, tv)
 
     if tv == 0:
         h = fh
@@ -178,4 +337,44 @@ def morph(from_string, to_string, t):
         h = th
         s = ts
 
-    return hsv_to_string((h, s, v))
+    return lut_hsv_to_rgb((h, s, v))
+
+
+# Evaluate morph() at every value in the array t at once.
+# Returns a uint8 array of shape (len(t), 3)
+def morph_batch(from_rgb, to_rgb, t):
+    load_numpy()
+    t = np.asarray(t, dtype=np.float64)
+    fh, fs, fv = lut_rgb_to_hsv(from_rgb)
+    th, ts, tv = lut_rgb_to_hsv(to_rgb)
+
+    if fabs(fh - th) < 0.2:
+        h = interpolate(t, fh, th)
+        s = interpolate(t, fs, ts)
+        v = interpolate(t, fv, tv)
+    else:
+        d0 = np.clip(t / 0.4, 0, 1)
+        d1 = np.clip((t - 0.4) / 0.2, 0, 1)
+        d2 = np.clip((t - 0.6) / 0.4, 0, 1)
+
+        min_saturation = 0.9 * fs
+        min_brightness = 0.05 * fv
+
+        phases = [d1 == 0, d2 == 0]
+        h = np.select(phases, [fh, interpolate(d1, fh, th)], th)
+        s = np.select(
+            phases,
+            [interpolate(d0, fs, min_saturation), min_saturation],
+            interpolate(d2, min_saturation, ts))
+        v = np.select(
+            phases,
+            [interpolate(d0, fv, min_brightness), min_brightness],
+            interpolate(d2, min_brightness, tv))
+
+    if tv == 0:
+        h, s = fh, fs
+    elif fv == 0:
+        h, s = th, ts
+
+    h, s, v = np.broadcast_arrays(h, s, v)
+    return hsv_to_rgb_batch(np.stack([h, s, v], axis=1))
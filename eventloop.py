@@ -0,0 +1,295 @@
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter_ns
+
+from util import log
+
+# How often status files are checked for changes when inotify is unavailable
+# (in seconds)
+POLL_INTERVAL = 0.5
+
+
+# Runs main.Lights on an asyncio event loop.
+#
+# Each input source is handled by its own task, and a single render task
+# draws frames from whatever the sources most recently produced:
+#
+#   - A task for each status file (preferences, ambient, notifications and
+#     the ambient_ai and mech files imported into the status block) reloads
+#     it as soon as inotify reports a change.
+#   - A task for each zone runs its behaviour in a worker thread once per
+#     frame. A slow behaviour only delays its own zone's next color; frames,
+#     transitions and notifications carry on regardless.
+#   - Streamed colors are read as soon as a packet arrives. Zones being
+#     streamed don't run their behaviours, as their color is replaced.
+#
+# While the output is static, the render task sleeps at the idle frame rate
+# but is woken straight away when any source produces something new.
+#
+# With a timer, reloading preferences and importing the status files are
+# timed when they happen, as the preferences and status stages. Reading
+# ambient colors and running behaviours are summed over every zone that ran
+# since the previous frame and recorded once per frame as the ambient and
+# behaviour stages.
+class LightsLoop:
+
+    # lights is a main.Lights, scheduler is a scheduler.FrameScheduler and
+    # watcher is the watcher.StatusFileWatcher used for the status files.
+    # If debug is True, errors stop the loop instead of being printed.
+    def __init__(self, lights, scheduler, watcher, debug=False):
+        self.lights = lights
+        self.scheduler = scheduler
+        self.watcher = watcher
+        self.debug = debug
+
+        # Most recent (color, is_canonical) result for each zone
+        self.results = []
+
+        # {zone index: rgb} streamed in the most recent frame
+        self.streamed = {}
+
+        # clock.FrameTime of the most recent frame, which behaviours are
+        # given when they next run
+        self.now = lights.clock.now()
+        self.periodic = []
+        self.background = []
+        self.executor = ThreadPoolExecutor(
+            max_workers=len(lights.zones),
+            thread_name_prefix='behaviour')
+
+        # Time (ns) each zone spent reading its ambient color and running
+        # its behaviour since the last frame was drawn
+        self.ambient_time = [0] * len(lights.zones)
+        self.behaviour_time = [0] * len(lights.zones)
+
+    # Call callback every interval seconds while running
+    def every(self, interval, callback):
+        self.periodic.append((interval, callback))
+
+    # Call callback in a worker thread once the first frame has been drawn,
+    # for slow setup that the first frame doesn't need
+    def after_first_frame(self, callback):
+        self.background.append(callback)
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        lights = self.lights
+
+        self.woken = asyncio.Event()
+        self.frame_ready = [asyncio.Event() for zone in lights.zones]
+
+        # Show each zone's ambient color until its behaviour has run
+        self.results = [
+            (zone.get_ambient()[0], False) for zone in lights.zones
+        ]
+
+        if self.watcher.has_inotify:
+            loop.add_reader(self.watcher.fileno(), self.watcher.poll)
+        if lights.stream is not None:
+            loop.add_reader(lights.stream.fileno(), self._on_stream_readable)
+
+        # Changes to ambient colors only reach the output through the
+        # behaviours, so they don't need to wake the render task themselves
+        sources = [
+            (lights.preferences.source, lights._refresh_preferences, True,
+             'preferences'),
+            (lights.notification_handler.notifications, None, True, None),
+        ] + [
+            (watched, lights.legacy_files.import_files, False, 'status')
+            for watched in lights.legacy_files.watched_files()
+        ] + [
+            (zone.zone_ambient, None, False, None) for zone in lights.zones
+        ]
+
+        tasks = [asyncio.ensure_future(self._render())]
+        tasks += [
+            asyncio.ensure_future(
+                self._watch(watched, on_change, wake, stage))
+            for watched, on_change, wake, stage in sources
+        ]
+        tasks += [
+            asyncio.ensure_future(self._behaviour(index, zone))
+            for index, zone in enumerate(lights.zones)
+        ]
+        tasks += [
+            asyncio.ensure_future(self._every(interval, callback))
+            for interval, callback in self.periodic
+        ]
+
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            if self.watcher.has_inotify:
+                loop.remove_reader(self.watcher.fileno())
+            if lights.stream is not None:
+                loop.remove_reader(lights.stream.fileno())
+            self.executor.shutdown(wait=False)
+
+    # Start the next frame now if the render task is idle
+    def wake(self):
+        self.woken.set()
+
+    # Let each zone's behaviour run again. Their results wake the render
+    # task if they have changed
+    def _run_behaviours(self):
+        for frame_ready in self.frame_ready:
+            frame_ready.set()
+
+    def _on_stream_readable(self):
+        # Drain the socket here, otherwise the loop would keep calling us
+        # until the next frame read it
+        self.lights.stream.poll()
+        self.wake()
+
+    async def _render(self):
+        loop = asyncio.get_running_loop()
+        first_frame = True
+        while True:
+            self.woken.clear()
+            frame_start = loop.time()
+            active = True
+            try:
+                active = self._render_frame()
+            except Exception as e:
+                if self.debug:
+                    raise
+                print('Error: {}'.format(e))
+
+            self._run_behaviours()
+
+            if first_frame:
+                first_frame = False
+                for callback in self.background:
+                    loop.run_in_executor(None, callback)
+
+            delay = self.scheduler.next_delay(active)
+            if active:
+                await asyncio.sleep(delay)
+                continue
+
+            # Idle: wait out the idle interval unless a source has something
+            # new, but never start frames faster than the full frame rate
+            try:
+                await asyncio.wait_for(self.woken.wait(), delay)
+            except asyncio.TimeoutError:
+                continue
+            await asyncio.sleep(
+                frame_start + self.scheduler.interval - loop.time())
+            self.scheduler.restart()
+
+    def _render_frame(self):
+        lights = self.lights
+        timer = lights.timer
+        if timer:
+            timer.start()
+
+        self.now = lights.clock.now()
+        self.streamed = lights.poll_stream()
+        if timer:
+            timer.lap('stream')
+            self._record_behaviour_times(timer)
+
+        return lights.render(list(self.results), self.streamed, self.now)
+
+    # Record the ambient and behaviour stages for the behaviours that have
+    # run since the previous frame, if any
+    def _record_behaviour_times(self, timer):
+        if not any(self.behaviour_time):
+            return
+
+        zones = len(self.lights.zones)
+        timer.record('ambient', sum(self.ambient_time))
+        timer.record('behaviour', sum(self.behaviour_time))
+        self.ambient_time = [0] * zones
+        self.behaviour_time = [0] * zones
+
+    async def _behaviour(self, index, zone):
+        loop = asyncio.get_running_loop()
+        frame_ready = self.frame_ready[index]
+        while True:
+            await frame_ready.wait()
+            frame_ready.clear()
+            if index in self.streamed:
+                # Replaced by the streamed color in render()
+                continue
+
+            # Status files are read here on the event loop; only the
+            # behaviour itself runs in the worker thread
+            timer = self.lights.timer
+            if timer:
+                start = perf_counter_ns()
+            color, timestamp = zone.get_ambient()
+            if timer:
+                self.ambient_time[index] += perf_counter_ns() - start
+
+            try:
+                result = await loop.run_in_executor(
+                    self.executor, self._update, index, color, timestamp,
+                    self.now, self.lights.preferences.inactivity_timeout)
+            except Exception as e:
+                if self.debug:
+                    raise
+                print('Error in behaviour for zone \'{}\': {}'.format(
+                    zone.name, e))
+                continue
+
+            if result != self.results[index]:
+                self.results[index] = result
+                self.wake()
+
+    # Run a zone's behaviour. Called in a worker thread
+    def _update(self, index, color, timestamp, now, inactivity_timeout):
+        zone = self.lights.zones[index]
+        if not self.lights.timer:
+            return zone.update(color, timestamp, now, inactivity_timeout)
+
+        start = perf_counter_ns()
+        result = zone.update(color, timestamp, now, inactivity_timeout)
+        self.behaviour_time[index] += perf_counter_ns() - start
+        return result
+
+    # Reload watched when it changes, then call on_change. If wake is True
+    # the render task is woken as well as the behaviours. If stage is given,
+    # the time taken to reload and apply the change is recorded against it.
+    async def _watch(self, watched, on_change=None, wake=True, stage=None):
+        changed = asyncio.Event()
+        watched.add_listener(changed.set)
+        timeout = None if self.watcher.has_inotify else POLL_INTERVAL
+
+        version = watched.version
+        while True:
+            try:
+                await asyncio.wait_for(changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            changed.clear()
+
+            start = perf_counter_ns()
+            watched.get()
+            if watched.version == version:
+                continue
+            version = watched.version
+
+            if on_change is not None:
+                try:
+                    on_change()
+                except Exception as e:
+                    if self.debug:
+                        raise
+                    log('Unable to apply {}: {}'.format(watched.path, e))
+
+            timer = self.lights.timer
+            if timer and stage is not None:
+                timer.record(stage, perf_counter_ns() - start)
+
+            self._run_behaviours()
+            if wake:
+                self.wake()
+
+    async def _every(self, interval, callback):
+        while True:
+            await asyncio.sleep(interval)
+            callback()
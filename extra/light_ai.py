@@ -8,14 +8,22 @@
 import argparse
 
 from datetime import datetime
+from datetime import timedelta
 
 from time import sleep
-import requests
+import numpy as np
 
+from lightai_client import LightingClient
+from lightai_model import default_tree_directory
+from lightai_model import export_tree
+from lightai_model import get_joblib
+from lightai_model import load_model
 from lightai_schedule import ScheduleRenderer
-
-from sklearn import tree
-from sklearn.externals import joblib
+from lightai_store import TrainingStore
+from lightai_store import default_store_directory
+from lightai_store import feature_matrix
+from lightai_store import rgb_labels
+from lightai_store import time_grid
 
 # day_of_year probably won't have any useful effect until at least
 # a year's worth of usage data has been collected. If USE_DAY_OF_YEAR
@@ -27,48 +35,90 @@ USE_DAY_OF_YEAR = True
 LIGHTING_URL = 'http://localhost:8080'
 
 
+# Predictions for every minute of a week, made with a single call to
+# predict() so that looking up the color for any time is just an array index.
+#
+# If USE_DAY_OF_YEAR is True the predictions depend on the date, so the table
+# covers the week starting on the day it was built and must be rebuilt once
+# that week is over. Otherwise it is indexed by day of the week and never
+# expires.
+class PredictionTable:
+    DAYS = 7
+    MINUTES_PER_DAY = 1440
+
+    def __init__(self, clf, now):
+        self.start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        if not USE_DAY_OF_YEAR:
+            # Start on a Monday, so that the day index is the day of the week
+            self.start -= timedelta(days=self.start.weekday())
+
+        grid = time_grid(self.start, PredictionTable.DAYS, 60)
+        predictions = clf.predict(feature_matrix(*grid, USE_DAY_OF_YEAR))
+
+        # Store each distinct color once, with a small index for each minute
+        self.labels, indices = np.unique(predictions, return_inverse=True)
+        self.labels = [str(label) for label in self.labels]
+        self.indices = indices.astype(np.uint16).reshape(
+            PredictionTable.DAYS, PredictionTable.MINUTES_PER_DAY)
+
+    # Returns False if the table needs to be rebuilt to make predictions
+    # for the given time
+    def covers(self, now):
+        if not USE_DAY_OF_YEAR:
+            return True
+        return 0 <= (now - self.start).days < PredictionTable.DAYS
+
+    def get(self, now):
+        if USE_DAY_OF_YEAR:
+            day = (now - self.start).days
+        else:
+            day = now.weekday()
+        return self.labels[self.indices[day, now.hour * 60 + now.minute]]
+
+
 class LightAI:
-    def __init__(self, classifier):
+    def __init__(self, classifier, client=None):
         self.color = ''
-        self.clf = classifier
+        self.table = None
+        self.client = client or LightingClient(LIGHTING_URL)
+        self.set_classifier(classifier)
 
     def set_classifier(self, classifier):
         self.clf = classifier
+        self.table = None
 
     def update(self, now):
-        day_of_year = now.timetuple().tm_yday
-        day_of_week = now.timetuple().tm_wday
-        midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
-        second_of_day = (now - midnight).seconds
+        if self.table is None or not self.table.covers(now):
+            self.table = PredictionTable(self.clf, now)
 
-        if USE_DAY_OF_YEAR:
-            rgb = self.clf.predict(
-                [[day_of_year, day_of_week, second_of_day]]
-            )[0]
-        else:
-            rgb = self.clf.predict(
-                [[day_of_week, second_of_day]]
-            )[0]
+        rgb = self.table.get(now)
 
-        print('[{}, {}] -> {}'.format(day_of_week, second_of_day, rgb))
+        print('[{}, {:02d}:{:02d}] -> {}'.format(
+            now.weekday(), now.hour, now.minute, rgb))
 
         if rgb != self.color:
             data = {
                 'ai': '',
                 'rgb': rgb
             }
-            requests.get(LIGHTING_URL, data)
-            self.color = rgb
+            # If the server can't be reached the color is sent again on
+            # the next update
+            if self.client.push(data):
+                self.color = rgb
 
 
-def construct_model(data_file):
+def construct_model(data_file, store_directory=None):
     if data_file is None or data_file == '':
         raise ValueError(
             'A data file is required to train a model. ' +
             'Please specify the filename with --data_file'
         )
 
-    X, y = parse_training_data(data_file)
+    # sklearn is only needed for training, so running from an exported
+    # model doesn't have to wait for it to import
+    from sklearn import tree
+
+    X, y = parse_training_data(data_file, store_directory)
 
     clf = tree.DecisionTreeClassifier()
     clf = clf.fit(X, y)
@@ -76,38 +126,24 @@ def construct_model(data_file):
     return clf
 
 
-def parse_training_data(data_file):
-    X = []
-    y = []
-
-    line_count = 0
-    for line in open(data_file, 'r'):
-        line_count += 1
-        if '#' in line:
-            continue
-
-        line = line.strip()
-        if line == '':
-            continue
+# New lines in the data file are imported into a columnar store, from which
+# all the training data is loaded at once
+def parse_training_data(data_file, store_directory=None):
+    store = TrainingStore(
+        store_directory or default_store_directory(data_file))
+    imported = store.import_dat(data_file)
+    print('Imported {} new samples, {} in total'.format(imported, store.rows))
 
-        # Split into features,labels
-        parts = line.split(':')
-
-        # Split into day_of_year,day_of_week,second_of_day
-        features = parts[0].split(',')
-
-        if USE_DAY_OF_YEAR:
-            # day_of_year, day_of_week, second_of_day
-            X.append([int(features[0]), int(features[1]), int(features[2])])
-        else:
-            # day_of_week, second_of_day
-            X.append([int(features[1]), int(features[2])])
-
-        labels = parts[1].split(',')    # Split into rgb,hue,saturation,value
-        y.append(labels[0])
+    data = store.load()
+    X = feature_matrix(
+        data['day_of_year'], data['day_of_week'], data['second_of_day'],
+        USE_DAY_OF_YEAR)
+    y = rgb_labels(data['rgb'])
     return X, y
 
 
+# Saves the classifier as a pickle, and as an exported tree next to it
+# which starts up much faster
 def save_model(clf, save_file, data_file='default_filename'):
     if save_file is None or save_file == '':
         save_file = '{}_{}.pkl'\
@@ -115,20 +151,23 @@ def save_model(clf, save_file, data_file='default_filename'):
                 data_file.replace('.dat', ''),
                 datetime.now().strftime('%y-%m-%d_%H%M%S')
             )
-    joblib.dump(clf, save_file)
+    get_joblib().dump(clf, save_file)
+    export_tree(clf, default_tree_directory(save_file))
 
-    ScheduleRenderer(clf, args.save_schedule)
+    ScheduleRenderer(
+        clf, args.save_schedule, USE_DAY_OF_YEAR,
+        args.schedule_resolution * 60, args.schedule_days)
 
 
 def load_saved_model(file):
     if file is None or file == '':
         raise ValueError('Cannot load saved model "{}"'.format(file))
-    return joblib.load(file)
+    return load_model(file)
 
 
 def construct_and_save_model(data_file, save_file):
     global last_update
-    clf = construct_model(args.data)
+    clf = construct_model(args.data, args.store)
     if update_interval > 0:
         last_update = datetime.now()
     if clf is not None:
@@ -144,6 +183,11 @@ if __name__ == '__main__':
         '--data',
         type=str,
         help='Filename for data file to be used for training (.dat file)')
+    parser.add_argument(
+        '--store',
+        type=str,
+        help='Directory for the columnar copy of the training data ' +
+             '(default: next to the data file)')
     parser.add_argument(
         '--save_as',
         type=str,
@@ -157,12 +201,24 @@ if __name__ == '__main__':
     parser.add_argument(
         '--saved_classifier',
         type=str,
-        help='Define a previously stored classifier (.pkl file)')
+        help='Define a previously stored classifier (.pkl file, or ' +
+             'the .tree directory exported alongside it)')
     parser.add_argument(
         '--save_schedule',
         type=str,
         default='schedule.html',
         help='Filename for the generated schedule html file')
+    parser.add_argument(
+        '--schedule_resolution',
+        type=int,
+        default=30,
+        help='Minutes covered by each row of the schedule')
+    parser.add_argument(
+        '--schedule_days',
+        type=int,
+        default=7,
+        help='Number of days shown in the schedule, starting today ' +
+             '(only used with USE_DAY_OF_YEAR)')
 
     args = parser.parse_args()
     clf = None
@@ -196,7 +252,8 @@ if __name__ == '__main__':
                 (now - last_update).total_seconds() > update_interval
             ):
                 print('Updating model...')
-                construct_and_save_model(args.data, args.save_as)
+                light_ai.set_classifier(
+                    construct_and_save_model(args.data, args.save_as))
 
             sleep(60)
     except KeyboardInterrupt as k:
@@ -0,0 +1,90 @@
+# Sends LightAI colors to the node.js server
+#
+# One keep-alive session is used for every push, so a color change costs a
+# single request on an open connection instead of a new TCP connection each
+# time. Every request has a timeout, and failed requests are retried a few
+# times with increasing delays. If the server still can't be reached the
+# push is reported as failed rather than raising, so the daemon keeps
+# running while the server restarts and tries again on its next update.
+#
+# requests is slow to import on a Raspberry Pi, so it isn't imported until
+# the first push, after LightAI has made its first prediction.
+
+from time import sleep
+
+# Seconds to wait for the server to accept the connection and to respond
+CONNECT_TIMEOUT = 2.0
+READ_TIMEOUT = 5.0
+
+# Attempts after the first one fails, and the delay before the first of
+# them in seconds. The delay doubles after each attempt
+RETRIES = 3
+BACKOFF = 0.5
+
+# Responses with these status codes are worth trying again
+RETRY_STATUS = (500, 502, 503, 504)
+
+
+class LightingClient:
+
+    def __init__(self, url, retries=RETRIES, backoff=BACKOFF,
+                 timeout=(CONNECT_TIMEOUT, READ_TIMEOUT), sleep=sleep):
+        self.url = url
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.sleep = sleep
+
+        self.session = None
+        self.failures = 0
+
+    def _get_session(self):
+        if self.session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            # Only one request is ever in flight, so one pooled connection
+            # is enough. Retries are handled in push() so they can be counted
+            self.session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=1, pool_maxsize=1, max_retries=0)
+            self.session.mount('http://', adapter)
+            self.session.mount('https://', adapter)
+        return self.session
+
+    # Send data to the server as query parameters.
+    # Returns True if the server accepted it
+    def push(self, data):
+        import requests
+
+        session = self._get_session()
+        delay = self.backoff
+        for attempt in range(self.retries + 1):
+            if attempt > 0:
+                self.sleep(delay)
+                delay *= 2
+
+            try:
+                response = session.get(
+                    self.url, params=data, timeout=self.timeout)
+            except requests.RequestException as e:
+                error = e
+                continue
+
+            if response.status_code in RETRY_STATUS:
+                error = 'HTTP {}'.format(response.status_code)
+                continue
+            if response.status_code >= 400:
+                error = 'HTTP {}'.format(response.status_code)
+                break
+
+            self.failures = 0
+            return True
+
+        self.failures += 1
+        print('Unable to send color to {}: {}'.format(self.url, error))
+        return False
+
+    def close(self):
+        if self.session is not None:
+            self.session.close()
@@ -7,32 +7,72 @@ For best results, this script should be scheduled to run frequently.
 By default the install.py script will set it to run every 15 minutes -
 if you want to change that, run `sudo crontab -e` and change the value
 there.
+
+As it is started so often, this script only uses the standard library so
+that cron can run it with `python3 -S`, skipping the site-packages setup.
 '''
 
 from colorsys import rgb_to_hsv
 from datetime import datetime
+from sys import argv
 from sys import exit
-from argparse import ArgumentParser
 
+import mmap
 import os
+import struct
+
+
+# Returns (webroot, savefile). argparse takes longer to import than the rest
+# of the script put together, so it is only used to show help or errors
+def parse_args():
+    args = argv[1:]
+    if len(args) == 2 and not any(arg.startswith('-') for arg in args):
+        return args
+
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser()
+    parser.add_argument(
+        'webroot',
+        type=str,
+        help='Path to the directory where ambient light status is stored')
+    parser.add_argument(
+        'savefile',
+        type=str,
+        help="Filename where logged data should be stored")
+
+    args = parser.parse_args()
+    return args.webroot, args.savefile
+
 
-parser = ArgumentParser()
-parser.add_argument(
-    'webroot',
-    type=str,
-    help='Path to the directory where ambient light status is stored')
-parser.add_argument(
-    'savefile',
-    type=str,
-    help="Filename where logged data should be stored")
+# The status block shared by main.py. The path and layout must match those
+# in statusblock.py
+def default_block_path():
+    if os.path.isdir('/dev/shm'):
+        directory = '/dev/shm'
+    else:
+        import tempfile
+        directory = tempfile.gettempdir()
+    return os.path.join(directory, 'intelligent-lighting-status')
 
-args = parser.parse_args()
 
-FILE_DAT = args.savefile
-WEB_ROOT = args.webroot
+BLOCK_MAGIC = b'ILSB'
+BLOCK_LAYOUT_VERSION = 1
+BLOCK_HEADER_SIZE = 16
+BLOCK_SLOT_SIZE = 32
+BLOCK_CANONICAL = 2
+BLOCK_READ_ATTEMPTS = 100
+
+_BLOCK_HEADER = struct.Struct('<4sHHI')
+_BLOCK_SEQUENCE = struct.Struct('<I')
+_BLOCK_PAYLOAD = struct.Struct('<4Bd')
+
+
+WEB_ROOT, FILE_DAT = parse_args()
 FILE_CANONICAL = os.path.join(WEB_ROOT, 'canonical')
+FILE_BLOCK = os.environ.get('LIGHTS_STATUS_BLOCK') or default_block_path()
 
-print('Checking color from file {}'.format(FILE_CANONICAL))
+print('Checking color from {} or file {}'.format(FILE_BLOCK, FILE_CANONICAL))
 print('Saving to file {}'.format(FILE_DAT))
 
 
@@ -56,6 +96,40 @@ def read_line(file, line_number=0):
     return line
 
 
+# Returns the canonical color in the status block as an 'r g b' string, or
+# None if there is no block or the canonical slot hasn't been written since
+# main.py started
+def read_block_color(path):
+    try:
+        with open(path, 'rb') as f:
+            block = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    with block:
+        offset = BLOCK_HEADER_SIZE + BLOCK_CANONICAL * BLOCK_SLOT_SIZE
+        if len(block) < offset + BLOCK_SLOT_SIZE:
+            return None
+        magic, version, slot_count, slot_size = _BLOCK_HEADER.unpack_from(
+            block)
+        if (magic, version, slot_size) != (
+                BLOCK_MAGIC, BLOCK_LAYOUT_VERSION, BLOCK_SLOT_SIZE):
+            return None
+
+        # Seqlock read, as in StatusBlock.read()
+        for _ in range(BLOCK_READ_ATTEMPTS):
+            sequence = _BLOCK_SEQUENCE.unpack_from(block, offset)[0]
+            if sequence & 1:
+                continue
+            r, g, b, source, timestamp = _BLOCK_PAYLOAD.unpack_from(
+                block, offset + 4)
+            if _BLOCK_SEQUENCE.unpack_from(block, offset)[0] == sequence:
+                if sequence == 0:
+                    return None
+                return '{} {} {}'.format(r, g, b)
+    return None
+
+
 def string_to_rgb(string):
     r, g, b = [int(x) for x in string.split(" ")]
     return (r, g, b)
@@ -68,8 +142,8 @@ if __name__ == '__main__':
     midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
     second_of_day = (now - midnight).seconds
 
-    rgb_string = read_line(FILE_CANONICAL)
-    if rgb_string is "":
+    rgb_string = read_block_color(FILE_BLOCK) or read_line(FILE_CANONICAL)
+    if rgb_string == "":
         print('File could not be read properly: color is empty')
         exit(0)
     rgb_string = rgb_string.strip()
@@ -0,0 +1,144 @@
+# Compact export of a trained DecisionTreeClassifier
+#
+# Loading a pickled classifier imports the whole of scikit-learn, which
+# takes several seconds on a Raspberry Pi, just to walk a decision tree.
+# Instead, the tree is exported to a directory holding one .npy file per
+# array:
+#   feature.npy, threshold.npy    the test made at each node
+#   left.npy, right.npy           child node indices
+#   leaf_class.npy                index into classes.npy at each leaf
+#   classes.npy                   the color labels
+# and meta.json, which records the format version, tree depth and number of
+# features. The arrays are memory-mapped when loaded, and TreeModel predicts
+# with NumPy alone, so inference never imports sklearn.
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+MODEL_VERSION = 1
+
+META_FILE = 'meta.json'
+
+ARRAYS = ('feature', 'threshold', 'left', 'right', 'leaf_class', 'classes')
+
+
+class TreeModel:
+
+    def __init__(self, arrays, depth, n_features):
+        for name in ARRAYS:
+            setattr(self, name, arrays[name])
+        self.depth = depth
+        self.n_features = n_features
+
+    # Returns the predicted label for each row of X, the same as
+    # DecisionTreeClassifier.predict()
+    def predict(self, X):
+        # sklearn compares float32 features with float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        if X.ndim != 2 or X.shape[1] != self.n_features:
+            raise ValueError('Expected {} features, got shape {}'.format(
+                self.n_features, X.shape))
+
+        # Leaves point back to themselves, so every row can take depth
+        # steps down the tree together without checking for leaves
+        rows = np.arange(len(X))
+        nodes = np.zeros(len(X), dtype=np.intp)
+        for step in range(self.depth):
+            go_left = X[rows, self.feature[nodes]] <= self.threshold[nodes]
+            nodes = np.where(go_left, self.left[nodes], self.right[nodes])
+
+        return self.classes[self.leaf_class[nodes]]
+
+
+# Write clf, a fitted DecisionTreeClassifier, to directory
+def export_tree(clf, directory):
+    tree = clf.tree_
+    leaves = tree.children_left == -1
+    nodes = np.arange(tree.node_count)
+
+    arrays = {
+        'feature': np.where(leaves, 0, tree.feature).astype(np.int8),
+        'threshold': tree.threshold.astype(np.float64),
+        'left': np.where(leaves, nodes, tree.children_left).astype(np.int32),
+        'right': np.where(
+            leaves, nodes, tree.children_right).astype(np.int32),
+        'leaf_class': np.argmax(tree.value[:, 0, :], axis=1).astype(np.uint16),
+        'classes': np.asarray(clf.classes_, dtype=str),
+    }
+
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    for name in ARRAYS:
+        np.save(os.path.join(directory, name + '.npy'), arrays[name])
+
+    meta = {
+        'version': MODEL_VERSION,
+        'depth': int(tree.max_depth),
+        'n_features': int(tree.n_features),
+    }
+    with open(os.path.join(directory, META_FILE), 'w') as f:
+        json.dump(meta, f)
+
+
+def load_tree(directory):
+    with open(os.path.join(directory, META_FILE), 'r') as f:
+        meta = json.load(f)
+    if meta.get('version') != MODEL_VERSION:
+        raise ValueError('Unsupported model version in {}: {}'.format(
+            directory, meta.get('version')))
+
+    # Indexing an np.memmap returns another np.memmap, which is much slower
+    # than a plain array, so each is viewed as an ndarray over the same map
+    arrays = {
+        name: np.load(
+            os.path.join(directory, name + '.npy'), mmap_mode='r'
+        ).view(np.ndarray)
+        for name in ARRAYS
+    }
+    return TreeModel(arrays, meta['depth'], meta['n_features'])
+
+
+# Default location of the exported tree for a pickled model,
+# e.g. model.pkl -> model.tree
+def default_tree_directory(model_file):
+    return os.path.splitext(model_file)[0] + '.tree'
+
+
+# joblib is a separate package since scikit-learn 0.21, which removed
+# sklearn.externals.joblib in 0.23. Older versions only have the bundled copy
+def get_joblib():
+    try:
+        import joblib
+    except ImportError:
+        from sklearn.externals import joblib
+    return joblib
+
+
+# Load either an exported tree directory or a pickled classifier. sklearn is
+# only imported for pickles
+def load_model(file):
+    if os.path.isdir(file):
+        return load_tree(file)
+
+    return get_joblib().load(file)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Export a pickled LightAI classifier for fast loading')
+    parser.add_argument(
+        'model',
+        type=str,
+        help='Saved classifier (.pkl file)')
+    parser.add_argument(
+        '--output',
+        type=str,
+        help='Directory for the exported tree (default: next to the model)')
+    args = parser.parse_args()
+
+    output = args.output or default_tree_directory(args.model)
+    export_tree(load_model(args.model), output)
+    print('Exported classifier to {}'.format(output))
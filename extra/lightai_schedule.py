@@ -1,22 +1,50 @@
+import argparse
+import os
+
 from colorsys import hsv_to_rgb
 from colorsys import rgb_to_hsv
 from datetime import datetime
+from datetime import timedelta
+
+import numpy as np
+
+from lightai_model import load_model
+from lightai_store import feature_matrix
+from lightai_store import time_grid
+
+# Rows shorter than this many seconds are drawn as a compact heatmap,
+# without the predicted color written in each cell
+LABEL_MIN_RESOLUTION = 900
 
-from sklearn.externals import joblib
+WEEKDAYS = [
+    'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday',
+    'Sunday'
+]
 
 
 # Generates a schedule from given training data so that you can see
 # an overview of what the model has learned
 # You can view the page at <server_address>:8080/schedule.html
+#
+# The schedule has a column for each day and a row for every resolution
+# seconds. The whole grid is predicted with a single call to predict(),
+# using the same features the model was trained with, so fine resolutions
+# (e.g. a row per minute) stay cheap to regenerate after each retrain.
+#
+# If use_day_of_year is False the model only knows the day of the week, so
+# the schedule shows one week from Monday to Sunday. Otherwise it shows days
+# days starting today.
 class ScheduleRenderer:
-    # Half-hour intervals for each day of the week
-    TEST_DATA = [
-        [day_of_week, second_of_day]
-        for second_of_day in range(0, 86400, 1800)
-        for day_of_week in range(0, 7)
-    ]
-
-    def __init__(self, clf, output_file="schedule.html"):
+
+    def __init__(self, clf, output_file="schedule.html",
+                 use_day_of_year=False, resolution=1800, days=7):
+        if resolution <= 0 or 86400 % resolution:
+            raise ValueError(
+                "Resolution must divide a day exactly: {}".format(resolution))
+
+        self.use_day_of_year = use_day_of_year
+        self.resolution = int(resolution)
+        self.days = days if use_day_of_year else len(WEEKDAYS)
         self.render(clf, output_file)
 
     # Construct an HTML page showing how our model will affect lighting
@@ -25,41 +53,46 @@ class ScheduleRenderer:
         if clf is None:
             raise ValueError("No classifier given")
 
-        now = datetime.now()
+        start = datetime.now().replace(
+            hour=0, minute=0, second=0, microsecond=0)
+        if not self.use_day_of_year:
+            start -= timedelta(days=start.weekday())
 
-        print("Writing schedule to file '{}'".format(output_file))
-        with open(output_file, 'w') as f:
-            f.write(self._get_html_start())
-            f.write(self._get_table_headers())
-
-            for entry in ScheduleRenderer.TEST_DATA:
-                day_of_week, second_of_day = entry
-                row = ""
-
-                if day_of_week == 0:
-                    row += (
-                        "<tr>\n" +
-                        "<td>{}</td>\n".format(
-                            self._seconds_to_hour_min(second_of_day)
-                        )
-                    )
-
-                prediction = clf.predict([[day_of_week, second_of_day]])[0]
-                row += (
-                    "<td style='background-color:{};'>{}</td>\n"
-                    .format(
-                        self._get_cell_color(prediction),
-                        prediction
-                    )
-                )
+        grid = time_grid(start, self.days, self.resolution)
+        predictions = clf.predict(feature_matrix(*grid, self.use_day_of_year))
 
-                if day_of_week == 6:
-                    row += "</tr>\n"
+        # Each distinct color gets a CSS class, and the grid is stored as an
+        # index into the distinct colors with a row for each time of day
+        labels, indices = np.unique(predictions, return_inverse=True)
+        indices = indices.reshape(self.days, -1).T
 
-                f.write(row)
+        compact = self.resolution < LABEL_MIN_RESOLUTION
+        cells = np.array([
+            "<td class='c{}'>{}</td>".format(i, "" if compact else label)
+            for i, label in enumerate(labels)
+        ], dtype=object)
 
-            f.write(self._get_html_end())
+        # Rows are written as they are generated, to a temporary file which
+        # then replaces the schedule so it is never seen half written
+        print("Writing schedule to file '{}'".format(output_file))
+        temp_file = output_file + ".tmp"
+        with open(temp_file, 'w') as f:
+            f.write(self._get_html_start(labels, compact))
+            f.write(self._get_table_headers(start))
+
+            for row, second_of_day in enumerate(
+                    range(0, 86400, self.resolution)):
+                title = ""
+                if not compact or second_of_day % 3600 == 0:
+                    title = self._seconds_to_hour_min(second_of_day)
+                f.write(
+                    "<tr><td>{}</td>".format(title) +
+                    "".join(cells[indices[row]]) +
+                    "</tr>\n"
+                )
 
+            f.write(self._get_html_end(start))
+        os.replace(temp_file, output_file)
 
     # Convert brightness to alpha value
     def _get_cell_color(self, predicted_color):
@@ -79,45 +112,57 @@ class ScheduleRenderer:
         mins = int((seconds / 60) - (hours * 60))
         return "{:02d}:{:02d}".format(hours, mins)
 
-    def _get_table_headers(self):
-        column_headers = [
-            '', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday',
-            'Saturday', 'Sunday'
-        ]
+    def _get_table_headers(self, start):
+        if self.use_day_of_year:
+            column_headers = [''] + [
+                (start + timedelta(days=day)).strftime("%a %d %b")
+                for day in range(self.days)
+            ]
+        else:
+            column_headers = [''] + WEEKDAYS
         output = ""
         for x in column_headers:
             output = output + "<th>{}</th>\n".format(x)
         return output + "</tr>\n"
 
-    def _get_html_start(self):
+    def _get_html_start(self, labels, compact):
         return (
             "<html>\n<head>\n<title>Expected schedule</title>\n" +
-            self._get_html_style() +
+            self._get_html_style(labels) +
             "\n</head>\n<body>\n<main>\n" +
-            "<table>\n<tr class='header_row'>\n"
+            "<table{}>\n<tr class='header_row'>\n".format(
+                " class='compact'" if compact else "")
         )
 
-    def _get_html_end(self):
+    def _get_html_end(self, start):
         return (
-            "\n</table>\n</main>\n" + self._get_js() + "\n</body><footer>" +
+            "\n</table>\n</main>\n" + self._get_js(start) +
+            "\n</body><footer>" +
             "Last update: {}</footer>\n</html>"
             .format(datetime.now().strftime("%Y-%m-%d at %H:%M"))
         )
 
-    def _get_html_style(self):
+    def _get_html_style(self, labels):
         return (
             "<style>\n" +
             "html{font-family:monospace;background-color:#444;color:#ddd;}" +
             "table{width:100%;max-width:800px;min-width:600px;}" +
             "table,th,td{border:0px solid black;border-collapse:collapse;} " +
             "th,td{text-align:center;vertical-align:middle;padding:2px;} " +
+            "table.compact td{padding:0;height:2px;line-height:0;} " +
             ".today{border-left:1px dashed grey;" +
             "border-right:1px dashed grey;} " +
             ".now{padding:32px !important;border-top:1px dashed grey;" +
-            "border-bottom:1px dashed grey;}\n</style>"
+            "border-bottom:1px dashed grey;}\n" +
+            "".join(
+                ".c{}{{background-color:{};}}\n".format(
+                    i, self._get_cell_color(label))
+                for i, label in enumerate(labels)
+            ) +
+            "</style>"
         )
 
-    def _get_js(self):
+    def _get_js(self, start):
         return (
             '''
             <script type="text/javascript">
@@ -128,31 +173,36 @@ class ScheduleRenderer:
             function highlightNow() {
                 const highlightBorderStyle = '2px solid #cccccc';
                 const now = new Date();
-                const today = now.getDay();
-                const hour = now.getHours();
-                const minutes = now.getMinutes() > 30 ? 30 : 0;
-
-                const interval = 30; // interval for each row in minutes
-                const column = today == 0 ? 6 : today;
-                const nowTime = (hour < 10 ? '0' : '') + hour + ':' + (minutes < 10 ? '0' : '') + minutes;
+                const start = new Date(%d, %d, %d);
+                const weekly = %s;
+                const interval = %d; // interval for each row in seconds
+
+                const midnight = new Date(
+                    now.getFullYear(), now.getMonth(), now.getDate());
+                const column = 1 + (weekly ?
+                    (now.getDay() + 6) %% 7 :
+                    Math.round((midnight - start) / 86400000));
+                const seconds = (now - midnight) / 1000;
                 const rows = document.getElementsByTagName('tr');
 
-                for (let i = 0; i < rows.length; i++) {
-                    const row = rows[i];
-                    const tds = row.getElementsByTagName('td');
-                    const col = tds[column];
+                // The first row holds the column headers
+                for (let i = 1; i < rows.length; i++) {
+                    const col = rows[i].getElementsByTagName('td')[column];
                     if (col) {
                         col.style.borderLeft = col.style.borderRight = highlightBorderStyle;
                     }
-                    const rowTitle = tds[0];
-                    if (rowTitle && nowTime == rowTitle.innerText) {
-                        row.style.borderTop = row.style.borderBottom = highlightBorderStyle;
-                    }
+                }
+                const row = rows[1 + Math.floor(seconds / interval)];
+                if (row) {
+                    row.style.borderTop = row.style.borderBottom = highlightBorderStyle;
                 }
             }
             highlightNow();
             </script>
-            '''
+            ''' % (
+                start.year, start.month - 1, start.day,
+                'false' if self.use_day_of_year else 'true',
+                self.resolution)
         )
 
 
@@ -166,8 +216,38 @@ def string_to_rgb(rgb_string):
 def load_saved_model(file):
     if file is None or file == '':
         raise ValueError('Error loading saved model "{}"'.format(file))
-    return joblib.load(file)
+    return load_model(file)
 
 if __name__ == '__main__':
-    clf = joblib.load('model.pkl')
-    renderer = ScheduleRenderer(clf, 'test.html')
\ No newline at end of file
+    parser = argparse.ArgumentParser(
+        description='Render the schedule learned by a LightAI model')
+    parser.add_argument(
+        'model',
+        type=str,
+        nargs='?',
+        default='model.pkl',
+        help='Saved classifier (.pkl file or exported .tree directory)')
+    parser.add_argument(
+        '--output',
+        type=str,
+        default='test.html',
+        help='Filename for the generated schedule html file')
+    parser.add_argument(
+        '--resolution',
+        type=int,
+        default=30,
+        help='Minutes covered by each row')
+    parser.add_argument(
+        '--days',
+        type=int,
+        default=7,
+        help='Number of days shown, starting today (with --day_of_year)')
+    parser.add_argument(
+        '--day_of_year',
+        action='store_true',
+        help='The model was trained with USE_DAY_OF_YEAR')
+    args = parser.parse_args()
+
+    clf = load_saved_model(args.model)
+    renderer = ScheduleRenderer(
+        clf, args.output, args.day_of_year, args.resolution * 60, args.days)
@@ -0,0 +1,268 @@
+# Columnar storage for LightAI training data
+#
+# lightai_logger.py appends a line to led_usage_log.dat every 15 minutes, and
+# parsing the whole file again each time the model is retrained gets slow
+# once it holds a few years of samples. Instead, samples are imported into a
+# directory holding one binary file per column:
+#   day_of_year.bin, day_of_week.bin, second_of_day.bin, rgb.bin
+#
+# Each file is a flat array of fixed-size values, so new samples are appended
+# to the end of each file and the whole store loads with a single read per
+# column. These are raw arrays rather than .npy files because a .npy header
+# records the array's shape, which would have to be rewritten on every
+# append; the row count is kept in meta.json instead.
+#
+# meta.json also records how much of the .dat file has been imported and a
+# hash of that part of it, so only lines added since the last import are
+# ever parsed. If anything already imported has changed, e.g. a line edited
+# in place, the hash no longer matches and the store is rebuilt.
+
+import argparse
+import hashlib
+import json
+import os
+
+from datetime import timedelta
+
+import numpy as np
+
+STORE_VERSION = 3
+
+# Column names and types. rgb is packed as (r << 16) | (g << 8) | b
+COLUMNS = (
+    ('day_of_year', np.uint16),
+    ('day_of_week', np.uint8),
+    ('second_of_day', np.uint32),
+    ('rgb', np.uint32),
+)
+
+META_FILE = 'meta.json'
+
+# Bytes of the .dat file hashed at a time
+HASH_CHUNK = 1 << 20
+
+
+class TrainingStore:
+    def __init__(self, directory):
+        self.directory = directory
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.meta = self._read_meta()
+
+    @property
+    def rows(self):
+        return self.meta['rows']
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read_meta(self):
+        try:
+            with open(self._path(META_FILE), 'r') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            meta = None
+
+        if meta is None or meta.get('version') != STORE_VERSION:
+            meta = {'version': STORE_VERSION, 'rows': 0, 'source': None}
+        return meta
+
+    # meta.json is replaced atomically, and is only written after the column
+    # files, so an interrupted write never leaves a partial row in the store
+    def _write_meta(self):
+        temp_file = self._path(META_FILE + '.tmp')
+        with open(temp_file, 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(temp_file, self._path(META_FILE))
+
+    # Add rows to the end of the store. columns is a dict of
+    # {column name: array}, with the same number of values in each array
+    def append(self, columns):
+        self._append(columns)
+        self._write_meta()
+
+    def _append(self, columns):
+        count = len(columns['rgb'])
+        if count == 0:
+            return
+
+        rows = self.meta['rows']
+        for name, dtype in COLUMNS:
+            path = self._path(name + '.bin')
+            with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+                # Discard anything left over from an interrupted append
+                end = rows * np.dtype(dtype).itemsize
+                f.truncate(end)
+                f.seek(end)
+                np.asarray(columns[name], dtype=dtype).tofile(f)
+        self.meta['rows'] = rows + count
+
+    # Returns a dict of {column name: array} holding every row
+    def load(self):
+        rows = self.meta['rows']
+        columns = {}
+        for name, dtype in COLUMNS:
+            if rows == 0:
+                columns[name] = np.zeros(0, dtype=dtype)
+            else:
+                columns[name] = np.fromfile(
+                    self._path(name + '.bin'), dtype=dtype, count=rows)
+        return columns
+
+    def clear(self):
+        self.meta = {'version': STORE_VERSION, 'rows': 0, 'source': None}
+        self._write_meta()
+
+    # Import any lines added to a .dat file since the last import.
+    # If the file has been replaced or any of it already imported has
+    # changed since then, the store is rebuilt from the start of the file.
+    # Returns the number of rows imported
+    def import_dat(self, dat_file):
+        dat_file = os.path.abspath(dat_file)
+        with open(dat_file, 'rb') as f:
+            st = os.fstat(f.fileno())
+            source = self.meta['source']
+            if (source is not None and source['path'] == dat_file and
+                    source['size'] == st.st_size and
+                    source['mtime_ns'] == st.st_mtime_ns):
+                # Not touched since the last import
+                return 0
+
+            digest, offset = self._resume(dat_file, f)
+            data = f.read()
+
+        # Lines still being written are picked up next time
+        end = data.rfind(b'\n') + 1
+        columns = parse_dat(data[:end].decode())
+        digest.update(memoryview(data)[:end])
+
+        self._append(columns)
+        self.meta['source'] = {
+            'path': dat_file,
+            'offset': offset + end,
+            'sha1': digest.hexdigest(),
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+        }
+        self._write_meta()
+        return len(columns['rgb'])
+
+    # Returns (hash, offset) for the part of dat_file imported previously,
+    # leaving f at the end of it. If the file is not the one previously
+    # imported, or that part has changed, the store is cleared and this
+    # returns the hash of nothing and 0
+    def _resume(self, dat_file, f):
+        source = self.meta['source']
+        if source is not None and source['path'] == dat_file:
+            digest = hash_prefix(f, source['offset'])
+            if digest is not None and digest.hexdigest() == source['sha1']:
+                return digest, source['offset']
+
+        if self.meta['rows'] > 0:
+            print('Data file has changed - rebuilding training store')
+            self.clear()
+        f.seek(0)
+        return hashlib.sha1(), 0
+
+
+# Returns the hash of the first length bytes of f, or None if f is shorter
+def hash_prefix(f, length):
+    digest = hashlib.sha1()
+    f.seek(0)
+    remaining = length
+    while remaining > 0:
+        chunk = f.read(min(HASH_CHUNK, remaining))
+        if not chunk:
+            return None
+        digest.update(chunk)
+        remaining -= len(chunk)
+    return digest
+
+
+# Parse lines in the format written by lightai_logger.py:
+#   day_of_year,day_of_week,second_of_day:rgb,hue,saturation,value
+# Returns a dict of {column name: array}
+def parse_dat(text):
+    values = {name: [] for name, dtype in COLUMNS}
+    for line in text.splitlines():
+        if '#' in line:
+            continue
+
+        line = line.strip()
+        if line == '':
+            continue
+
+        features, labels = line.split(':')
+        day_of_year, day_of_week, second_of_day = features.split(',')
+        r, g, b = [int(x) for x in labels.split(',')[0].split()]
+
+        values['day_of_year'].append(int(day_of_year))
+        values['day_of_week'].append(int(day_of_week))
+        values['second_of_day'].append(int(second_of_day))
+        values['rgb'].append((r << 16) | (g << 8) | b)
+
+    return {
+        name: np.array(values[name], dtype=dtype) for name, dtype in COLUMNS
+    }
+
+
+# Convert packed rgb values into 'r g b' strings, the labels used by the
+# classifier. Each distinct color is only formatted once
+def rgb_labels(rgb):
+    colors, indices = np.unique(rgb, return_inverse=True)
+    labels = np.array([
+        '{} {} {}'.format(c >> 16, (c >> 8) & 0xff, c & 0xff)
+        for c in colors.tolist()
+    ])
+    return labels[indices]
+
+
+# Arrange feature columns in the layout the classifier is trained with:
+#   [day_of_year, day_of_week, second_of_day] if use_day_of_year is True
+#   [day_of_week, second_of_day] otherwise
+def feature_matrix(day_of_year, day_of_week, second_of_day, use_day_of_year):
+    if use_day_of_year:
+        return np.column_stack([day_of_year, day_of_week, second_of_day])
+    return np.column_stack([day_of_week, second_of_day])
+
+
+# Feature columns for every step seconds of each day, for days days starting
+# at midnight on start. Returns (day_of_year, day_of_week, second_of_day)
+# with one value for each time, ordered by day and then time of day
+def time_grid(start, days, step):
+    start = start.replace(hour=0, minute=0, second=0, microsecond=0)
+    dates = [(start + timedelta(days=day)).timetuple() for day in range(days)]
+    seconds = np.arange(0, 86400, step, dtype=np.uint32)
+
+    day_of_year = np.repeat(
+        np.array([date.tm_yday for date in dates], dtype=np.uint16),
+        len(seconds))
+    day_of_week = np.repeat(
+        np.array([date.tm_wday for date in dates], dtype=np.uint8),
+        len(seconds))
+    second_of_day = np.tile(seconds, days)
+    return day_of_year, day_of_week, second_of_day
+
+
+# Default location of the store for a .dat file,
+# e.g. led_usage_log.dat -> led_usage_log.store
+def default_store_directory(dat_file):
+    return os.path.splitext(dat_file)[0] + '.store'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Import LightAI training data into a columnar store')
+    parser.add_argument(
+        'data',
+        type=str,
+        help='Data file generated by lightai_logger.py (.dat file)')
+    parser.add_argument(
+        '--store',
+        type=str,
+        help='Directory for the store (default: next to the data file)')
+    args = parser.parse_args()
+
+    store = TrainingStore(args.store or default_store_directory(args.data))
+    imported = store.import_dat(args.data)
+    print('Imported {} new samples, {} in total'.format(imported, store.rows))
@@ -60,7 +60,7 @@ START_LIGHT_AI = (
 CRON_LIGHTAI_LOGGER = (
     '(sudo crontab -l ; ' +
     'echo "*/15 * * * * '.format(LIGHTAI_DIRECTORY) +
-    '/usr/bin/python3 {}/lightai_logger.py '.format(LIGHTAI_DIRECTORY) +
+    '/usr/bin/python3 -S {}/lightai_logger.py '.format(LIGHTAI_DIRECTORY) +
     '{} '.format(STATUS_DIRECTORY) +
     '{}/led_usage_log.dat'.format(LIGHTAI_DIRECTORY) +
     '")| ' +
@@ -0,0 +1,126 @@
+from bisect import bisect_left
+from time import perf_counter_ns
+
+# Upper bounds of the histogram buckets, in nanoseconds
+BUCKETS = (
+    5000, 10000, 25000, 50000, 100000, 250000, 500000,
+    1000000, 2500000, 5000000, 10000000, 25000000, 50000000,
+    100000000, 250000000, 1000000000,
+)
+
+
+# Fixed-bucket histogram of durations in nanoseconds
+class Histogram:
+
+    def __init__(self):
+        # The final bucket counts anything longer than BUCKETS[-1]
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def record(self, duration):
+        self.counts[bisect_left(BUCKETS, duration)] += 1
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    # Estimate a percentile as the upper bound of the bucket it falls in
+    def percentile(self, fraction):
+        target = self.count * fraction
+        seen = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            seen += count
+            if seen >= target:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self):
+        mean = self.total / self.count if self.count else 0
+        return {
+            'count': self.count,
+            'mean_us': mean / 1000.0,
+            'p50_us': self.percentile(0.5) / 1000.0,
+            'p99_us': self.percentile(0.99) / 1000.0,
+            'max_us': self.max / 1000.0,
+        }
+
+
+# Records how long each stage of a frame takes.
+#
+# Callers hold a reference that is None when instrumentation is disabled, so
+# the cost when disabled is a single truth test per stage:
+#
+#   timer = self.timer
+#   if timer:
+#       timer.start()
+#   ...
+#   if timer:
+#       timer.lap('stage name')
+class StageTimer:
+
+    def __init__(self):
+        self.histograms = {}
+        self.frame_start = 0
+        self.last = 0
+
+    def start(self):
+        self.frame_start = self.last = perf_counter_ns()
+
+    # Record the time since the previous lap (or start) against stage
+    def lap(self, stage):
+        now = perf_counter_ns()
+        self._histogram(stage).record(now - self.last)
+        self.last = now
+
+    # Record a duration (ns) measured elsewhere against stage, without
+    # affecting the laps of the current frame
+    def record(self, stage, duration):
+        self._histogram(stage).record(duration)
+
+    # Record the time since start() as the duration of the whole frame
+    def finish(self):
+        self._histogram('total').record(perf_counter_ns() - self.frame_start)
+
+    def _histogram(self, stage):
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            histogram = self.histograms[stage] = Histogram()
+        return histogram
+
+    def reset(self):
+        self.histograms = {}
+
+    def to_dict(self):
+        return {
+            stage: histogram.to_dict()
+            for stage, histogram in sorted(self.histograms.items())
+        }
+
+    # Render histograms in the Prometheus text exposition format.
+    # gauges is an optional dict of extra {name: value} metrics
+    def to_prometheus(self, gauges=None):
+        name = 'lights_stage_duration_seconds'
+        lines = [
+            '# HELP {} Time spent in each stage of a frame'.format(name),
+            '# TYPE {} histogram'.format(name),
+        ]
+        for stage, histogram in sorted(self.histograms.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram.counts):
+                cumulative += count
+                lines.append('{}_bucket{{stage="{}",le="{}"}} {}'.format(
+                    name, stage, bound / 1e9, cumulative))
+            lines.append('{}_bucket{{stage="{}",le="+Inf"}} {}'.format(
+                name, stage, histogram.count))
+            lines.append('{}_sum{{stage="{}"}} {}'.format(
+                name, stage, histogram.total / 1e9))
+            lines.append('{}_count{{stage="{}"}} {}'.format(
+                name, stage, histogram.count))
+
+        for gauge, value in sorted((gauges or {}).items()):
+            lines.append('# TYPE {} gauge'.format(gauge))
+            lines.append('{} {}'.format(gauge, value))
+
+        return '\n'.join(lines) + '\n'
@@ -1,29 +1,90 @@
+import asyncio
 import json
 import os
-
-from datetime import datetime
-
+import statusblock
+
+from behaviour import Behaviour
+from clock import Clock
+from color import BLACK
+from color import load_numpy
+from eventloop import LightsLoop
+from LedController import DEFAULT_PINS
 from LedController import LedController
-
-from behaviour import *
+from notifications import MODE_ROUND_ROBIN
+from notifications import NotificationHandler
+from notifications import overlay
+from output import get_driver
+from scheduler import FrameScheduler
+from statusblock import LegacyFileShim
+from statusblock import get_status_block
+from stream import DEFAULT_HOST as DEFAULT_STREAM_HOST
+from stream import DEFAULT_PORT as DEFAULT_STREAM_PORT
+from stream import StreamReceiver
+
+from instrumentation import StageTimer
 
 from util import log
-from util import read_line
 from util import safe_load
+from util import write_atomic
+
+from watcher import get_watcher
+from watcher import parse_json
+from watcher import parse_timestamped_color
+from watcher import watch
 
 # If DEBUG, errors will halt the program
 DEBUG = False
+
+# Target output rate while the color is changing, and the reduced rate used
+# while the output is static (which bounds how quickly we notice new input)
+FRAME_RATE = 60
+IDLE_FRAME_RATE = 10
+
+# How often frame timing statistics are logged (in seconds)
+STATS_INTERVAL = 300
+
+# Maximum time (in seconds) before a change to the canonical color is saved.
+# Rapid changes within this interval are collapsed into a single write
+CANONICAL_FLUSH_INTERVAL = 1.0
+
+# Record how long each stage of every frame takes. This can also be enabled
+# by setting LIGHTS_INSTRUMENT=1
+INSTRUMENT = os.environ.get('LIGHTS_INSTRUMENT') == '1'
+INSTRUMENT_INTERVAL = 10
+
 WEB_ROOT = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'remote')
-STATUS_ROOT = os.path.join(WEB_ROOT, 'status')
+
+# LIGHTS_STATUS_ROOT may be set to keep status files somewhere else, e.g. a
+# temporary directory when running benchmarks
+STATUS_ROOT = os.environ.get(
+    'LIGHTS_STATUS_ROOT', os.path.join(WEB_ROOT, 'status'))
 
 FILE_AMBIENT = os.path.join(STATUS_ROOT, 'ambient')
 FILE_NOTIFICATIONS = os.path.join(STATUS_ROOT, 'notifications')
 FILE_PREFERENCES = os.path.join(STATUS_ROOT, 'prefs')
 FILE_AI = os.path.join(STATUS_ROOT, 'ambient_ai')
 FILE_CANONICAL = os.path.join(STATUS_ROOT, 'canonical')
+FILE_MECH = os.path.join(STATUS_ROOT, 'mech')
+
+# Frame timing output, written every INSTRUMENT_INTERVAL seconds when
+# instrumentation is enabled. timings is JSON and metrics is in the
+# Prometheus text format
+FILE_TIMINGS = os.path.join(STATUS_ROOT, 'timings')
+FILE_METRICS = os.path.join(STATUS_ROOT, 'metrics')
 FILE_PIN_CONFIG = os.path.join(
     os.path.dirname(os.path.realpath(__file__)), 'pins.json')
 
+# Overrides the output driver set in pins.json, e.g. LIGHTS_DRIVER=memory
+# to run without GPIO
+ENV_DRIVER = 'LIGHTS_DRIVER'
+
+# Overrides the UDP port for realtime color streaming set in pins.json.
+# 0 disables streaming
+ENV_STREAM_PORT = 'LIGHTS_STREAM_PORT'
+
+# Overrides the address streaming listens on set in pins.json
+ENV_STREAM_HOST = 'LIGHTS_STREAM_HOST'
+
 
 def init_files():
     if not os.path.exists(STATUS_ROOT):
@@ -40,179 +101,434 @@ def init_files():
                     file.write('{}')
 
 
-# Read pin configuration from file generated by install.py
-def get_pins():
-    pin_red = 22
-    pin_green = 27
-    pin_blue = 17
-
+# Read pin configuration from file generated by install.py.
+# pins.json holds either a single set of pins:
+#   {"pin_red": 22, "pin_green": 27, "pin_blue": 17}
+# or a list of zones, which may each override the inactivity behaviour:
+#   {"zones": [{"name": "desk", "pin_red": 22, "pin_green": 27,
+#               "pin_blue": 17, "inactivity_behaviour": 1}, ...]}
+# Either form may also choose the output driver, e.g. "driver": "pigpio",
+# and the UDP port for streaming, e.g. "stream_port": 5569 (0 to disable).
+# Streaming only accepts packets from this machine unless "stream_host" is
+# set to "0.0.0.0" (every interface) or the address of another interface
+def read_pin_config():
     if os.path.exists(FILE_PIN_CONFIG):
         with open(FILE_PIN_CONFIG, 'r') as f:
-            pins = json.load(f)
-            pin_red = safe_load(pins, 'pin_red')
-            pin_green = safe_load(pins, 'pin_green')
-            pin_blue = safe_load(pins, 'pin_blue')
+            return json.load(f)
+    return {}
+
+
+def get_zones(config):
+    zones = []
+    for index, zone_config in enumerate(safe_load(config, 'zones', [config])):
+        name = safe_load(zone_config, 'name', str(index))
+        pins = (
+            safe_load(zone_config, 'pin_red', DEFAULT_PINS[0]),
+            safe_load(zone_config, 'pin_green', DEFAULT_PINS[1]),
+            safe_load(zone_config, 'pin_blue', DEFAULT_PINS[2]),
+        )
+        zones.append(Zone(
+            name, pins, safe_load(zone_config, 'inactivity_behaviour', None)))
+
+        print('Using pin configuration for zone \'{}\':\n'.format(name) +
+            'pin_red = {},\npin_green = {},\npin_blue = {}'.format(*pins))
+
+    return zones
 
-    print('Using pin configuration:\n' +
-        'pin_red = {},\npin_green = {},\npin_blue = {}'
-            .format(pin_red, pin_green, pin_blue))
 
-    return pin_red, pin_green, pin_blue
+def get_output_driver(config):
+    name = os.environ.get(ENV_DRIVER) or safe_load(config, 'driver', 'softpwm')
+    print('Using output driver: {}'.format(name))
+    return get_driver(name)
+
+
+# Returns a StreamReceiver, or None if streaming is disabled or unavailable
+def get_stream_receiver(config):
+    port = int(os.environ.get(ENV_STREAM_PORT) or
+               safe_load(config, 'stream_port', DEFAULT_STREAM_PORT))
+    if not port:
+        return None
+
+    host = (os.environ.get(ENV_STREAM_HOST) or
+            safe_load(config, 'stream_host', DEFAULT_STREAM_HOST))
+    try:
+        receiver = StreamReceiver(port, host)
+    except OSError as e:
+        log('Unable to listen for streamed colors on {}:{}: {}'.format(
+            host, port, e))
+        return None
+    print('Listening for streamed colors on {}:{}'.format(host, port))
+    return receiver
+
+
+# Write the timings recorded by timer, along with frame rate statistics
+def write_timings(timer, stats):
+    write_atomic(FILE_TIMINGS, json.dumps({
+        'stages': timer.to_dict(),
+        'fps': stats.fps,
+        'target_fps': stats.target_fps,
+        'frames': stats.frames,
+        'missed': stats.missed,
+    }, indent=2))
+    write_atomic(FILE_METRICS, timer.to_prometheus({
+        'lights_frame_rate': stats.fps,
+        'lights_target_frame_rate': stats.target_fps,
+        'lights_frames': stats.frames,
+        'lights_missed_deadlines': stats.missed,
+    }))
+
+
+# A set of lights with its own pins, target color and inactivity behaviour
+class Zone:
+
+    def __init__(self, name, pins, inactivity_behaviour_id=None):
+        self.name = name
+        self.pins = pins
+
+        # If set, this overrides pref_inactivity_behaviour for this zone
+        self.inactivity_behaviour_id = inactivity_behaviour_id
+        self.behaviour_id = None
+        self.inactivity_behaviour = None
+
+        # The (behaviour id, options) most recently asked for, and the
+        # request that was last applied. Preferences are reloaded on the
+        # event loop while update() runs in a worker thread, so the behaviour
+        # is only ever replaced or reconfigured by update() itself
+        self.requested_behaviour = None
+        self.applied_behaviour = None
+
+        # The last result of the inactivity behaviour and when it was
+        # calculated (monotonic ns), for holding colors between updates of
+        # behaviours with a min_interval
+        self.behaviour_result = None
+        self.behaviour_time = 0
+
+        # Colors set for all zones are in the status block's ambient slot,
+        # while colors for just this zone are written to ambient.<name>
+        self.status = get_status_block()
+        self.zone_ambient = watch(
+            '{}.{}'.format(FILE_AMBIENT, name), parse_timestamped_color)
+
+    # Returns the most recently set color for this zone and its timestamp
+    def get_ambient(self):
+        ambient = self.status.read(statusblock.AMBIENT)
+        ambient = (BLACK, 0) if ambient is None else ambient[:2]
+        zone_ambient = self.zone_ambient.get()
+        if zone_ambient is not None and zone_ambient[1] >= ambient[1]:
+            return zone_ambient
+        return ambient
+
+    # Use the given behaviour and options from the next update()
+    def set_inactivity_behaviour(self, behaviour_id, options):
+        if self.inactivity_behaviour_id is not None:
+            behaviour_id = self.inactivity_behaviour_id
+        self.requested_behaviour = (behaviour_id, options)
+
+    # Switch to the most recently requested behaviour. A new behaviour is
+    # fully configured before it is used
+    def apply_inactivity_behaviour(self):
+        requested = self.requested_behaviour
+        if requested is self.applied_behaviour:
+            return
+        self.applied_behaviour = requested
+
+        behaviour_id, options = requested
+        if behaviour_id == self.behaviour_id:
+            self.inactivity_behaviour.set_preferences(options)
+            return
+
+        behaviour = Behaviour.get(behaviour_id, self.name)
+        behaviour.set_preferences(options)
+        if self.inactivity_behaviour is not None:
+            print('new behaviour for zone \'{}\': {}'.format(
+                self.name, behaviour.to_string()))
+
+        self.inactivity_behaviour = behaviour
+        self.behaviour_id = behaviour_id
+        self.behaviour_result = None
+
+    # Apply the inactivity behaviour to the ambient color if it was set
+    # long enough ago. now is the clock.FrameTime of the frame
+    def update(self, color, timestamp, now, inactivity_timeout):
+        self.apply_inactivity_behaviour()
+        if now.wall - timestamp <= inactivity_timeout:
+            self.behaviour_result = None
+            return color, True
+
+        behaviour = self.inactivity_behaviour
+        if (self.behaviour_result is not None and
+                now.since(self.behaviour_time) < behaviour.min_interval):
+            return self.behaviour_result
+
+        self.behaviour_result = behaviour.update(color, now)
+        self.behaviour_time = now.ns
+        return self.behaviour_result
 
 
 class Lights:
 
-    def __init__(self, red_pin, green_pin, blue_pin):
+    # If given, timer is an instrumentation.StageTimer used to record how
+    # long each stage of update() takes, and stream is a
+    # stream.StreamReceiver whose colors take priority over everything else
+    # while it is active.
+    # clock is sampled once at the start of each frame. It may be replaced
+    # with a clock.SimulatedClock to run faster than realtime.
+    def __init__(self, zones, driver=None, timer=None, stream=None,
+                 clock=None):
         self.preferences = Preferences()
+        self.zones = zones
+        self.timer = timer
+        self.stream = stream
+        self.clock = clock if clock is not None else Clock()
         self.led_controller = LedController(
-            self.preferences, pin_red, pin_green, pin_blue)
-        self.inactivity_behaviour = Behaviour.get(
-            self.preferences.inactivity_behaviour_id)
+            self.preferences, [zone.pins for zone in zones], driver, timer,
+            self.clock)
         self.mech_behaviour = Behaviour.get(Behaviour.MECH)
-        self.notification_handler = NotificationHandler(self.preferences)
+        self.notification_handler = NotificationHandler(
+            self.preferences, FILE_NOTIFICATIONS)
+        self.canonical_color = None
+
+        # The Node server and lightai_logger still use the status files
+        self.status = get_status_block()
+        self.legacy_files = LegacyFileShim(
+            self.status,
+            {
+                statusblock.AMBIENT: FILE_AMBIENT,
+                statusblock.AI: FILE_AI,
+                statusblock.MECH: FILE_MECH,
+            },
+            {statusblock.CANONICAL: FILE_CANONICAL},
+            CANONICAL_FLUSH_INTERVAL)
+        self._apply_preferences()
+        for zone in zones:
+            zone.apply_inactivity_behaviour()
         print('Loaded preferences:\n{}'.format(self.preferences.prettyprint()))
 
+    # Run every stage of a frame in turn
     def update(self):
-        now = datetime.now()
-        self._refresh_preferences()
+        timer = self.timer
+        if timer:
+            timer.start()
 
-        with open(FILE_AMBIENT, 'r') as f:
-            lines = f.readlines()
-            if lines:
-                color = lines[0]
-                timestamp = int(lines[1])
-
-        is_canonical = True
-        if now.timestamp() - timestamp > self.preferences.inactivity_timeout:
-            color, is_canonical = self.inactivity_behaviour.update(color, now)
+        now = self.clock.now()
 
+        # LightsLoop polls the watcher when it has events instead
+        get_watcher().poll()
+        self._refresh_preferences()
+        if timer:
+            timer.lap('preferences')
+
+        streamed = self.poll_stream()
+        if timer:
+            timer.lap('stream')
+
+        self.legacy_files.import_files()
+        if timer:
+            timer.lap('status')
+
+        results = []
+        for index, zone in enumerate(self.zones):
+            if index in streamed:
+                # Replaced by the streamed color in render()
+                results.append(None)
+                continue
+
+            color, timestamp = zone.get_ambient()
+            if timer:
+                timer.lap('ambient')
+
+            results.append(zone.update(
+                color, timestamp, now, self.preferences.inactivity_timeout))
+            if timer:
+                timer.lap('behaviour')
+
+        return self.render(results, streamed, now)
+
+    # Returns {zone index: rgb} for the zones currently being streamed
+    def poll_stream(self):
+        if self.stream is not None and self.stream.poll():
+            return self.stream.colors
+        return {}
+
+    # Show the result of each zone's behaviour, as a (color, is_canonical)
+    # tuple, along with any notifications and streamed colors.
+    # now is the clock.FrameTime of the frame.
+    # Returns True if the frame rate should be kept up
+    def render(self, results, streamed, now):
+        timer = self.timer
+        results = [
+            (streamed[index], False) if index in streamed else result
+            for index, result in enumerate(results)
+        ]
+
+        # Only the first zone is used for AI learning
+        color, is_canonical = results[0]
         if is_canonical:
-            self._update_canonical(color)
+            self._update_canonical(color, now)
+        self.legacy_files.export_slots()
+        if timer:
+            timer.lap('canonical')
+
+        # Mix in the notification color, if there are active notifications
+        notification = self.notification_handler.update(now)
+        colors = [
+            overlay(color, notification)
+            if notification is not None and index not in streamed
+            else color
+            for index, (color, is_canonical) in enumerate(results)
+        ]
+        if timer:
+            timer.lap('notifications')
+
+        # Streamed colors and notification pulses are already smooth, so
+        # they are shown without interpolation
+        immediate = streamed if notification is None else range(len(colors))
+
+        # True if the output changed on this frame
+        changed = self.led_controller.set_colors(colors, immediate, now)
+        if timer:
+            timer.finish()
+
+        # Keep to the full frame rate while streaming so that new packets
+        # are shown promptly
+        return changed or bool(streamed)
 
-        # Get notification color, if there are active notifications
-        color = self.notification_handler.update(color)
+    def _refresh_preferences(self):
+        if self.preferences.refresh():
+            self._apply_preferences()
 
+    # Zones pick up behaviour changes on their next update()
+    def _apply_preferences(self):
         self.led_controller.set_preferences(self.preferences)
-        self.led_controller.set_color(color)
+        self.notification_handler.update_preferences(self.preferences)
 
-    def _refresh_preferences(self):
-        previous_behaviour_id = self.preferences.inactivity_behaviour_id
-        self.preferences.refresh()
+        for zone in self.zones:
+            zone.set_inactivity_behaviour(
+                self.preferences.inactivity_behaviour_id,
+                self.preferences.inactivity_behaviour_options)
 
-        if previous_behaviour_id != self.preferences.inactivity_behaviour_id:
-            self.inactivity_behaviour = Behaviour.get(
-                self.preferences.inactivity_behaviour_id)
-            print('new behaviour: {}'.format(
-                self.inactivity_behaviour.to_string()))
+    # Canonical colors can affect AI learning
+    def _update_canonical(self, color, now):
+        if color != self.canonical_color:
+            self.canonical_color = color
+            self.status.write(
+                statusblock.CANONICAL, color, now.wall,
+                statusblock.SOURCE_MAIN)
 
-        self.notification_handler.update_preferences(self.preferences)
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+        self.legacy_files.close()
+        self.led_controller.close()
 
-        self.inactivity_behaviour.set_preferences(
-            self.preferences.inactivity_behaviour_options)
 
-    # Canonical colors can affect AI learning
-    def _update_canonical(self, color):
-        with open(FILE_CANONICAL, 'w') as file:
-            file.write(color)
-
-
-class NotificationHandler:
-
-    def __init__(self, preferences):
-        self.index = 0
-        self.last_pulse_timestamp = datetime.now()
-        self.update_preferences(preferences)
-
-    def update(self, fallback_color):
-        if not self.enabled:
-            return fallback_color
-        now = datetime.now()
-        time_diff = (now - self.last_pulse_timestamp).seconds
-        if time_diff > self.pulse_frequency:
-            if time_diff > self.pulse_duration + self.pulse_frequency:
-                # End the pulse
-                self.last_pulse_timestamp = now
-            try:
-                with open(FILE_NOTIFICATIONS, 'r') as f:
-                    notifications = json.load(f)
-                    if notifications:
-                        self.index = (self.index + 1) % len(notifications)
-                        n = notifications[self.index]
-                        return safe_load(n, 'rgb', fallback_color)
-            except:
-                pass
-
-        return fallback_color
-
-    def update_preferences(self, preferences):
-        self.enabled = safe_load(
-            preferences, 'pref_notifications_enabled', True)
-        self.pulse_frequency = safe_load(
-            preferences, 'pref_notifications_pulse_frequency', 5)
-        self.pulse_duration = safe_load(
-            preferences, 'pref_notifications_pulse_duration', 1)
+DEFAULT_GAMMA = 1.0
+
+
+# Returns gamma if it is a positive number or a list of three, otherwise
+# DEFAULT_GAMMA
+def get_gamma(gamma):
+    values = gamma if isinstance(gamma, list) else [gamma] * 3
+    if len(values) == 3 and all(
+            isinstance(value, (int, float)) and not isinstance(value, bool) and
+            value > 0 for value in values):
+        return gamma
+
+    log('Invalid gamma {}, using {}'.format(gamma, DEFAULT_GAMMA))
+    return DEFAULT_GAMMA
 
 
 class Preferences:
 
-    def __init__(self):
+    def __init__(self, file=FILE_PREFERENCES):
+        self.source = watch(file, parse_json, {})
+        self.version = -1
         self.refresh()
 
-    # Reload preferences from file
-    def refresh(self, file=FILE_PREFERENCES):
-        with open(file) as f:
-            j = None
-            try:
-                j = json.load(f)
-            except:
-                j = {}  # File doesn't exist yet
-            self.max_brightness = safe_load(j, 'pref_max_brightness', 100)
-            self.min_brightness = safe_load(j, 'pref_min_brightness', 0)
-            self.color_change_interpolate = safe_load(
-                j, 'pref_interpolate_color_changes', True)
-            self.color_change_duration = max(
-                0.5, safe_load(j, 'pref_color_change_duration', 1.5))
-            self.inactivity_timeout = safe_load(
-                j, 'pref_inactivity_timeout', 0)
-            self.inactivity_behaviour_id = safe_load(
-                j, 'pref_inactivity_behaviour', Behaviour.NONE)
-            self.inactivity_behaviour_options = safe_load(
-                j, 'pref_inactivity_behaviour_options', {})
-            self.notifications_enabled = safe_load(
-                j, 'pref_notifications_enabled', False)
-            self.notifications_pulse_frequency = safe_load(
-                j, 'pref_notifications_pulse_frequency', 30)
+    # Reload preferences if the file has changed.
+    # Returns True if preferences were updated
+    def refresh(self):
+        j = self.source.get()
+        if self.source.version == self.version:
+            return False
+        self.version = self.source.version
+
+        self.max_brightness = safe_load(j, 'pref_max_brightness', 100)
+        self.min_brightness = safe_load(j, 'pref_min_brightness', 0)
+
+        # Gamma correction for the output, either a single value or a list
+        # of [red, green, blue] values
+        self.gamma = get_gamma(safe_load(j, 'pref_gamma', DEFAULT_GAMMA))
+        self.color_change_interpolate = safe_load(
+            j, 'pref_interpolate_color_changes', True)
+        self.color_change_duration = max(
+            0.5, safe_load(j, 'pref_color_change_duration', 1.5))
+        self.inactivity_timeout = safe_load(
+            j, 'pref_inactivity_timeout', 0)
+        self.inactivity_behaviour_id = safe_load(
+            j, 'pref_inactivity_behaviour', Behaviour.NONE)
+        self.inactivity_behaviour_options = safe_load(
+            j, 'pref_inactivity_behaviour_options', {})
+        self.notifications_enabled = safe_load(
+            j, 'pref_notifications_enabled', True)
+        self.notifications_pulse_frequency = safe_load(
+            j, 'pref_notifications_pulse_frequency', 5)
+        self.notifications_pulse_duration = safe_load(
+            j, 'pref_notifications_pulse_duration', 1)
+        self.notifications_fade = safe_load(
+            j, 'pref_notifications_fade', 0.25)
+        self.notifications_mode = safe_load(
+            j, 'pref_notifications_mode', MODE_ROUND_ROBIN)
+        return True
 
     def prettyprint(self):
         return (
             'max_brightness: {}\n'.format(self.max_brightness) +
             'min_brightness: {}\n'.format(self.min_brightness) +
+            'gamma: {}\n'.format(self.gamma) +
             'interpolate_color_changes: {}\n'.format(self.color_change_interpolate) +
             'color_change_duration: {}\n'.format(self.color_change_duration) +
             'inactivity_timeout: {}\n'.format(self.inactivity_timeout) +
             'inactivity_behaviour_id: {}\n'.format(self.inactivity_behaviour_id) +
             'inactivity_behaviour_options: {}\n'.format(self.inactivity_behaviour_options) +
             'notifications_enabled: {}\n'.format(self.notifications_enabled) +
-            'notifications_pulse_frequency: {}\n'.format(self.notifications_pulse_frequency)
+            'notifications_pulse_frequency: {}\n'.format(self.notifications_pulse_frequency) +
+            'notifications_pulse_duration: {}\n'.format(self.notifications_pulse_duration) +
+            'notifications_fade: {}\n'.format(self.notifications_fade) +
+            'notifications_mode: {}\n'.format(self.notifications_mode)
         )
 
+# Log frame rate statistics, then start counting again
+def log_stats(scheduler):
+    log(scheduler.stats().to_string())
+    scheduler.reset_stats()
+
+
 if __name__ == '__main__':
     init_files()
 
-    pin_red, pin_green, pin_blue = get_pins()
+    pin_config = read_pin_config()
+    timer = StageTimer() if INSTRUMENT else None
+    lights = Lights(
+        get_zones(pin_config), get_output_driver(pin_config), timer,
+        get_stream_receiver(pin_config))
+    scheduler = FrameScheduler(FRAME_RATE, IDLE_FRAME_RATE)
+
+    lights_loop = LightsLoop(lights, scheduler, get_watcher(), DEBUG)
+    lights_loop.every(STATS_INTERVAL, lambda: log_stats(scheduler))
+
+    # numpy speeds up compiling transitions but is slow to import, so the
+    # lights start with the pure Python versions until it has loaded
+    lights_loop.after_first_frame(load_numpy)
+    if timer:
+        lights_loop.every(
+            INSTRUMENT_INTERVAL, lambda: write_timings(timer, scheduler.stats()))
 
-    lights = Lights(pin_red, pin_green, pin_blue)
     try:
-        while True:
-            if DEBUG:
-                # Allow error messages to halt execution
-                lights.update()
-            else:
-                try:
-                    lights.update()
-                except Exception as e:
-                    print('Error: {}'.format(e))
+        asyncio.run(lights_loop.run())
     except KeyboardInterrupt as k:
         print('LED Control is stopping...')
 
+    lights.close()
+
     log('LED Control is no longer active')
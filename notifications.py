@@ -0,0 +1,146 @@
+import json
+
+from clock import NS_PER_SECOND
+from color import RGB
+from color import string_to_rgb
+from watcher import watch
+
+# Resolution of the precomputed pulse envelope. Very long pulses are capped
+# at MAX_SAMPLES
+SAMPLES_PER_SECOND = 120
+MAX_SAMPLES = 4096
+
+# Envelope values are in 0-ALPHA_MAX, where ALPHA_MAX shows only the
+# notification color
+ALPHA_MAX = 256
+
+# How the colors of several notifications are shown
+MODE_ROUND_ROBIN = 'round_robin'  # Each pulse shows the next notification
+MODE_BLEND = 'blend'  # Every pulse shows the average of all of them
+
+
+# Returns the color of each notification, or None if it doesn't have one
+def parse_notifications(text):
+    return [
+        string_to_rgb(n['rgb']) if 'rgb' in n else None
+        for n in json.loads(text)
+    ]
+
+
+# Mix notification into rgb, where notification is an (rgb, alpha) pair
+# returned by NotificationHandler.update()
+def overlay(rgb, notification):
+    target, alpha = notification
+    if alpha >= ALPHA_MAX:
+        return target
+
+    r, g, b = rgb
+    return RGB(
+        r + ((target[0] - r) * alpha >> 8),
+        g + ((target[1] - g) * alpha >> 8),
+        b + ((target[2] - b) * alpha >> 8))
+
+
+# Notifications repeat in a cycle of pulse_frequency seconds without a
+# pulse, followed by a pulse lasting pulse_duration seconds which fades in
+# and out over fade seconds.
+#
+# The pulse is compiled into a table of alpha values, and the notification
+# colors into the list shown by successive pulses, so sampling the pulse
+# costs the same however many notifications there are.
+class PulseEnvelope:
+
+    def __init__(self, colors, pulse_frequency, pulse_duration, fade,
+                 mode=MODE_ROUND_ROBIN):
+        if mode == MODE_BLEND:
+            colors = [RGB(*[
+                sum(channel) // len(colors) for channel in zip(*colors)
+            ])]
+        self.colors = colors
+
+        self.offset = int(pulse_frequency * NS_PER_SECOND)
+        self.duration = int(pulse_duration * NS_PER_SECOND)
+        self.period = self.offset + self.duration
+
+        count = max(1, min(
+            MAX_SAMPLES, int(pulse_duration * SAMPLES_PER_SECOND)))
+        fade_samples = fade / pulse_duration * count
+        self.alphas = [
+            int(ALPHA_MAX * min(
+                1.0, (i + 1) / fade_samples, (count - i) / fade_samples))
+            if fade_samples > 0 else ALPHA_MAX
+            for i in range(count)
+        ]
+
+    # Returns the (rgb, alpha) to show at elapsed ns from the start of the
+    # first cycle, or None if between pulses
+    def sample(self, elapsed):
+        cycle, position = divmod(elapsed, self.period)
+        position -= self.offset
+        if position < 0:
+            return None
+
+        alphas = self.alphas
+        alpha = alphas[min(
+            position * len(alphas) // self.duration, len(alphas) - 1)]
+        return self.colors[cycle % len(self.colors)], alpha
+
+
+class NotificationHandler:
+
+    def __init__(self, preferences, file):
+        self.notifications = watch(file, parse_notifications, [])
+
+        # The compiled PulseEnvelope, or None if there is nothing to show.
+        # It is rebuilt when the notifications or preferences change
+        self.envelope = None
+        self.version = None
+
+        # Monotonic time (ns) the pulse cycles started, or None if nothing
+        # has been shown since notifications were last cleared
+        self.start = None
+        self.update_preferences(preferences)
+
+    # Returns the notification color to show on this frame, and how strongly
+    # to show it, as an (rgb, alpha) pair for overlay().
+    # Returns None if no notification is being shown.
+    # now is the clock.FrameTime of the frame
+    def update(self, now):
+        if not self.enabled:
+            self.start = None
+            return None
+
+        notifications = self.notifications.get()
+        if self.notifications.version != self.version:
+            self.version = self.notifications.version
+            self._compile(notifications)
+
+        if self.envelope is None:
+            # Whatever is shown next starts from the beginning of a cycle
+            self.start = None
+            return None
+        if self.start is None:
+            self.start = now.ns
+
+        return self.envelope.sample(now.ns - self.start)
+
+    def _compile(self, notifications):
+        colors = [rgb for rgb in notifications or [] if rgb is not None]
+        if not colors or self.pulse_duration <= 0:
+            self.envelope = None
+            return
+
+        self.envelope = PulseEnvelope(
+            colors, max(0, self.pulse_frequency), self.pulse_duration,
+            self.fade, self.mode)
+
+    # preferences is a main.Preferences
+    def update_preferences(self, preferences):
+        self.enabled = preferences.notifications_enabled
+        self.pulse_frequency = preferences.notifications_pulse_frequency
+        self.pulse_duration = preferences.notifications_pulse_duration
+        self.fade = preferences.notifications_fade
+        self.mode = preferences.notifications_mode
+
+        # Recompile on the next update
+        self.version = None
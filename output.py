@@ -0,0 +1,181 @@
+from array import array
+from collections import deque
+
+import color
+
+from util import log
+
+
+# Sends channel values to the GPIO pins.
+#
+# write() is called at most once per frame with only the channels that have
+# changed since the previous frame.
+class OutputDriver:
+    # Maximum value accepted by write()
+    range = 255
+
+    # Prepare the given pins for output. Returns False if setup failed.
+    def setup(self, pins):
+        return True
+
+    # changes is a list of (pin, value) pairs
+    def write(self, changes):
+        pass
+
+    def close(self):
+        pass
+
+    def to_string(self):
+        return type(self).__name__
+
+
+# Software PWM via wiringpi. This runs a thread per pin so it has a
+# noticeable CPU cost, but works on any GPIO pin.
+class SoftPwmDriver(OutputDriver):
+    range = 100
+
+    def setup(self, pins):
+        import wiringpi
+        self.wiringpi = wiringpi
+
+        if wiringpi.wiringPiSetupGpio() == -1:
+            return False
+
+        for pin in pins:
+            wiringpi.pinMode(pin, 1)
+            wiringpi.softPwmCreate(pin, 0, self.range)
+        return True
+
+    def write(self, changes):
+        for pin, value in changes:
+            self.wiringpi.softPwmWrite(pin, value)
+
+
+# PWM timed by DMA in the pigpio daemon, so it costs no CPU in this process
+# and works on any GPIO pin. Requires pigpiod to be running.
+class PigpioDriver(OutputDriver):
+    range = 255
+    frequency = 800
+
+    def setup(self, pins):
+        import pigpio
+
+        self.pi = pigpio.pi()
+        if not self.pi.connected:
+            log('Unable to connect to pigpiod - is it running?')
+            return False
+
+        for pin in pins:
+            self.pi.set_mode(pin, pigpio.OUTPUT)
+            self.pi.set_PWM_frequency(pin, self.frequency)
+            self.pi.set_PWM_range(pin, self.range)
+            self.pi.set_PWM_dutycycle(pin, 0)
+        return True
+
+    def write(self, changes):
+        for pin, value in changes:
+            self.pi.set_PWM_dutycycle(pin, value)
+
+    def close(self):
+        self.pi.stop()
+
+
+# Keeps channel values in memory instead of using GPIO, for running the
+# controller on machines without LEDs attached (e.g. in CI or benchmarks).
+class MemoryDriver(OutputDriver):
+    range = 255
+
+    def __init__(self, history=1000):
+        self.values = {}
+
+        # The changes passed to each call of write(), oldest first
+        self.frames = deque(maxlen=history)
+
+    def setup(self, pins):
+        self.values = {pin: 0 for pin in pins}
+        return True
+
+    def write(self, changes):
+        self.frames.append(changes)
+        for pin, value in changes:
+            self.values[pin] = value
+
+
+# Converts 0-255 colors into the values written to a driver, applying the
+# brightness limits, gamma correction and the driver's range in one step.
+#
+# Brightness limits scale all three channels together, so the output for a
+# channel depends on both its own value and the brightest channel. Each
+# channel has a table indexed by (brightest channel << 8) | channel value,
+# so converting a color is three table lookups. The tables are only rebuilt
+# when the preferences change.
+class OutputTable:
+
+    # min_value and max_value limit the brightest channel (0-255). gamma is
+    # either one exponent for all channels or a list of three.
+    def __init__(self, output_range, min_value=0, max_value=255, gamma=1.0):
+        self.range = output_range
+        self.min_value = min_value
+        self.max_value = max_value
+        self.gammas = (
+            list(gamma) if isinstance(gamma, (list, tuple)) else [gamma] * 3)
+
+        tables = {}
+        for gamma in set(self.gammas):
+            tables[gamma] = self._build(gamma)
+        self.tables = [tables[gamma] for gamma in self.gammas]
+
+    def _build(self, gamma):
+        if color.np is not None:
+            return self._build_batch(gamma)
+
+        table = array('H', bytes(2 * 256 * 256))
+        output_range = self.range
+        for maxc in range(256):
+            value = min(self.max_value, max(maxc, self.min_value))
+            if maxc == 0:
+                # Black is raised to a grey at the minimum brightness
+                table[0] = int(output_range * (value / 255.0) ** gamma + 0.5)
+                continue
+
+            # Only channel values up to maxc can occur
+            scale = value / 255.0 / maxc
+            row = maxc << 8
+            for channel in range(maxc + 1):
+                table[row | channel] = int(
+                    output_range * (channel * scale) ** gamma + 0.5)
+        return table
+
+    # Same as _build(), using NumPy
+    def _build_batch(self, gamma):
+        np = color.np
+        maxc = np.arange(256, dtype=np.float64)[:, None]
+        channel = np.arange(256, dtype=np.float64)[None, :]
+        value = np.clip(maxc, self.min_value, self.max_value)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            x = np.where(
+                channel <= maxc, channel * (value / 255.0 / maxc), 0.0)
+        x[0, 0] = value[0, 0] / 255.0
+
+        table = (self.range * x ** gamma + 0.5).astype(np.uint16)
+        return array('H', table.tobytes())
+
+    def to_string(self):
+        return 'OutputTable[range:{}, brightness:{}-{}, gamma:{}]'.format(
+            self.range, self.min_value, self.max_value, self.gammas)
+
+
+DRIVERS = {
+    'softpwm': SoftPwmDriver,
+    'pigpio': PigpioDriver,
+    'memory': MemoryDriver,
+}
+
+
+def get_driver(name='softpwm'):
+    try:
+        return DRIVERS[name]()
+    except KeyError:
+        raise ValueError('Unknown output driver "{}". Choose from: {}'.format(
+            name, ', '.join(sorted(DRIVERS))))
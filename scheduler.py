@@ -0,0 +1,91 @@
+from time import monotonic
+from time import sleep
+
+
+class FrameStats:
+
+    def __init__(self, frames, missed, fps, max_overrun, target_fps):
+        self.frames = frames
+        self.missed = missed
+        self.fps = fps
+        self.max_overrun = max_overrun
+        self.target_fps = target_fps
+
+    def to_string(self):
+        return ('FrameStats[fps:{:.1f}/{}, frames:{}, missed:{}, ' +
+                'max_overrun:{:.1f}ms]').format(
+                    self.fps, self.target_fps, self.frames, self.missed,
+                    self.max_overrun * 1000.0)
+
+
+# Runs a frame callback at a fixed target rate.
+#
+# Each frame has a deadline one interval after the previous one. If a frame
+# finishes early we sleep until its deadline; if it overruns, the deadline is
+# counted as missed and the schedule restarts from the current time rather
+# than trying to catch up with a burst of back-to-back frames.
+#
+# When idle_fps is given, the scheduler drops to that rate whenever the
+# previous frame reported no activity (i.e. nothing changed on the output)
+# so that a static color costs next to no CPU.
+class FrameScheduler:
+
+    def __init__(self, fps=60, idle_fps=None, clock=monotonic, sleep=sleep):
+        self.clock = clock
+        self.sleep = sleep
+        self.set_rate(fps, idle_fps)
+        self.reset_stats()
+        self.next_deadline = None
+
+    def set_rate(self, fps, idle_fps=None):
+        if fps <= 0:
+            raise ValueError('Frame rate must be positive: {}'.format(fps))
+        self.fps = fps
+        self.idle_fps = idle_fps if idle_fps else fps
+        self.interval = 1.0 / fps
+        self.idle_interval = 1.0 / self.idle_fps
+
+    def reset_stats(self):
+        self.frames = 0
+        self.missed = 0
+        self.max_overrun = 0
+        self.stats_start = self.clock()
+
+    # Block until the next frame is due.
+    # active should be True if the previous frame changed the output, in
+    # which case the full frame rate is used.
+    def wait(self, active=True):
+        delay = self.next_delay(active)
+        if delay > 0:
+            self.sleep(delay)
+
+    # Like wait(), but returns the number of seconds until the next frame is
+    # due instead of sleeping, for callers that wait some other way
+    def next_delay(self, active=True):
+        now = self.clock()
+        self.frames += 1
+
+        if self.next_deadline is None:
+            self.next_deadline = now
+
+        self.next_deadline += self.interval if active else self.idle_interval
+
+        remaining = self.next_deadline - now
+        if remaining > 0:
+            return remaining
+
+        self.missed += 1
+        self.max_overrun = max(self.max_overrun, -remaining)
+        self.next_deadline = now
+        return 0
+
+    # Schedule frames from the current time, e.g. after starting a frame
+    # early in response to new input
+    def restart(self):
+        self.next_deadline = self.clock()
+
+    def stats(self):
+        elapsed = self.clock() - self.stats_start
+        fps = self.frames / elapsed if elapsed > 0 else 0
+        return FrameStats(
+            self.frames, self.missed, fps, self.max_overrun, self.fps)
@@ -0,0 +1,78 @@
+from threading import Condition
+from threading import Thread
+from time import monotonic
+
+from util import log
+from util import write_atomic
+
+
+# Persists a value to a file from a background thread.
+#
+# write() is cheap enough to call on every frame: it returns immediately if
+# the value hasn't changed, and otherwise just hands the value over to the
+# writer thread. The thread writes at most once every flush_interval seconds,
+# so a burst of changes is coalesced into a single write of the latest
+# value. Files are replaced atomically so readers never see them truncated.
+class StateWriter:
+
+    def __init__(self, path, flush_interval=1.0, format=str):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.format = format
+
+        # The most recent value given to write()
+        self.value = None
+        self.pending = False
+        self.closed = False
+        self.last_flush = 0
+        self.condition = Condition()
+
+        self.thread = Thread(
+            target=self._run, name='StateWriter[{}]'.format(path),
+            daemon=True)
+        self.thread.start()
+
+    def write(self, value):
+        if value == self.value:
+            return
+
+        with self.condition:
+            self.value = value
+            self.pending = True
+            self.condition.notify()
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+
+                # Wait out the rest of the flush interval, collecting any
+                # further changes made in the meantime
+                deadline = self.last_flush + self.flush_interval
+                while not self.closed:
+                    delay = deadline - monotonic()
+                    if delay <= 0:
+                        break
+                    self.condition.wait(delay)
+
+                value = self.value
+                self.pending = False
+
+            self._write(value)
+
+    def _write(self, value):
+        self.last_flush = monotonic()
+        try:
+            write_atomic(self.path, self.format(value))
+        except OSError as e:
+            log('Unable to write {}: {}'.format(self.path, e))
+
+    # Write any pending value and stop the writer thread
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
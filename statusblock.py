@@ -0,0 +1,213 @@
+import mmap
+import os
+import struct
+import tempfile
+
+from collections import namedtuple
+
+from color import RGB
+from statewriter import StateWriter
+from util import log
+from watcher import parse_timestamped_color
+from watcher import watch
+
+# Shared memory block holding the current state of the lights.
+#
+# main.py creates the block and is its only writer. Anything left in it from
+# a previous run is cleared when it is created, and LegacyFileShim then
+# imports the current status files. Other processes map the block read-only
+# (create=False): lightai_logger.py reads the canonical slot straight from
+# the block, falling back to the canonical file if the slot is empty.
+#
+# The programs that set colors (the Node server, and light_ai.py through the
+# server) still write the status text files, which the shim copies into the
+# block. They must not write to the block themselves: the seqlock below only
+# supports a single writer per slot, and the shim is already that writer for
+# the imported slots. Moving one of them onto the block means handing its
+# slot over from the shim.
+#
+# Layout (little-endian):
+#   header: magic (4s), layout version (H), slot count (H), slot size (I),
+#           padding to HEADER_SIZE
+#   slots:  one SLOT_SIZE record per entry in SLOTS
+#
+# Each slot is guarded by its own sequence counter (a seqlock): the writer
+# makes the counter odd while it updates the slot and even again afterwards,
+# and readers retry if the counter was odd or changed while they were
+# reading. Each slot should only have one writer.
+#
+# Slot record: sequence (I), r, g, b, source (4B), timestamp (d), padding
+
+MAGIC = b'ILSB'
+LAYOUT_VERSION = 1
+
+AMBIENT = 0
+AI = 1
+CANONICAL = 2
+MECH = 3
+SLOTS = (AMBIENT, AI, CANONICAL, MECH)
+
+# Where a slot's current value came from
+SOURCE_UNKNOWN = 0
+SOURCE_FILE = 1
+SOURCE_MAIN = 2
+SOURCE_LIGHTAI = 3
+SOURCE_STREAM = 4
+
+HEADER_SIZE = 16
+SLOT_SIZE = 32
+
+_HEADER = struct.Struct('<4sHHI')
+_SEQUENCE = struct.Struct('<I')
+_PAYLOAD = struct.Struct('<4Bd')
+
+READ_ATTEMPTS = 100
+
+DEFAULT_PATH = os.environ.get(
+    'LIGHTS_STATUS_BLOCK',
+    os.path.join(
+        '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir(),
+        'intelligent-lighting-status'))
+
+# generation increases every time the slot is written, and is 0 if the slot
+# has never been written
+SlotValue = namedtuple(
+    'SlotValue', ['rgb', 'timestamp', 'source', 'generation'])
+
+
+class StatusBlock:
+
+    SIZE = HEADER_SIZE + len(SLOTS) * SLOT_SIZE
+
+    # If create is True the block is created, or cleared if it already
+    # exists. Otherwise it must already exist.
+    def __init__(self, path=DEFAULT_PATH, create=True):
+        self.path = path
+        flags = os.O_RDWR | (os.O_CREAT if create else 0)
+        fd = os.open(path, flags, 0o664)
+        try:
+            if os.fstat(fd).st_size < StatusBlock.SIZE:
+                if not create:
+                    raise ValueError(
+                        'Status block {} is incomplete'.format(path))
+                os.ftruncate(fd, StatusBlock.SIZE)
+            self.mmap = mmap.mmap(fd, StatusBlock.SIZE)
+        finally:
+            os.close(fd)
+
+        magic, version, slot_count, slot_size = _HEADER.unpack_from(self.mmap)
+        if (magic, version, slot_count, slot_size) != (
+                MAGIC, LAYOUT_VERSION, len(SLOTS), SLOT_SIZE):
+            if not create:
+                raise ValueError(
+                    'Status block {} has an unknown layout'.format(path))
+            if magic == MAGIC:
+                log('Resetting status block with old layout version {}'
+                    .format(version))
+            self.mmap[:] = bytes(StatusBlock.SIZE)
+            _HEADER.pack_into(
+                self.mmap, 0, MAGIC, LAYOUT_VERSION, len(SLOTS), SLOT_SIZE)
+        elif create:
+            self.clear()
+
+    def _offset(self, slot):
+        return HEADER_SIZE + slot * SLOT_SIZE
+
+    def write(self, slot, rgb, timestamp, source=SOURCE_UNKNOWN):
+        offset = self._offset(slot)
+        sequence = _SEQUENCE.unpack_from(self.mmap, offset)[0]
+
+        _SEQUENCE.pack_into(self.mmap, offset, (sequence + 1) & 0xffffffff)
+        r, g, b = rgb
+        _PAYLOAD.pack_into(self.mmap, offset + 4, r, g, b, source, timestamp)
+        _SEQUENCE.pack_into(self.mmap, offset, (sequence + 2) & 0xffffffff)
+
+    # Cheap check for changes - compare with the generation of the value
+    # last read
+    def generation(self, slot):
+        return _SEQUENCE.unpack_from(self.mmap, self._offset(slot))[0]
+
+    # Returns a SlotValue, or None if the slot has never been written or a
+    # consistent value could not be read
+    def read(self, slot):
+        offset = self._offset(slot)
+        for _ in range(READ_ATTEMPTS):
+            sequence = _SEQUENCE.unpack_from(self.mmap, offset)[0]
+            if sequence & 1:
+                continue
+            r, g, b, source, timestamp = _PAYLOAD.unpack_from(
+                self.mmap, offset + 4)
+            if _SEQUENCE.unpack_from(self.mmap, offset)[0] == sequence:
+                if sequence == 0:
+                    return None
+                return SlotValue(RGB(r, g, b), timestamp, source, sequence)
+        return None
+
+    # Forget the value of every slot
+    def clear(self):
+        self.mmap[HEADER_SIZE:] = bytes(len(SLOTS) * SLOT_SIZE)
+
+    def close(self):
+        self.mmap.close()
+
+
+_default_block = None
+
+
+# Status block shared by everything in the main process
+def get_status_block():
+    global _default_block
+    if _default_block is None:
+        _default_block = StatusBlock()
+    return _default_block
+
+
+# Keeps the status block in sync with the original status text files so
+# that programs which still use the files (the Node server, lightai_logger)
+# keep working.
+#
+# import_files() copies changes to the imported files into the block, and
+# export_slots() writes changes to exported slots out to their files.
+class LegacyFileShim:
+
+    # imports and exports are dicts of {slot: path}
+    def __init__(self, block, imports, exports, flush_interval=1.0):
+        self.block = block
+        self.imports = [
+            [slot, watch(path, parse_timestamped_color), 0]
+            for slot, path in imports.items()
+        ]
+        self.exports = [
+            [slot, StateWriter(path, flush_interval), 0]
+            for slot, path in exports.items()
+        ]
+
+        # The files may have been written while nothing was running, e.g.
+        # after a reboot has cleared the block, so start from their contents
+        self.import_files()
+
+    # The WatchedFile for each imported file
+    def watched_files(self):
+        return [watched for slot, watched, version in self.imports]
+
+    def import_files(self):
+        for entry in self.imports:
+            slot, watched, version = entry
+            value = watched.get()
+            if value is not None and watched.version != version:
+                entry[2] = watched.version
+                rgb, timestamp = value
+                self.block.write(slot, rgb, timestamp, SOURCE_FILE)
+
+    def export_slots(self):
+        for entry in self.exports:
+            slot, writer, generation = entry
+            if self.block.generation(slot) != generation:
+                value = self.block.read(slot)
+                if value is not None:
+                    entry[2] = value.generation
+                    writer.write(value.rgb)
+
+    def close(self):
+        for slot, writer, generation in self.exports:
+            writer.close()
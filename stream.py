@@ -0,0 +1,234 @@
+import socket
+import struct
+
+from argparse import ArgumentParser
+from time import monotonic
+from time import sleep
+
+from color import RGB
+from util import log
+
+# Realtime color streaming over UDP, for driving the lights from music
+# visualisers and similar software at full frame rate.
+#
+# Each datagram sets the color of one or more zones (little-endian):
+#   header: magic (4s), protocol version (B), flags (B), sequence (H)
+#   then one record per zone: zone index, r, g, b (4B)
+#
+# Zone indices follow the order of the zones in pins.json. While packets keep
+# arriving the streamed colors are shown directly, bypassing the status files,
+# behaviours and notifications. If no packet arrives for STREAM_TIMEOUT
+# seconds, or a packet has FLAG_TERMINATE set, the lights return to their
+# normal colors.
+#
+# Packets are not authenticated, so by default the receiver only listens on
+# the loopback interface. Listening on every interface, so that other
+# machines on the network can stream, has to be asked for with ALL_INTERFACES.
+
+MAGIC = b'ILST'
+PROTOCOL_VERSION = 1
+
+DEFAULT_PORT = 5569
+DEFAULT_HOST = '127.0.0.1'
+ALL_INTERFACES = '0.0.0.0'
+
+# The sender is finished - stop streaming immediately rather than waiting
+# for the timeout
+FLAG_TERMINATE = 0x01
+
+# Seconds without a packet before streaming stops
+STREAM_TIMEOUT = 2.5
+
+# Packets whose sequence number is up to this far behind the last one are
+# treated as having arrived out of order and are dropped. Anything further
+# behind is assumed to come from a sender that has restarted.
+SEQUENCE_WINDOW = 20
+
+MAX_ZONES = 256
+
+_HEADER = struct.Struct('<4sBBH')
+_RECORD = struct.Struct('<4B')
+
+
+# Returns (flags, sequence, [(zone, rgb), ...]), or None if the packet is
+# not valid
+def decode_packet(data):
+    if len(data) < _HEADER.size or (len(data) - _HEADER.size) % _RECORD.size:
+        return None
+
+    magic, version, flags, sequence = _HEADER.unpack_from(data)
+    if magic != MAGIC or version != PROTOCOL_VERSION:
+        return None
+
+    zones = [
+        (zone, RGB(r, g, b))
+        for zone, r, g, b in _RECORD.iter_unpack(data[_HEADER.size:])
+    ]
+    return flags, sequence, zones
+
+
+def encode_packet(sequence, zones, flags=0):
+    data = bytearray(_HEADER.pack(
+        MAGIC, PROTOCOL_VERSION, flags, sequence & 0xffff))
+    for zone, rgb in zones:
+        data += _RECORD.pack(zone, *rgb)
+    return bytes(data)
+
+
+# Receives streamed colors on a non-blocking UDP socket.
+#
+# poll() should be called once per frame. It drains every waiting packet so
+# that only the newest color for each zone is used, however far behind the
+# frame loop has fallen.
+class StreamReceiver:
+
+    def __init__(self, port=DEFAULT_PORT, host=DEFAULT_HOST,
+                 timeout=STREAM_TIMEOUT, clock=monotonic):
+        self.timeout = timeout
+        self.clock = clock
+
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((host, port))
+        self.socket.setblocking(False)
+        self.address = self.socket.getsockname()
+
+        # {zone index: rgb} for the current stream, empty when not streaming
+        self.colors = {}
+        self.sender = None
+        self.sequence = None
+        self.last_packet = 0
+
+        self.packets = 0
+        self.dropped = 0
+
+    def fileno(self):
+        return self.socket.fileno()
+
+    # Read any waiting packets. Returns True if streaming is active
+    def poll(self):
+        while True:
+            try:
+                data, sender = self.socket.recvfrom(2048)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                log('Stream receive failed: {}'.format(e))
+                break
+            self._receive(data, sender)
+
+        if self.colors and self.clock() - self.last_packet > self.timeout:
+            log('Stream from {}:{} timed out'.format(*self.sender))
+            self._stop()
+
+        return bool(self.colors)
+
+    def _receive(self, data, sender):
+        packet = decode_packet(data)
+        if packet is None:
+            self.dropped += 1
+            return
+        flags, sequence, zones = packet
+
+        if sender == self.sender and self.sequence is not None:
+            behind = (self.sequence - sequence) & 0xffff
+            if behind < SEQUENCE_WINDOW:
+                # Duplicate or out of order
+                self.dropped += 1
+                return
+        elif self.colors:
+            log('Stream taken over by {}:{}'.format(*sender))
+            self.colors = {}
+
+        if not self.colors:
+            log('Streaming from {}:{}'.format(*sender))
+
+        self.packets += 1
+        self.sender = sender
+        self.sequence = sequence
+        self.last_packet = self.clock()
+
+        if flags & FLAG_TERMINATE:
+            log('Stream from {}:{} ended'.format(*sender))
+            self._stop()
+            return
+
+        for zone, rgb in zones:
+            self.colors[zone] = rgb
+
+    def _stop(self):
+        self.colors = {}
+        self.sender = None
+        self.sequence = None
+
+    # Returns the streamed color for the given zone index, or None if the
+    # zone isn't being streamed
+    def get(self, zone):
+        return self.colors.get(zone)
+
+    def close(self):
+        self.socket.close()
+
+
+# Sends colors to a StreamReceiver
+class StreamSender:
+
+    def __init__(self, host='127.0.0.1', port=DEFAULT_PORT):
+        self.target = (host, port)
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sequence = 0
+
+    # colors is either a list of rgb values, one for each zone in order,
+    # or a dict of {zone index: rgb}
+    def send(self, colors):
+        if isinstance(colors, dict):
+            zones = sorted(colors.items())
+        else:
+            zones = list(enumerate(colors))
+        self._send(zones)
+
+    # Tell the receiver to return to normal colors straight away
+    def stop(self):
+        self._send([], FLAG_TERMINATE)
+
+    def _send(self, zones, flags=0):
+        if len(zones) > MAX_ZONES:
+            raise ValueError('Too many zones: {}'.format(len(zones)))
+        self.sequence = (self.sequence + 1) & 0xffff
+        self.socket.sendto(
+            encode_packet(self.sequence, zones, flags), self.target)
+
+    def close(self):
+        self.socket.close()
+
+
+# Stream a rainbow to the lights, e.g.
+#   python3 stream.py --host raspberrypi.local --zones 2 --seconds 10
+# Streaming from another machine needs "stream_host": "0.0.0.0" in pins.json
+if __name__ == '__main__':
+    from color import lut_hsv_to_rgb
+
+    parser = ArgumentParser(description='Stream a test pattern to the lights')
+    parser.add_argument('--host', type=str, default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--zones', type=int, default=1)
+    parser.add_argument('--fps', type=float, default=60)
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    sender = StreamSender(args.host, args.port)
+    start = monotonic()
+    frame = 0
+    try:
+        while monotonic() - start < args.seconds:
+            hue = (frame / args.fps / 5.0) % 1.0
+            sender.send([
+                lut_hsv_to_rgb(((hue + zone / args.zones) % 1.0, 1.0, 255))
+                for zone in range(args.zones)
+            ])
+            frame += 1
+            sleep(max(0, start + frame / args.fps - monotonic()))
+    except KeyboardInterrupt:
+        pass
+    sender.stop()
+    sender.close()
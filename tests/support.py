@@ -0,0 +1,62 @@
+# Shared setup for tests that run the lights. Import this before main, so
+# that status files and the status block are kept in a temporary directory
+# rather than remote/status and /dev/shm.
+
+import asyncio
+import atexit
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT_DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIRECTORY)
+
+STATUS_ROOT = tempfile.mkdtemp(prefix='lights-test-')
+os.environ['LIGHTS_STATUS_ROOT'] = STATUS_ROOT
+os.environ['LIGHTS_STATUS_BLOCK'] = os.path.join(STATUS_ROOT, 'status_block')
+atexit.register(shutil.rmtree, STATUS_ROOT, True)
+
+# Preferences that show colors as soon as they are set
+IMMEDIATE_PREFERENCES = {
+    'pref_interpolate_color_changes': False,
+    'pref_inactivity_timeout': 10 ** 6,
+}
+
+
+# Replace a status file the way the Node server's writers should
+def write_status(filename, content):
+    path = os.path.join(STATUS_ROOT, filename)
+    with open(path + '.tmp', 'w') as f:
+        f.write(content)
+    os.replace(path + '.tmp', path)
+
+
+def write_preferences(preferences=IMMEDIATE_PREFERENCES):
+    write_status('prefs', json.dumps(preferences))
+
+
+def write_ambient(rgb, filename='ambient'):
+    write_status(filename, '{} {} {}\n{}'.format(*rgb, int(time.time())))
+
+
+# Run lights_loop until condition() is True or timeout seconds have passed.
+# Returns the final result of condition()
+def run_loop(lights_loop, condition, timeout=2.0):
+    async def wait():
+        task = asyncio.ensure_future(lights_loop.run())
+        deadline = time.monotonic() + timeout
+        while not condition() and time.monotonic() < deadline:
+            if task.done():
+                task.result()
+            await asyncio.sleep(0.01)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return condition()
+
+    return asyncio.run(wait())
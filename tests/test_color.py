@@ -0,0 +1,116 @@
+# Checks the table-based and NumPy conversions in color.py give the same
+# results as colorsys, which they replaced.
+#
+# Run from the repository root with: python3 -m pytest tests
+# or: python3 -m unittest discover tests
+
+import colorsys
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import color  # noqa: E402
+
+# The reference conversions below are also used by
+# benchmarks/hsv_conversion.py
+
+# Maximum difference from colorsys on each 0-255 channel
+TOLERANCE = 1
+
+MIN_VALUE = 0.05 * 255.0
+MAX_VALUE = 0.8 * 255.0
+
+VALUES = list(range(0, 256, 15)) + [1, 254, 255]
+COLORS = [color.RGB(r, g, b) for r in VALUES for g in VALUES for b in VALUES]
+
+
+def colorsys_hsv_to_rgb(hsv):
+    return tuple(int(x) for x in colorsys.hsv_to_rgb(*hsv))
+
+
+def colorsys_clamp(rgb):
+    h, s, v = colorsys.rgb_to_hsv(*rgb)
+    v = int(min(MAX_VALUE, max(v, MIN_VALUE)))
+    return colorsys_hsv_to_rgb((h, s, v))
+
+
+def channel_error(a, b):
+    return max(abs(int(x) - int(y)) for x, y in zip(a, b))
+
+
+class TestStringToRgb(unittest.TestCase):
+
+    def test_parse(self):
+        self.assertEqual(color.string_to_rgb('255 120 0\n'), (255, 120, 0))
+
+    def test_out_of_range_is_clamped(self):
+        self.assertEqual(color.string_to_rgb('300 -5 0'), (255, 0, 0))
+        rgb = color.string_to_rgb('300 0 999')
+        self.assertEqual(color.lut_rgb_to_hsv(rgb), colorsys.rgb_to_hsv(*rgb))
+
+
+class TestLookupTables(unittest.TestCase):
+
+    def test_rgb_to_hsv(self):
+        for rgb in COLORS:
+            h, s, v = color.lut_rgb_to_hsv(rgb)
+            eh, es, ev = colorsys.rgb_to_hsv(*rgb)
+            self.assertAlmostEqual(h, eh, places=9, msg=rgb)
+            self.assertAlmostEqual(s, es, places=9, msg=rgb)
+            self.assertEqual(v, ev, msg=rgb)
+
+    def test_hsv_to_rgb(self):
+        for rgb in COLORS:
+            hsv = colorsys.rgb_to_hsv(*rgb)
+            self.assertLessEqual(
+                channel_error(
+                    color.lut_hsv_to_rgb(hsv), colorsys_hsv_to_rgb(hsv)),
+                TOLERANCE, msg=rgb)
+
+    def test_round_trip(self):
+        for rgb in COLORS:
+            self.assertLessEqual(
+                channel_error(
+                    color.lut_hsv_to_rgb(color.lut_rgb_to_hsv(rgb)), rgb),
+                TOLERANCE, msg=rgb)
+
+    def test_clamp_brightness(self):
+        for rgb in COLORS:
+            self.assertLessEqual(
+                channel_error(
+                    color.clamp_brightness(rgb, MIN_VALUE, MAX_VALUE),
+                    colorsys_clamp(rgb)),
+                TOLERANCE, msg=rgb)
+
+
+@unittest.skipIf(color.load_numpy() is None, 'numpy is not installed')
+class TestBatch(unittest.TestCase):
+
+    def test_rgb_to_hsv_batch(self):
+        hsv = color.rgb_to_hsv_batch(COLORS)
+        expected = color.np.array([colorsys.rgb_to_hsv(*c) for c in COLORS])
+        self.assertLess(float(abs(hsv - expected).max()), 1e-9)
+
+    def test_hsv_to_rgb_batch(self):
+        hsv = [colorsys.rgb_to_hsv(*c) for c in COLORS]
+        expected = color.np.array([colorsys_hsv_to_rgb(c) for c in hsv])
+        rgb = color.hsv_to_rgb_batch(hsv).astype(int)
+        self.assertLessEqual(int(abs(rgb - expected).max()), TOLERANCE)
+
+    def test_morph_batch(self):
+        t = [i / 20.0 for i in range(21)]
+        for from_rgb, to_rgb in [((255, 0, 0), (0, 0, 255)),
+                                 ((255, 120, 0), (255, 160, 20)),
+                                 ((0, 0, 0), (40, 255, 120)),
+                                 ((10, 10, 10), (200, 200, 200))]:
+            batch = color.morph_batch(from_rgb, to_rgb, t)
+            for i, f in enumerate(t):
+                self.assertLessEqual(
+                    channel_error(batch[i], color.morph(from_rgb, to_rgb, f)),
+                    TOLERANCE, msg=(from_rgb, to_rgb, f))
+
+
+if __name__ == '__main__':
+    unittest.main()
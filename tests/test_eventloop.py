@@ -0,0 +1,66 @@
+# Runs main.Lights on the asyncio LightsLoop, with the memory driver chosen
+# through LIGHTS_DRIVER
+
+import os
+import unittest
+
+from unittest import mock
+
+import support
+
+import main
+
+from eventloop import LightsLoop
+from output import MemoryDriver
+from scheduler import FrameScheduler
+from statusblock import get_status_block
+from watcher import get_watcher
+
+PINS = (22, 27, 17)
+
+
+class TestLightsLoop(unittest.TestCase):
+
+    def setUp(self):
+        main.init_files()
+        support.write_preferences()
+        support.write_status('notifications', '[]')
+
+        # Chosen the way main() does, with pins.json asking for GPIO output
+        with mock.patch.dict(os.environ, {main.ENV_DRIVER: 'memory'}):
+            self.driver = main.get_output_driver({'driver': 'softpwm'})
+
+    def start(self):
+        lights = main.Lights([main.Zone('0', PINS)], self.driver)
+        self.addCleanup(lights.close)
+        return LightsLoop(lights, FrameScheduler(60, 10), get_watcher())
+
+    def shows(self, rgb):
+        return lambda: tuple(self.driver.values[pin] for pin in PINS) == rgb
+
+    def test_driver_from_environment(self):
+        self.assertIsInstance(self.driver, MemoryDriver)
+
+    def test_status_files_shown_at_startup(self):
+        # /dev/shm is cleared on reboot, so the block starts out empty while
+        # the status files still hold the last color
+        get_status_block().clear()
+        support.write_ambient((0, 255, 0))
+
+        self.assertTrue(support.run_loop(self.start(), self.shows(
+            (0, 255, 0))))
+
+    def test_ambient_change(self):
+        support.write_ambient((0, 255, 0))
+        lights_loop = self.start()
+
+        def condition():
+            if self.shows((0, 255, 0))():
+                support.write_ambient((0, 0, 255))
+            return self.shows((0, 0, 255))()
+
+        self.assertTrue(support.run_loop(lights_loop, condition))
+
+
+if __name__ == '__main__':
+    unittest.main()
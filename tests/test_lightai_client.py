@@ -0,0 +1,109 @@
+# Pushes LightAI colors to a stand-in for the Node server
+
+import os
+import socket
+import sys
+import threading
+import unittest
+
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+
+import support
+
+sys.path.insert(0, os.path.join(support.ROOT_DIRECTORY, 'extra'))
+
+from lightai_client import LightingClient  # noqa: E402
+
+try:
+    import requests  # noqa: F401
+except ImportError:
+    requests = None
+
+
+# Responds to each request with the next status in server.statuses,
+# repeating the last one
+class Handler(BaseHTTPRequestHandler):
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        server = self.server
+        server.paths.append(self.path)
+        status = server.statuses[min(len(server.paths), len(
+            server.statuses)) - 1]
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+@unittest.skipIf(requests is None, 'requests is not installed')
+class TestLightingClient(unittest.TestCase):
+
+    def start_server(self, *statuses):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        server.daemon_threads = True
+        server.statuses = statuses
+        server.paths = []
+        thread = threading.Thread(
+            target=server.serve_forever, args=(0.05,), daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server, 'http://127.0.0.1:{}/'.format(server.server_port)
+
+    def client(self, url, **kwargs):
+        self.delays = []
+        client = LightingClient(url, sleep=self.delays.append, **kwargs)
+        self.addCleanup(client.close)
+        return client
+
+    def test_push(self):
+        server, url = self.start_server(200)
+        client = self.client(url)
+        self.assertTrue(client.push({'rgb': '255 0 0'}))
+        self.assertEqual(server.paths, ['/?rgb=255+0+0'])
+        self.assertEqual(self.delays, [])
+
+    def test_unavailable_is_retried_with_back_off(self):
+        server, url = self.start_server(503, 503, 200)
+        client = self.client(url, retries=3, backoff=0.5)
+        self.assertTrue(client.push({'rgb': '255 0 0'}))
+        self.assertEqual(len(server.paths), 3)
+        self.assertEqual(self.delays, [0.5, 1.0])
+        self.assertEqual(client.failures, 0)
+
+    def test_retries_run_out(self):
+        server, url = self.start_server(503)
+        client = self.client(url, retries=2, backoff=0.5)
+        self.assertFalse(client.push({'rgb': '255 0 0'}))
+        self.assertEqual(len(server.paths), 3)
+        self.assertEqual(self.delays, [0.5, 1.0])
+        self.assertEqual(client.failures, 1)
+
+    def test_not_found_is_not_retried(self):
+        server, url = self.start_server(404)
+        client = self.client(url)
+        self.assertFalse(client.push({'rgb': '255 0 0'}))
+        self.assertEqual(len(server.paths), 1)
+        self.assertEqual(self.delays, [])
+
+    def test_unreachable_server(self):
+        client = self.client(
+            'http://127.0.0.1:{}/'.format(free_port()), retries=2,
+            timeout=(0.5, 0.5))
+        self.assertFalse(client.push({'rgb': '255 0 0'}))
+        self.assertEqual(self.delays, [0.5, 1.0])
+        self.assertEqual(client.failures, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+# Runs extra/lightai_logger.py the way cron does and checks which canonical
+# color it logs
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+import support
+
+import statusblock
+
+from color import RGB
+from statusblock import StatusBlock
+
+LOGGER = os.path.join(support.ROOT_DIRECTORY, 'extra', 'lightai_logger.py')
+
+
+class TestLogger(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        self.block_path = os.path.join(self.directory, 'status_block')
+        self.data_file = os.path.join(self.directory, 'usage.dat')
+        with open(os.path.join(self.directory, 'canonical'), 'w') as f:
+            f.write('10 20 30\n')
+
+    def log(self):
+        env = dict(os.environ, LIGHTS_STATUS_BLOCK=self.block_path)
+        subprocess.run(
+            [sys.executable, '-S', LOGGER, self.directory, self.data_file],
+            env=env, check=True, stdout=subprocess.DEVNULL)
+        with open(self.data_file) as f:
+            return f.read().splitlines()[-1].split(':')[1].split(',')[0]
+
+    def test_reads_canonical_slot(self):
+        block = StatusBlock(self.block_path)
+        self.addCleanup(block.close)
+        block.write(statusblock.CANONICAL, RGB(1, 2, 3), 0)
+        self.assertEqual(self.log(), '1 2 3')
+
+    def test_falls_back_to_file(self):
+        # Not written since main.py started
+        block = StatusBlock(self.block_path)
+        self.addCleanup(block.close)
+        self.assertEqual(self.log(), '10 20 30')
+
+    def test_without_block(self):
+        self.assertEqual(self.log(), '10 20 30')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+# Checks that exported trees predict exactly what the sklearn classifier
+# they were exported from does
+
+import os
+import sys
+import tempfile
+import unittest
+
+from datetime import datetime
+
+import support
+
+sys.path.insert(0, os.path.join(support.ROOT_DIRECTORY, 'extra'))
+
+try:
+    import numpy as np
+    from sklearn.tree import DecisionTreeClassifier
+except ImportError:
+    np = None
+
+PALETTE = ['0 0 0', '255 180 110', '255 140 60', '120 50 15', '255 0 255']
+
+
+@unittest.skipIf(np is None, 'numpy and scikit-learn are needed')
+class TestTreeModel(unittest.TestCase):
+
+    def setUp(self):
+        from lightai_store import time_grid
+
+        # Two years of samples every 15 minutes with an evening routine that
+        # shifts through the year, plus some noise
+        rng = np.random.default_rng(0)
+        self.columns = time_grid(datetime(2020, 1, 1), 730, 900)
+        day_of_year, day_of_week, second_of_day = self.columns
+        hour = second_of_day / 3600.0
+        evening = 18.0 + 2.0 * np.cos(2 * np.pi * day_of_year / 365.25)
+        color = np.select(
+            [hour < 7, hour < 8 + (day_of_week >= 5), hour < evening,
+             hour < 23],
+            [0, 1, 0, 2], 3)
+        noise = rng.random(len(color)) < 0.02
+        color[noise] = rng.integers(0, len(PALETTE), int(noise.sum()))
+        self.labels = np.array(PALETTE)[color]
+
+        # Every 7 minutes of a year, so most times are between samples
+        self.grid = time_grid(datetime(2021, 3, 1), 365, 420)
+
+    def check(self, use_day_of_year):
+        from lightai_model import export_tree
+        from lightai_model import load_model
+        from lightai_store import feature_matrix
+
+        X = feature_matrix(*self.columns, use_day_of_year)
+        clf = DecisionTreeClassifier(random_state=0).fit(X, self.labels)
+
+        with tempfile.TemporaryDirectory() as directory:
+            tree_directory = os.path.join(directory, 'model.tree')
+            export_tree(clf, tree_directory)
+            model = load_model(tree_directory)
+
+            for features in [X, feature_matrix(*self.grid, use_day_of_year)]:
+                np.testing.assert_array_equal(
+                    model.predict(features), clf.predict(features))
+            del model
+
+    def test_day_of_year(self):
+        self.check(True)
+
+    def test_day_of_week(self):
+        self.check(False)
+
+    def test_wrong_features(self):
+        from lightai_model import TreeModel
+
+        model = TreeModel(
+            {name: np.zeros(1) for name in
+             ('feature', 'threshold', 'left', 'right', 'leaf_class',
+              'classes')}, 0, 3)
+        with self.assertRaises(ValueError):
+            model.predict(np.zeros((4, 2)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,125 @@
+# Checks that the training store imports only what has been added to a .dat
+# file, and is rebuilt when anything it has already imported changes
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import support
+
+sys.path.insert(0, os.path.join(support.ROOT_DIRECTORY, 'extra'))
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+COLORS = ['255 180 110', '120 50 15', '0 0 0', '255 0 255']
+
+
+def dat_lines(start, count):
+    return ''.join(
+        '{},{},{}:{},{}\n'.format(
+            (start + i) % 365, (start + i) % 7, (start + i) * 60,
+            COLORS[(start + i) % len(COLORS)], 1)
+        for i in range(count))
+
+
+@unittest.skipIf(np is None, 'numpy is not installed')
+class TestTrainingStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='lights-store-')
+        self.dat_file = os.path.join(self.directory, 'usage_log.dat')
+        self.store_directory = os.path.join(self.directory, 'store')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, True)
+
+    def write(self, content, mode='w'):
+        with open(self.dat_file, mode) as f:
+            f.write(content)
+
+    # Move the modification time on, so that a change is never hidden by a
+    # coarse filesystem timestamp
+    def touch(self):
+        st = os.stat(self.dat_file)
+        os.utime(self.dat_file, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+    def import_dat(self):
+        from lightai_store import TrainingStore
+
+        return TrainingStore(self.store_directory).import_dat(self.dat_file)
+
+    def assertStoreMatchesFile(self):
+        from lightai_store import TrainingStore
+        from lightai_store import parse_dat
+
+        with open(self.dat_file) as f:
+            text = f.read()
+        expected = parse_dat(text[:text.rfind('\n') + 1])
+        columns = TrainingStore(self.store_directory).load()
+        for name in expected:
+            np.testing.assert_array_equal(columns[name], expected[name])
+
+    def test_incremental_import(self):
+        self.write(dat_lines(0, 100))
+        self.assertEqual(self.import_dat(), 100)
+
+        self.write(dat_lines(100, 20), 'a')
+        self.assertEqual(self.import_dat(), 20)
+        self.assertStoreMatchesFile()
+
+    def test_unchanged_file(self):
+        self.write(dat_lines(0, 10))
+        self.import_dat()
+        self.assertEqual(self.import_dat(), 0)
+        self.assertStoreMatchesFile()
+
+    def test_partial_line(self):
+        line = dat_lines(10, 1)
+        self.write(dat_lines(0, 10) + line[:5])
+        self.assertEqual(self.import_dat(), 10)
+
+        self.write(line[5:], 'a')
+        self.assertEqual(self.import_dat(), 1)
+        self.assertStoreMatchesFile()
+
+    def test_edit_in_place(self):
+        self.write(dat_lines(0, 100))
+        self.import_dat()
+
+        # Same length, early in the file, so only a hash of everything
+        # imported notices it
+        with open(self.dat_file, 'r+') as f:
+            f.seek(f.readline().index('180'))
+            f.write('181')
+        self.write(dat_lines(100, 5), 'a')
+        self.touch()
+
+        self.assertEqual(self.import_dat(), 105)
+        self.assertStoreMatchesFile()
+
+    def test_truncated(self):
+        self.write(dat_lines(0, 100))
+        self.import_dat()
+
+        self.write(dat_lines(50, 20))
+        self.touch()
+        self.assertEqual(self.import_dat(), 20)
+        self.assertStoreMatchesFile()
+
+    def test_replaced(self):
+        self.write(dat_lines(0, 100))
+        self.import_dat()
+
+        self.write(dat_lines(200, 150))
+        self.touch()
+        self.assertEqual(self.import_dat(), 150)
+        self.assertStoreMatchesFile()
+
+
+if __name__ == '__main__':
+    unittest.main()
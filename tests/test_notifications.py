@@ -0,0 +1,67 @@
+# Checks when NotificationHandler shows notifications and where in the pulse
+# cycle they start
+
+import json
+import os
+import unittest
+
+import support
+
+import main
+
+from clock import SimulatedClock
+from notifications import ALPHA_MAX
+from notifications import NotificationHandler
+from watcher import get_watcher
+
+
+class TestNotificationHandler(unittest.TestCase):
+
+    def setUp(self):
+        support.write_preferences({
+            'pref_notifications_pulse_frequency': 1,
+            'pref_notifications_pulse_duration': 1,
+            'pref_notifications_fade': 0,
+        })
+        self.show([])
+        self.preferences = main.Preferences(
+            os.path.join(support.STATUS_ROOT, 'prefs'))
+        self.handler = NotificationHandler(
+            self.preferences,
+            os.path.join(support.STATUS_ROOT, 'notifications'))
+        self.clock = SimulatedClock()
+
+    def show(self, colors):
+        support.write_status('notifications', json.dumps(
+            [{'package': 'app', 'rgb': rgb} for rgb in colors]))
+        get_watcher().poll()
+
+    def update(self, seconds=0):
+        self.clock.advance(seconds)
+        return self.handler.update(self.clock.now())
+
+    def test_enabled_by_default(self):
+        self.assertTrue(self.preferences.notifications_enabled)
+
+    def test_pulse(self):
+        self.show(['255 0 0'])
+        self.assertIsNone(self.update())
+        self.assertEqual(self.update(1.5), ((255, 0, 0), ALPHA_MAX))
+        self.assertIsNone(self.update(1))
+
+    def test_cleared_notifications_restart_cycle(self):
+        self.show(['255 0 0'])
+        self.update()
+        self.show([])
+        self.assertIsNone(self.update(1.5))
+
+        # Partway through the cycle the first notifications started, but the
+        # new one waits for a whole pulse_frequency
+        self.show(['0 0 255'])
+        self.assertIsNone(self.update())
+        self.assertIsNone(self.update(0.5))
+        self.assertEqual(self.update(0.75), ((0, 0, 255), ALPHA_MAX))
+
+
+if __name__ == '__main__':
+    unittest.main()
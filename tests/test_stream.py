@@ -0,0 +1,188 @@
+# Streams colors over the loopback interface
+
+import time
+import unittest
+
+import support
+
+import main
+
+from color import RGB
+from eventloop import LightsLoop
+from output import MemoryDriver
+from scheduler import FrameScheduler
+from stream import SEQUENCE_WINDOW
+from stream import StreamReceiver
+from stream import StreamSender
+from watcher import get_watcher
+
+PINS = (22, 27, 17)
+
+RED = RGB(255, 0, 0)
+GREEN = RGB(0, 255, 0)
+
+
+class FakeClock:
+
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self):
+        return self.time
+
+
+class TestStreamReceiver(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.receiver = StreamReceiver(0, timeout=2.5, clock=self.clock)
+        self.addCleanup(self.receiver.close)
+        self.sender = StreamSender(*self.receiver.address)
+        self.addCleanup(self.sender.close)
+
+    # Poll until the receiver has handled count more packets
+    def poll(self, count=1):
+        expected = self.receiver.packets + self.receiver.dropped + count
+        deadline = time.monotonic() + 1.0
+        active = self.receiver.poll()
+        while (self.receiver.packets + self.receiver.dropped < expected and
+                time.monotonic() < deadline):
+            time.sleep(0.001)
+            active = self.receiver.poll()
+        return active
+
+    def test_listens_on_loopback(self):
+        self.assertEqual(self.receiver.address[0], '127.0.0.1')
+
+    def test_colors(self):
+        self.sender.send([RGB(10, 20, 30), RGB(40, 50, 60)])
+        self.assertTrue(self.poll())
+        self.assertEqual(self.receiver.get(0), (10, 20, 30))
+        self.assertEqual(self.receiver.get(1), (40, 50, 60))
+
+        self.sender.send({1: RGB(0, 0, 200)})
+        self.poll()
+        self.assertEqual(self.receiver.get(0), (10, 20, 30))
+        self.assertEqual(self.receiver.get(1), (0, 0, 200))
+
+    def test_out_of_order_dropped(self):
+        self.sender.send([RGB(10, 20, 30)])
+        self.poll()
+
+        self.sender.sequence -= 2
+        self.sender.send([RGB(1, 1, 1)])
+        self.poll()
+        self.assertEqual(self.receiver.dropped, 1)
+        self.assertEqual(self.receiver.get(0), (10, 20, 30))
+
+        # Far enough behind to be a sender that has restarted
+        self.sender.sequence -= SEQUENCE_WINDOW + 1
+        self.sender.send([RGB(2, 2, 2)])
+        self.poll()
+        self.assertEqual(self.receiver.dropped, 1)
+        self.assertEqual(self.receiver.get(0), (2, 2, 2))
+
+    def test_timeout(self):
+        self.sender.send([RGB(10, 20, 30)])
+        self.poll()
+
+        self.clock.time += 2.0
+        self.assertTrue(self.receiver.poll())
+        self.clock.time += 1.0
+        self.assertFalse(self.receiver.poll())
+        self.assertIsNone(self.receiver.get(0))
+
+    def test_terminate(self):
+        self.sender.send([RGB(10, 20, 30)])
+        self.poll()
+
+        self.sender.stop()
+        self.assertFalse(self.poll())
+        self.assertIsNone(self.receiver.get(0))
+
+    def test_invalid_packet(self):
+        self.sender.socket.sendto(b'not a packet', self.receiver.address)
+        self.assertFalse(self.poll())
+        self.assertEqual(self.receiver.dropped, 1)
+
+
+class TestStreamingLights(unittest.TestCase):
+
+    def setUp(self):
+        main.init_files()
+        support.write_preferences()
+        support.write_status('notifications', '[]')
+        support.write_ambient((0, 255, 0))
+        self.driver = MemoryDriver()
+
+    def start(self, timeout):
+        receiver = StreamReceiver(0, timeout=timeout)
+        lights = main.Lights(
+            [main.Zone('0', PINS)], self.driver, None, receiver)
+        self.addCleanup(lights.close)
+        self.sender = StreamSender(*receiver.address)
+        self.addCleanup(self.sender.close)
+        return LightsLoop(lights, FrameScheduler(60, 10), get_watcher())
+
+    # Once the ambient color is shown, stream red, then call end() once red
+    # is shown. Returns the seconds from red being sent until the ambient
+    # color is shown again
+    def stream_then(self, lights_loop, end):
+        shown = {}
+
+        def condition():
+            output = tuple(self.driver.values[pin] for pin in PINS)
+            if output == GREEN and not shown:
+                shown['sent'] = time.monotonic()
+                self.sender.send([RED])
+            elif output == RED and 'red' not in shown:
+                shown['red'] = True
+                end()
+            elif output == GREEN and 'red' in shown:
+                shown['returned'] = time.monotonic()
+            return 'returned' in shown
+
+        self.assertTrue(support.run_loop(lights_loop, condition, 3.0))
+        return shown['returned'] - shown['sent']
+
+    def test_timeout_returns_to_behaviours(self):
+        lights_loop = self.start(timeout=0.3)
+        self.assertGreaterEqual(
+            self.stream_then(lights_loop, lambda: None), 0.3)
+
+    def test_terminate_returns_to_behaviours(self):
+        lights_loop = self.start(timeout=10)
+        self.assertLess(self.stream_then(lights_loop, self.sender.stop), 1.0)
+
+    def test_streamed_zones_skip_behaviours(self):
+        lights_loop = self.start(timeout=10)
+        zone = lights_loop.lights.zones[0]
+        update = zone.update
+        calls = []
+
+        def counted(*args):
+            calls.append(args)
+            return update(*args)
+        zone.update = counted
+
+        streaming = {}
+
+        def condition():
+            output = tuple(self.driver.values[pin] for pin in PINS)
+            if output == GREEN and not streaming:
+                self.sender.send([RED])
+                streaming['sent'] = True
+            elif output == RED and 'calls' not in streaming:
+                streaming['calls'] = len(calls)
+                streaming['shown'] = time.monotonic()
+            return ('shown' in streaming and
+                    time.monotonic() - streaming['shown'] > 0.2)
+
+        self.assertTrue(support.run_loop(lights_loop, condition))
+
+        # Allowing for one that was already running when red arrived
+        self.assertLessEqual(len(calls) - streaming['calls'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
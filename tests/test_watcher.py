@@ -0,0 +1,55 @@
+# Checks when StatusFileWatcher re-reads the files it watches
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import support  # noqa: F401
+
+from watcher import StatusFileWatcher
+
+
+class TestStatusFileWatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix='lights-watcher-')
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.path = os.path.join(self.directory, 'ambient')
+        self.write('first')
+
+    def write(self, content):
+        with open(self.path + '.tmp', 'w') as f:
+            f.write(content)
+        os.replace(self.path + '.tmp', self.path)
+
+    def start(self, use_inotify):
+        watcher = StatusFileWatcher(use_inotify)
+        self.addCleanup(watcher.close)
+        return watcher, watcher.watch(self.path)
+
+    def test_inotify_changes_seen_after_poll(self):
+        watcher, watched = self.start(True)
+        if not watcher.has_inotify:
+            self.skipTest('inotify is unavailable')
+
+        self.assertEqual(watched.get(), 'first')
+        self.write('second')
+
+        # get() doesn't read inotify events itself
+        self.assertEqual(watched.get(), 'first')
+        watcher.poll()
+        self.assertEqual(watched.get(), 'second')
+        self.assertEqual(watched.version, 2)
+
+    def test_polling_without_inotify(self):
+        watcher, watched = self.start(False)
+        self.assertEqual(watched.get(), 'first')
+        self.write('second')
+        self.assertEqual(watched.get(), 'second')
+        self.assertEqual(watched.get(), 'second')
+        self.assertEqual(watched.version, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,67 @@
+from collections import OrderedDict
+
+import color
+
+from color import RGB
+
+# Resolution of precomputed transitions. Very long transitions are capped
+# at MAX_SAMPLES, which is still far smoother than the PWM output.
+SAMPLES_PER_SECOND = 120
+MAX_SAMPLES = 4096
+
+# Number of compiled transitions to keep around for reuse
+CACHE_SIZE = 32
+
+
+# A color transition compiled into a list of samples spaced evenly over its
+# duration, so that finding the color at any point during the transition is
+# just a list index.
+class Transition:
+
+    def __init__(self, from_rgb, to_rgb, duration):
+        self.from_rgb = from_rgb
+        self.to_rgb = to_rgb
+        self.duration = duration
+
+        count = int(duration * SAMPLES_PER_SECOND) + 1
+        count = max(2, min(MAX_SAMPLES, count))
+        self.colors = _compile(from_rgb, to_rgb, count)
+        self.scale = (count - 1) / duration
+
+    # Return the color at the given number of seconds into the transition
+    def sample(self, elapsed):
+        index = int(elapsed * self.scale)
+        if index >= len(self.colors):
+            return self.to_rgb
+        return self.colors[max(0, index)]
+
+
+def _compile(from_rgb, to_rgb, count):
+    steps = [i / (count - 1) for i in range(count)]
+    if color.np is None:
+        return [color.morph(from_rgb, to_rgb, t) for t in steps]
+
+    return [RGB(r, g, b) for r, g, b in
+            color.morph_batch(from_rgb, to_rgb, steps).tolist()]
+
+
+# Least-recently-used cache of compiled transitions, keyed by
+# (from_rgb, to_rgb, duration)
+class TransitionCache:
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self.transitions = OrderedDict()
+
+    def get(self, from_rgb, to_rgb, duration):
+        key = (from_rgb, to_rgb, duration)
+        transition = self.transitions.get(key)
+        if transition is not None:
+            self.transitions.move_to_end(key)
+            return transition
+
+        transition = Transition(from_rgb, to_rgb, duration)
+        self.transitions[key] = transition
+        if len(self.transitions) > self.size:
+            self.transitions.popitem(last=False)
+        return transition
@@ -39,6 +39,14 @@ def get_script_name():
     return '[' + os.path.basename(__file__) + '] '
 
 
+# Replace the contents of file without readers ever seeing it half-written
+def write_atomic(file, text):
+    temp_file = '{}.{}.tmp'.format(file, os.getpid())
+    with open(temp_file, 'w') as f:
+        f.write(text)
+    os.replace(temp_file, file)
+
+
 def read_line(file, line_number=0):
     line = ''
     with open(file, 'r') as f:
@@ -0,0 +1,240 @@
+import ctypes
+import ctypes.util
+import errno
+import json
+import os
+import struct
+
+from color import string_to_rgb
+from util import log
+
+# inotify constants from <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_Q_OVERFLOW = 0x00004000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM |
+              IN_MOVED_TO | IN_CREATE | IN_DELETE)
+
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+# Parsers for the formats used by the status files
+
+def parse_text(text):
+    return text
+
+
+def parse_lines(text):
+    return text.splitlines()
+
+
+def parse_json(text):
+    return json.loads(text)
+
+
+# Parse the 'r g b\ntimestamp' format used by ambient, ambient_ai and mech
+def parse_timestamped_color(text):
+    lines = text.splitlines()
+    return string_to_rgb(lines[0]), int(lines[1].strip())
+
+
+class WatchedFile:
+
+    def __init__(self, watcher, path, parser, default):
+        self.watcher = watcher
+        self.path = path
+        self.parser = parser
+        self.value = default
+
+        # Incremented every time a new value is successfully parsed so that
+        # callers can cheaply check whether anything has changed
+        self.version = 0
+
+        self.dirty = True
+        self.stat_key = None
+        self.listeners = []
+
+    # callback is called with no arguments whenever the watcher sees that
+    # the file may have changed. Only called when using inotify.
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def _changed(self):
+        self.dirty = True
+        for callback in self.listeners:
+            callback()
+
+    # Return the cached parsed contents, re-reading the file only if it has
+    # changed since the last successful read. With inotify, changes are only
+    # seen once the watcher has been polled
+    def get(self):
+        if self.dirty:
+            self._reload()
+        return self.value
+
+    def _reload(self):
+        stat_key = None
+        if not self.watcher.has_inotify:
+            try:
+                st = os.stat(self.path)
+            except OSError:
+                return
+            stat_key = (st.st_mtime_ns, st.st_size, st.st_ino)
+            if stat_key == self.stat_key:
+                return
+
+        # Without inotify we never know the file is clean, so we keep
+        # comparing stat results on every get()
+        self.dirty = not self.watcher.has_inotify
+        self.stat_key = stat_key
+
+        try:
+            with open(self.path, 'r') as f:
+                value = self.parser(f.read())
+        except Exception:
+            # Probably caught the file half-written - keep the previous
+            # value. The writer finishing will register as another change.
+            return
+
+        self.value = value
+        self.version += 1
+
+
+# Caches the parsed contents of status files and only re-reads them when
+# they change.
+#
+# Changes are detected with inotify where available. The parent directory of
+# each file is watched (rather than the file itself) so that files replaced
+# via rename are still picked up. poll() must be called to pick up inotify
+# events, either whenever fileno() is readable or once per frame. If inotify
+# is unavailable, each get() falls back to comparing the file's mtime, size
+# and inode with those seen at the last read.
+class StatusFileWatcher:
+
+    def __init__(self, use_inotify=True):
+        self.files = {}
+        self.directories = {}
+        self.fd = -1
+        self.libc = None
+        if use_inotify:
+            self._init_inotify()
+
+    @property
+    def has_inotify(self):
+        return self.fd >= 0
+
+    def _init_inotify(self):
+        try:
+            libc = ctypes.CDLL(
+                ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        except (OSError, AttributeError) as e:
+            log('inotify unavailable, using mtime polling: {}'.format(e))
+            return
+
+        if fd < 0:
+            log('inotify_init1 failed, using mtime polling: {}'.format(
+                os.strerror(ctypes.get_errno())))
+            return
+
+        self.libc = libc
+        self.fd = fd
+
+    # Start watching the given file. Repeated calls with the same path return
+    # the same WatchedFile so parsed contents are shared between callers.
+    def watch(self, path, parser=parse_text, default=None):
+        path = os.path.abspath(path)
+        if path in self.files:
+            return self.files[path]
+
+        watched = WatchedFile(self, path, parser, default)
+        self.files[path] = watched
+
+        if self.has_inotify:
+            self._watch_directory(os.path.dirname(path))
+
+        return watched
+
+    def _watch_directory(self, directory):
+        if directory in self.directories.values():
+            return
+
+        wd = self.libc.inotify_add_watch(
+            self.fd, directory.encode(), WATCH_MASK)
+        if wd < 0:
+            log('Unable to watch {} ({}), using mtime polling'.format(
+                directory, os.strerror(ctypes.get_errno())))
+            self.close()
+            return
+
+        self.directories[wd] = directory
+
+    # Drain pending inotify events and mark affected files as dirty
+    def poll(self):
+        if not self.has_inotify:
+            return
+
+        while True:
+            try:
+                data = os.read(self.fd, 4096)
+            except OSError as e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return
+                raise
+
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = _EVENT_HEADER.unpack_from(
+                    data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b'\0')
+                offset += length
+
+                if mask & IN_Q_OVERFLOW:
+                    # Events were lost so we can't know which files changed
+                    for watched in self.files.values():
+                        watched._changed()
+                    continue
+
+                directory = self.directories.get(wd)
+                if directory is None or not name:
+                    continue
+                watched = self.files.get(
+                    os.path.join(directory, name.decode()))
+                if watched is not None:
+                    watched._changed()
+
+    def close(self):
+        if self.fd >= 0:
+            os.close(self.fd)
+            self.fd = -1
+        self.directories = {}
+        for watched in self.files.values():
+            watched.dirty = True
+
+    def fileno(self):
+        return self.fd
+
+
+_default_watcher = None
+
+
+# Shared watcher used by the main process so that every status file is
+# watched through a single inotify instance
+def get_watcher():
+    global _default_watcher
+    if _default_watcher is None:
+        _default_watcher = StatusFileWatcher()
+    return _default_watcher
+
+
+def watch(path, parser=parse_text, default=None):
+    return get_watcher().watch(path, parser, default)